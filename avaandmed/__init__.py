@@ -1,29 +1,101 @@
-from typing import Optional, List
+from typing import TYPE_CHECKING, List, Optional, Union
 
-from pydantic import parse_obj_as
-from avaandmed.api_resources.entities import (
-    Category,
-    CoordinateReferenceSystem,
-    EmsCategory,
-    KeywordInfo,
-    Language,
-    Licence,
-    Region)
-from avaandmed.api_resources.organizations import Organizations
-from avaandmed.http.http_client import HttpClient, HttpMethod
+from avaandmed.http.timeouts import DEFAULT_TIMEOUT, Timeout
+from avaandmed.parsing import ParseMode
+
+if TYPE_CHECKING:
+    # Imported lazily at runtime, so that `import avaandmed` stays cheap
+    from avaandmed.api_resources.reference import (
+        Category,
+        CoordinateReferenceSystem,
+        EmsCategory,
+        KeywordInfo,
+        Language,
+        Licence,
+        Region)
+    from avaandmed.api_resources.organizations import Organizations
+    from avaandmed.http.auth import TokenStats
+    from avaandmed.http.cache import CacheStats, HttpCache
+    from avaandmed.http.coalesce import CoalesceStats
+    from avaandmed.http.instrumentation import Instrumentation
+    from avaandmed.http.rate_limit import RateLimiter
+    from avaandmed.http.retry import RetryPolicy, RetryStats
+    from avaandmed.http.transport import Transport
+
+
+def _reference_type(model: str):
+    """
+    Returns type of reference list of given entity, importing models on first use.
+    """
+    from avaandmed.api_resources import reference
+    return List[getattr(reference, model)]
 
 
 class Avaandmed:
     """A client for accessing Avaadnmed API"""
 
-    def __init__(self, api_token: str, key_id: str, base_hostname: str = 'avaandmed.eesti.ee') -> None:
+    def __init__(self, api_token: str, key_id: str, base_hostname: str = 'avaandmed.eesti.ee',
+                 scheme: str = 'https', pool_connections: int = 10, pool_maxsize: int = 10,
+                 idle_timeout: Optional[float] = 60.0, retry: Optional['RetryPolicy'] = None,
+                 rate_limiter: Optional['RateLimiter'] = None, cache: Optional['HttpCache'] = None,
+                 coalesce: bool = False, timeout: Union[Timeout, float, None] = DEFAULT_TIMEOUT,
+                 instrumentation: Optional['Instrumentation'] = None,
+                 transport: Optional['Transport'] = None,
+                 parse_mode: Union[ParseMode, str] = ParseMode.VALIDATE) -> None:
+        """
+        Connections to API are pooled and reused for the lifetime of the client.
+        pool_connections is number of hosts to keep pools for, pool_maxsize is
+        maximum number of connections per host and idle_timeout is number of seconds
+        after which unused connection is dropped. Client should be closed with close()
+        or used as a context manager.
+        retry describes how transient failures are retried, see RetryPolicy.
+        rate_limiter keeps requests within allowed rate, see RateLimiter.
+        cache keeps GET responses and revalidates them with the server, see HttpCache.
+        coalesce=True makes identical GET requests made at the same time share one call.
+        timeout limits connecting and waiting for response, see Timeout. Total time of
+        calls can be bounded with avaandmed.http.timeouts.deadline().
+        instrumentation receives timed spans of every request, see Instrumentation.
+        transport sends requests, e.g. FakeTransport or CassetteTransport in tests,
+        pool settings apply only to the default RequestsTransport.
+        parse_mode=ParseMode.TRUSTED skips validation of responses, see ParseMode.
+        """
+        from avaandmed.http.http_client import HttpClient
+
         self._api_token = api_token
         self._key_id = key_id
-        self._http_client = HttpClient(base_hostname, api_token, key_id)
+        self._http_client = HttpClient(
+            base_hostname,
+            api_token,
+            key_id,
+            scheme=scheme,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            idle_timeout=idle_timeout,
+            retry=retry,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            coalesce=coalesce,
+            timeout=timeout,
+            instrumentation=instrumentation,
+            transport=transport,
+            parse_mode=parse_mode
+        )
         self._datasets = None
         self._organizations = None  # type: Optional[Organizations]
         self._users = None
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections of the client.
+        """
+        self._http_client.close()
+
     @property
     def api_token(self) -> str:
         return self._api_token
@@ -32,6 +104,45 @@ class Avaandmed:
     def key_id(self) -> str:
         return self._key_id
 
+    @property
+    def token_stats(self) -> 'TokenStats':
+        """
+        Counters showing how many logins were made and how many were avoided
+        by reusing cached access token.
+        """
+        return self._http_client.token_stats
+
+    @property
+    def retry_stats(self) -> 'RetryStats':
+        """
+        Counters of retried requests by reason and of requests client gave up on.
+        """
+        return self._http_client.retry_stats
+
+    @property
+    def cache_stats(self) -> Optional['CacheStats']:
+        """
+        Counters of HTTP cache hits, misses and revalidations.
+        None if client was created without cache.
+        """
+        return self._http_client.cache_stats
+
+    @property
+    def coalesce_stats(self) -> Optional['CoalesceStats']:
+        """
+        Counters of sent and coalesced GET requests.
+        None if client was created without coalesce=True.
+        """
+        return self._http_client.coalesce_stats
+
+    @property
+    def instrumentation(self) -> 'Instrumentation':
+        """
+        Hooks receiving timed spans of auth, connect, ttfb, read, decode
+        and validate phases of requests.
+        """
+        return self._http_client.instrumentation
+
     @property
     def datasets(self):
         if self._datasets is None:
@@ -53,29 +164,23 @@ class Avaandmed:
             self._users = Users(http_client=self._http_client)
         return self._users
 
-    def get_categories(self) -> List[Category]:
-        response = self.__get('/categories')
-        return parse_obj_as(List[Category], response)
+    def get_categories(self) -> List['Category']:
+        return self.__get('/categories', 'Category')
 
-    def get_euro_categories(self) -> List[Category]:
-        response = self.__get('/euro-categories')
-        return parse_obj_as(List[Category], response)
+    def get_euro_categories(self) -> List['Category']:
+        return self.__get('/euro-categories', 'Category')
 
-    def get_ems_categories(self) -> List[EmsCategory]:
-        response = self.__get('/ems-categories')
-        return parse_obj_as(List[EmsCategory], response)
+    def get_ems_categories(self) -> List['EmsCategory']:
+        return self.__get('/ems-categories', 'EmsCategory')
 
-    def get_regions(self) -> List[Region]:
-        response = self.__get('/regions')
-        return parse_obj_as(List[Region], response)
+    def get_regions(self) -> List['Region']:
+        return self.__get('/regions', 'Region')
 
-    def get_coordinate_ref_system(self) -> List[CoordinateReferenceSystem]:
-        response = self.__get('/coordinateReferenceSystems')
-        return parse_obj_as(List[CoordinateReferenceSystem], response)
+    def get_coordinate_ref_system(self) -> List['CoordinateReferenceSystem']:
+        return self.__get('/coordinateReferenceSystems', 'CoordinateReferenceSystem')
 
-    def get_languages(self) -> List[Language]:
-        response = self.__get('/languages')
-        return parse_obj_as(List[Language], response)
+    def get_languages(self) -> List['Language']:
+        return self.__get('/languages', 'Language')
 
     def get_keywords(self, search_word: str = '', limit=20):
         """
@@ -83,12 +188,184 @@ class Avaandmed:
         You can also provide some specific search word to limit or extend 
         scope of keywords you are looking for.
         """
-        response = self.__get(f"/keywords?search={search_word}&limit={limit}")
-        return parse_obj_as(List[KeywordInfo], response)
+        return self.__get(f"/keywords?search={search_word}&limit={limit}", 'KeywordInfo')
+
+    def get_licenses(self) -> List['Licence']:
+        return self.__get('/licences', 'Licence')
+
+    def __get(self, url: str, model: str):
+        from avaandmed.api_resources import parse_response
+        from avaandmed.http.http_client import HttpMethod
+
+        response = self._http_client.request(HttpMethod.GET, url)
+        return parse_response(self._http_client, url, _reference_type(model), response)
+
+
+class AsyncAvaandmed:
+    """
+    Asyncio client for accessing Avaandmed API.
+    Requires httpx which can be installed with `pip install avaandmed[async]`.
+    """
+
+    def __init__(self, api_token: str, key_id: str, base_hostname: str = 'avaandmed.eesti.ee',
+                 scheme: str = 'https', max_connections: Optional[int] = 100,
+                 max_keepalive_connections: Optional[int] = 20,
+                 idle_timeout: Optional[float] = 60.0, retry: Optional['RetryPolicy'] = None,
+                 rate_limiter: Optional['RateLimiter'] = None, cache: Optional['HttpCache'] = None,
+                 coalesce: bool = False, timeout: Union[Timeout, float, None] = DEFAULT_TIMEOUT,
+                 instrumentation: Optional['Instrumentation'] = None, transport=None,
+                 parse_mode: Union[ParseMode, str] = ParseMode.VALIDATE) -> None:
+        """
+        max_connections limits number of requests in flight at the same time,
+        max_keepalive_connections is number of connections kept open for reuse
+        and idle_timeout is number of seconds after which unused connection is closed.
+        Client should be closed with aclose() or used as an async context manager.
+        retry describes how transient failures are retried, see RetryPolicy.
+        rate_limiter keeps requests within allowed rate, see RateLimiter.
+        cache keeps GET responses and revalidates them with the server, see HttpCache.
+        coalesce=True makes identical GET requests made at the same time share one call.
+        timeout limits connecting and waiting for response, see Timeout. Total time of
+        calls can be bounded with avaandmed.http.timeouts.deadline().
+        instrumentation receives timed spans of every request, see Instrumentation.
+        parse_mode=ParseMode.TRUSTED skips validation of responses, see ParseMode.
+        """
+        from avaandmed.http.async_http_client import AsyncHttpClient
+
+        self._api_token = api_token
+        self._key_id = key_id
+        self._http_client = AsyncHttpClient(
+            base_hostname,
+            api_token,
+            key_id,
+            scheme=scheme,
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            idle_timeout=idle_timeout,
+            retry=retry,
+            rate_limiter=rate_limiter,
+            cache=cache,
+            coalesce=coalesce,
+            timeout=timeout,
+            instrumentation=instrumentation,
+            transport=transport,
+            parse_mode=parse_mode
+        )
+        self._datasets = None
+        self._organizations = None
+        self._users = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Closes all pooled connections of the client.
+        """
+        await self._http_client.aclose()
+
+    @property
+    def api_token(self) -> str:
+        return self._api_token
+
+    @property
+    def key_id(self) -> str:
+        return self._key_id
+
+    @property
+    def token_stats(self) -> 'TokenStats':
+        """
+        Counters showing how many logins were made and how many were avoided
+        by reusing cached access token.
+        """
+        return self._http_client.token_stats
+
+    @property
+    def retry_stats(self) -> 'RetryStats':
+        """
+        Counters of retried requests by reason and of requests client gave up on.
+        """
+        return self._http_client.retry_stats
+
+    @property
+    def cache_stats(self) -> Optional['CacheStats']:
+        """
+        Counters of HTTP cache hits, misses and revalidations.
+        None if client was created without cache.
+        """
+        return self._http_client.cache_stats
+
+    @property
+    def coalesce_stats(self) -> Optional['CoalesceStats']:
+        """
+        Counters of sent and coalesced GET requests.
+        None if client was created without coalesce=True.
+        """
+        return self._http_client.coalesce_stats
+
+    @property
+    def instrumentation(self) -> 'Instrumentation':
+        """
+        Hooks receiving timed spans of auth, connect, ttfb, read, decode
+        and validate phases of requests.
+        """
+        return self._http_client.instrumentation
+
+    @property
+    def datasets(self):
+        if self._datasets is None:
+            from avaandmed.api_resources.datasets import AsyncDatasets
+            self._datasets = AsyncDatasets(http_client=self._http_client)
+        return self._datasets
+
+    def organizations(self, id: str):
+        if self._organizations is None:
+            from avaandmed.api_resources.organizations import AsyncOrganizations
+            self._organizations = AsyncOrganizations(
+                id=id, http_client=self._http_client)
+        return self._organizations
+
+    @property
+    def users(self):
+        if self._users is None:
+            from avaandmed.api_resources.users import AsyncUsers
+            self._users = AsyncUsers(http_client=self._http_client)
+        return self._users
+
+    async def get_categories(self) -> List['Category']:
+        return await self.__get('/categories', 'Category')
+
+    async def get_euro_categories(self) -> List['Category']:
+        return await self.__get('/euro-categories', 'Category')
+
+    async def get_ems_categories(self) -> List['EmsCategory']:
+        return await self.__get('/ems-categories', 'EmsCategory')
+
+    async def get_regions(self) -> List['Region']:
+        return await self.__get('/regions', 'Region')
+
+    async def get_coordinate_ref_system(self) -> List['CoordinateReferenceSystem']:
+        return await self.__get('/coordinateReferenceSystems', 'CoordinateReferenceSystem')
+
+    async def get_languages(self) -> List['Language']:
+        return await self.__get('/languages', 'Language')
+
+    async def get_keywords(self, search_word: str = '', limit=20):
+        """
+        Retrieves first 20 keywords by defualt.
+        You can also provide some specific search word to limit or extend 
+        scope of keywords you are looking for.
+        """
+        return await self.__get(f"/keywords?search={search_word}&limit={limit}", 'KeywordInfo')
+
+    async def get_licenses(self) -> List['Licence']:
+        return await self.__get('/licences', 'Licence')
 
-    def get_licenses(self) -> List[Licence]:
-        response = self.__get('/licences')
-        return parse_obj_as(List[Licence], response)
+    async def __get(self, url: str, model: str):
+        from avaandmed.api_resources import parse_response
+        from avaandmed.http.http_client import HttpMethod
 
-    def __get(self, url: str):
-        return self._http_client.request(HttpMethod.GET, url)
+        response = await self._http_client.request(HttpMethod.GET, url)
+        return parse_response(self._http_client, url, _reference_type(model), response)
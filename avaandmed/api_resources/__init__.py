@@ -1,5 +1,9 @@
 from pydantic import BaseModel
 
+from avaandmed.http.http_client import HttpMethod
+from avaandmed.http.instrumentation import VALIDATE
+from avaandmed.parsing import ParseMode, parse
+
 
 def to_camel_case(snake_str):
     components = snake_str.split('_')
@@ -14,3 +18,13 @@ class ApiResource(BaseModel):
 
     class Config:
         alias_generator = to_camel_case
+
+
+def parse_response(http_client, url: str, type_, data, lazy: bool = False,
+                   method: HttpMethod = HttpMethod.GET):
+    """
+    Parses data returned by method request to url into type_ as selected by parse_mode
+    of the client, timed as validate span of the endpoint. lazy=True returns lazy models instead.
+    """
+    with http_client.instrumentation.span(VALIDATE, url, method.name):
+        return parse(type_, data, ParseMode.LAZY if lazy else http_client.parse_mode)
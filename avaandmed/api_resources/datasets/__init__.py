@@ -1,11 +1,14 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Union
 from avaandmed.api_resources.entities import FileColumn, Preview, SearchResult
-from avaandmed.api_resources.datasets.dataset_repository import DatasetRepository
+from avaandmed.api_resources.datasets.dataset_repository import AsyncDatasetRepository, DatasetRepository
 from avaandmed.api_resources.datasets.dataset import Dataset
 
 from avaandmed.exceptions import AvaandmedException
 from avaandmed.http.http_client import HttpClient
 
+if TYPE_CHECKING:
+    from avaandmed.http.async_http_client import AsyncHttpClient
+
 
 class Datasets:
     """
@@ -16,12 +19,13 @@ class Datasets:
         self._ENDPOINT = '/datasets'
         self._repository = DatasetRepository(http_client=http_client)
 
-    def get_by_id(self, id: str) -> Dataset:
+    def get_by_id(self, id: str, lazy: bool = False) -> Dataset:
         """
         Returns Dataset instance with specified id.
+        lazy=True returns LazyDataset, which converts fields only when they are read.
         """
         url = f"{self._ENDPOINT}/{id}"
-        return self._repository._get_dataset(url)
+        return self._repository._get_dataset(url, lazy)
 
     def get_by_slug(self, slug: str) -> Dataset:
         """
@@ -30,16 +34,53 @@ class Datasets:
         url = f"{self._ENDPOINT}/slug/{slug}"
         return self._repository._get_dataset(url)
 
-    def get_dataset_list(self, limit: int = 20) -> List[Dataset]:
+    def get_dataset_list(self, limit: int = 20, lazy: bool = False,
+                         stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
         """
         Retrieves list of datasets from /datasets endpoint.
         By default returns 20 instances, but limit can be adjusted.
+        lazy=True returns LazyDataset instances, which convert fields only when they
+        are read. It is much faster when only a few fields of each dataset are used.
+        stream=True returns an iterator which parses datasets while the response is read,
+        so a large limit doesn't need memory for the whole list. With AsyncDatasets
+        the iterator is used with `async for` without awaiting it.
         """
         if limit <= 0:
             raise AvaandmedException('Limit cannot 0 or less.')
 
         url = f"{self._ENDPOINT}?limit={limit}"
-        return self._repository._get_dataset_list(url)
+        return self._repository._get_dataset_list(url, lazy, stream)
+
+    def iter_datasets(self, page_size: int = 100, prefetch: bool = True,
+                      lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Iterates over all datasets, requesting them page_size at a time.
+        Stops after get_total() datasets. With prefetch the next page is requested
+        in background while the current one is processed. With AsyncDatasets
+        the result is iterated with `async for`.
+        """
+        if page_size <= 0:
+            raise AvaandmedException('Page size cannot be 0 or less.')
+
+        return self._repository._iter_datasets(
+            self._ENDPOINT, page_size, f"{self._ENDPOINT}/total", prefetch, lazy)
+
+    def scan(self, page_size: int = 100, max_workers: int = 8, ordered: bool = True,
+             lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Iterates over the whole catalog, fetching its get_total() / page_size pages
+        concurrently with max_workers requests at a time. Datasets are yielded in order
+        of pages, or in order pages complete with ordered=False. At most max_workers
+        pages are fetched ahead of the consumer. pool_maxsize of the client should be
+        at least max_workers. With AsyncDatasets the result is iterated with `async for`.
+        """
+        if page_size <= 0:
+            raise AvaandmedException('Page size cannot be 0 or less.')
+        if max_workers <= 0:
+            raise AvaandmedException('Number of workers cannot be 0 or less.')
+
+        return self._repository._scan(
+            self._ENDPOINT, f"{self._ENDPOINT}/total", page_size, max_workers, ordered, lazy)
 
     def get_total(self) -> int:
         """
@@ -55,13 +96,15 @@ class Datasets:
         url = f"{self._ENDPOINT}/mimetypes/distinct"
         return self._repository._get_distinct_mimetypes(url)
 
-    def get_file_rows_preview(self, id: str, fileId: str) -> Preview:
+    def get_file_rows_preview(self, id: str, fileId: str,
+                              stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
         """
         Preview the file rows in the way, how end user will see them.
         Returns object according to the provided data in the dataset's file.
+        With stream=True rows are returned by an iterator as they arrive.
         """
         url = f"{self._ENDPOINT}/{id}/files/{fileId}/preview"
-        return self._repository._get_file_rows_preview(url)
+        return self._repository._get_file_rows_preview(url, stream)
 
     def paginate_file_by_id(self, id: str, fileId: str) -> Preview:
         """
@@ -70,6 +113,23 @@ class Datasets:
         url = f"{self._ENDPOINT}/{id}/files/{fileId}"
         return self._repository._paginate_file_by_id(url)
 
+    def iter_file_rows(self, id: str, fileId: str, page_size: int = 1000, offset: int = 0,
+                       prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Iterates over rows of successfully processed file content starting from row offset,
+        requesting page_size rows at a time. With prefetch the next page is requested
+        in background while the current one is processed, so at most two pages are held
+        in memory regardless of file size. With AsyncDatasets the result is iterated
+        with `async for`.
+        """
+        if page_size <= 0:
+            raise AvaandmedException('Page size cannot be 0 or less.')
+        if offset < 0:
+            raise AvaandmedException('Offset cannot be negative.')
+
+        url = f"{self._ENDPOINT}/{id}/files/{fileId}"
+        return self._repository._iter_file_rows(url, page_size, offset, prefetch)
+
     def get_file_columns(self, id: str, fileId: str) -> List[FileColumn]:
         """
         Returns columns from the dataset file.
@@ -102,8 +162,7 @@ class Datasets:
             "datasetId": id,
             "description": description
         }
-        self._repository._file_privacy_violations(url, data)
-        return 'Submitted'
+        return self._repository._file_privacy_violations(url, data)
 
     def apply_for_access(self, id: str, description: str):
         """
@@ -119,8 +178,7 @@ class Datasets:
             "datasetId": id,
             "description": description
         }
-        self._repository._apply_for_access(url, data)
-        return 'Submitted'
+        return self._repository._apply_for_access(url, data)
 
     def rate_dataset(self, id: str, quality_rating: int, meta_data_rating: int) -> str:
         """
@@ -137,8 +195,7 @@ class Datasets:
             "qualityRating": quality_rating,
             "metadataRating": meta_data_rating
         }
-        self._repository._rate_dataset(url, data)
-        return 'Submitted'
+        return self._repository._rate_dataset(url, data)
 
     def get_dataset_rating_by_slug(self, slug: str) -> str:
         """
@@ -154,3 +211,14 @@ class Datasets:
         """
         url = f"{self._ENDPOINT}/search?keywordIds={keywordId}&regionIds={regionId}&year={year}"
         return self._repository._search(url)
+
+
+class AsyncDatasets(Datasets):
+    """
+    Asyncio counterpart of Datasets.
+    Provides the same methods, but all of them have to be awaited.
+    """
+
+    def __init__(self, http_client: 'AsyncHttpClient') -> None:
+        self._ENDPOINT = '/datasets'
+        self._repository = AsyncDatasetRepository(http_client=http_client)
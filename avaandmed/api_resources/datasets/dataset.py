@@ -2,6 +2,8 @@ from typing import List, Optional
 from avaandmed.api_resources import ApiResource
 from avaandmed.api_resources.organizations.organization import Organization
 from avaandmed.api_resources.users.user import User
+from avaandmed.parsing.compact import compact_model
+from avaandmed.parsing.lazy import lazy_model
 from avaandmed.api_resources.entities import (
     Access,
     Category,
@@ -22,6 +24,7 @@ from avaandmed.api_resources.entities import (
 class Dataset(ApiResource):
     """
     Class for representing Dataset model.
+    Large collections can be kept as CompactDataset, see compact().
     """
     id: Optional[str]
     status: Optional[ProcessingStatus]
@@ -83,3 +86,10 @@ class Dataset(ApiResource):
 
 
 Dataset.update_forward_refs()
+
+# Dataset which converts fields when they are read, see Datasets.get_dataset_list(lazy=True)
+LazyDataset = lazy_model(Dataset)
+# Read-only Dataset taking a fraction of memory, e.g. for keeping whole catalog
+CompactDataset = compact_model(Dataset, interned=(
+    'language', 'organization_id', 'user_id', 'maintainer', 'maintainer_email', 'maintainer_phone',
+    'spatial_representation_type', 'spatial_data_service_type', 'maturity', 'map_regions'))
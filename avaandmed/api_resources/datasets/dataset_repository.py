@@ -1,6 +1,11 @@
-from typing import List
-from pydantic import parse_obj_as
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Union
+from avaandmed.api_resources import parse_response
+from avaandmed.exceptions import AvaandmedException
 from avaandmed.http.http_client import HttpClient, HttpMethod
+from avaandmed.parsing import ParseMode, parse
 from avaandmed.api_resources.datasets.dataset import Dataset
 from avaandmed.api_resources.entities import (
     AccessPermission,
@@ -15,21 +20,143 @@ from avaandmed.api_resources.entities import (
     SearchResult
 )
 
+if TYPE_CHECKING:
+    from avaandmed.http.async_http_client import AsyncHttpClient
+
 
 class DatasetRepository:
 
     def __init__(self, http_client: HttpClient) -> None:
         self._http_client = http_client
 
-    def _get_dataset(self, url: str) -> Dataset:
-        dataset_json = self._http_client.request(HttpMethod.GET, url=url)
-        return Dataset.parse_obj(dataset_json)
+    def _parse(self, url: str, type_, data, lazy: bool = False, method: HttpMethod = HttpMethod.GET):
+        return parse_response(self._http_client, url, type_, data, lazy, method)
 
-    def _get_dataset_list(self, url: str) -> List[Dataset]:
+    def _get_dataset(self, url: str, lazy: bool = False) -> Dataset:
+        dataset_json = self._http_client.request(HttpMethod.GET, url=url)
+        return self._parse(url, Dataset, dataset_json, lazy)
+
+    def _stream(self, url: str, item_type=None, lazy: bool = False) -> Iterator[Any]:
+        """
+        Yields items of the list returned by url parsed into item_type one at a time,
+        as they are read from the response. Items are returned as decoded if item_type is None.
+        Items are parsed as selected by parse_mode of the client, but not timed one by one.
+        """
+        mode = ParseMode.LAZY if lazy else self._http_client.parse_mode
+        for item in self._http_client.stream(url):
+            yield item if item_type is None else parse(item_type, item, mode)
+
+    def _get_dataset_list(self, url: str, lazy: bool = False,
+                          stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
+        if stream:
+            return self._stream(url, Dataset, lazy)
         datasets_json = self._http_client.request(HttpMethod.GET, url=url)
-        dataset_list = parse_obj_as(List[Dataset], datasets_json)
+        dataset_list = self._parse(url, List[Dataset], datasets_json, lazy)
         return dataset_list
 
+    def _iter_pages(self, url: str, get_page: Callable[[str], list], page_size: int,
+                    offset: int = 0, total: Optional[int] = None, prefetch: bool = True) -> Iterator[Any]:
+        """
+        Yields items of pages of url returned by get_page, requesting page_size items
+        at a time from offset. Server may return fewer items than requested, so the next
+        page starts after the items received. Stops at total or at the first empty page.
+        With prefetch the next page is requested in background thread while
+        the current one is consumed, deadline of the caller applies to it too.
+        At most two pages are held at a time.
+        """
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        pending = None
+        try:
+            page = get_page(_page_url(url, page_size, offset))
+            while True:
+                if total is not None:
+                    page = page[:max(total - offset, 0)]
+                next_offset = offset + len(page)
+                more = len(page) > 0 and (total is None or next_offset < total)
+                if more and executor is not None:
+                    # Context is copied, so that deadline() covers prefetched pages
+                    pending = executor.submit(contextvars.copy_context().run, get_page,
+                                              _page_url(url, page_size, next_offset))
+                yield from page
+                if not more:
+                    return
+                if pending is not None:
+                    page, pending = pending.result(), None
+                else:
+                    page = get_page(_page_url(url, page_size, next_offset))
+                offset = next_offset
+        finally:
+            if pending is not None:
+                pending.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def _iter_datasets(self, url: str, page_size: int = 100, total_url: Optional[str] = None,
+                       prefetch: bool = True, lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Yields datasets of all pages of url. Stops after total returned by total_url
+        or at the first empty page.
+        """
+        total = self._get_total(total_url) if total_url is not None else None
+        yield from self._iter_pages(url, lambda page_url: self._get_dataset_list(page_url, lazy),
+                                    page_size, total=total, prefetch=prefetch)
+
+    def _iter_file_rows(self, url: str, page_size: int = 1000, offset: int = 0,
+                        prefetch: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Yields rows of file from row offset until the first empty page.
+        """
+        return self._iter_pages(url, self._paginate_file_by_id, page_size, offset, prefetch=prefetch)
+
+    def _scan(self, url: str, total_url: str, page_size: int = 100, max_workers: int = 8,
+              ordered: bool = True, lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Yields datasets of all get_total() / page_size pages of url fetched by max_workers
+        threads, in order of pages or as pages complete. At most max_workers pages are
+        requested or waiting to be consumed at a time, so slow consumer holds back fetching.
+        If the server returns fewer datasets than requested, the rest of the page is
+        requested again. Raises AvaandmedException if the catalog ends before total.
+        """
+        total = self._get_total(total_url)
+        offsets = iter(range(0, total, page_size))
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        pending = deque()  # type: deque
+
+        def fetch(offset: int) -> List[Dataset]:
+            end = min(offset + page_size, total)
+            datasets = []  # type: List[Dataset]
+            while offset < end:
+                page = self._get_dataset_list(_page_url(url, end - offset, offset), lazy)
+                _check_page(url, page, offset, total)
+                datasets.extend(page[:end - offset])
+                offset += len(page)
+            return datasets
+
+        def submit() -> None:
+            offset = next(offsets, None)
+            if offset is not None:
+                # Context is copied, so that deadline() covers pages fetched by workers
+                pending.append(executor.submit(contextvars.copy_context().run, fetch, offset))
+
+        try:
+            for _ in range(max_workers):
+                submit()
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done = wait(pending, return_when=FIRST_COMPLETED).done
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    page = future.result()
+                    submit()
+                    yield from page
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def _get_total(self, url: str) -> int:
         total = self._http_client.request(HttpMethod.GET, url=url)
         return total
@@ -38,7 +165,10 @@ class DatasetRepository:
         mimetypes = self._http_client.request(HttpMethod.GET, url=url)
         return mimetypes
 
-    def _get_file_rows_preview(self, url: str) -> Preview:
+    def _get_file_rows_preview(self, url: str,
+                               stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
+        if stream:
+            return self._stream(url)
         preview = self._http_client.request(HttpMethod.GET, url=url)
         return preview
 
@@ -48,7 +178,7 @@ class DatasetRepository:
 
     def _get_file_columns(self, url: str) -> List[FileColumn]:
         columns = self._http_client.request(HttpMethod.GET, url=url)
-        return parse_obj_as(List[FileColumn], columns)
+        return self._parse(url, List[FileColumn], columns)
 
     def _download_file(self, url: str, out_file: str, json={}) -> int:
         return self._http_client.download(url, out_file, json)
@@ -83,24 +213,27 @@ class DatasetRepository:
 
     def _get_user_dataset_rating_by_slug(self, url: str) -> DatasetRatingList:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(DatasetRatingList, result)
+        return self._parse(url, DatasetRatingList, result)
 
     def _search(self, url: str) -> List[SearchResult]:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(List[SearchResult], result)
+        return self._parse(url, List[SearchResult], result)
 
     def _create_metadata(self, url: str, data: DatasetMetadata):
         result = self._http_client.request(
             HttpMethod.POST, url=url, data=data.json(by_alias=True))
-        return parse_obj_as(Dataset, result)
+        return self._parse(url, Dataset, result, method=HttpMethod.POST)
 
-    def _get_privacy_violations(self, url: str) -> List[PrivacyViolation]:
+    def _get_privacy_violations(self, url: str, stream: bool = False
+                                ) -> Union[List[PrivacyViolation], Iterator[PrivacyViolation]]:
+        if stream:
+            return self._stream(url, PrivacyViolation)
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(List[PrivacyViolation], result)
+        return self._parse(url, List[PrivacyViolation], result)
 
     def _get_privacy_violation(self, url: str) -> PrivacyViolation:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(PrivacyViolation, result)
+        return self._parse(url, PrivacyViolation, result)
 
     def _consider_privacy_violations(self, url: str) -> bool:
         self._http_client.request(HttpMethod.PUT, url)
@@ -110,13 +243,16 @@ class DatasetRepository:
         self._http_client.request(HttpMethod.PUT, url)
         return True
 
-    def _get_access_permissions(self, url: str) -> List[AccessPermission]:
+    def _get_access_permissions(self, url: str, stream: bool = False
+                                ) -> Union[List[AccessPermission], Iterator[AccessPermission]]:
+        if stream:
+            return self._stream(url, AccessPermission)
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(List[AccessPermission], result)
+        return self._parse(url, List[AccessPermission], result)
 
     def _get_access_permission(self, url: str) -> AccessPermission:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(AccessPermission, result)
+        return self._parse(url, AccessPermission, result)
 
     def _approve_access_permissions(self, url: str) -> bool:
         self._http_client.request(HttpMethod.PUT, url)
@@ -128,7 +264,7 @@ class DatasetRepository:
 
     def _get_latest_pending(self, url: str) -> Dataset:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(Dataset, result)
+        return self._parse(url, Dataset, result)
 
     def _delete_resource(self, url: str) -> bool:
         self._http_client.request(HttpMethod.DELETE, url)
@@ -157,11 +293,11 @@ class DatasetRepository:
             result = self._http_client.request(
                 HttpMethod.POST, url=url, files=files, headers={})
 
-            return parse_obj_as(File, result[0])
+            return self._parse(url, File, result[0], method=HttpMethod.POST)
 
     def _get_files(self, url: str) -> List[File]:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(List[File], result)
+        return self._parse(url, List[File], result)
 
     def _update_columns_metadata(sefl, url: str):
         pass
@@ -172,11 +308,297 @@ class DatasetRepository:
 
     def _get_file_index(self, url: str) -> Index:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(Index, result)
+        return self._parse(url, Index, result)
 
     def _get_file_errors(self, url: str) -> FileErrors:
         result = self._http_client.request(HttpMethod.GET, url)
-        return parse_obj_as(FileErrors, result)
+        return self._parse(url, FileErrors, result)
 
     def _update_cell_value(self, url: str, data: dict):
         pass
+
+
+class AsyncDatasetRepository(DatasetRepository):
+    """
+    Asyncio counterpart of DatasetRepository.
+    Works on top of AsyncHttpClient and all methods have to be awaited.
+    """
+
+    def __init__(self, http_client: 'AsyncHttpClient') -> None:
+        self._http_client = http_client
+
+    async def _get_dataset(self, url: str, lazy: bool = False) -> Dataset:
+        dataset_json = await self._http_client.request(HttpMethod.GET, url=url)
+        return self._parse(url, Dataset, dataset_json, lazy)
+
+    async def _stream(self, url: str, item_type=None, lazy: bool = False) -> AsyncIterator[Any]:
+        mode = ParseMode.LAZY if lazy else self._http_client.parse_mode
+        async for item in self._http_client.stream(url):
+            yield item if item_type is None else parse(item_type, item, mode)
+
+    # Methods with stream option are not coroutines themselves, so that streamed
+    # results can be iterated with `async for` without awaiting first
+
+    def _get_dataset_list(self, url: str, lazy: bool = False, stream: bool = False):
+        if stream:
+            return self._stream(url, Dataset, lazy)
+        return self.__get_dataset_list(url, lazy)
+
+    async def __get_dataset_list(self, url: str, lazy: bool) -> List[Dataset]:
+        datasets_json = await self._http_client.request(HttpMethod.GET, url=url)
+        return self._parse(url, List[Dataset], datasets_json, lazy)
+
+    async def _iter_pages(self, url: str, get_page: Callable[[str], Awaitable[list]], page_size: int,
+                          offset: int = 0, total: Optional[int] = None,
+                          prefetch: bool = True) -> AsyncIterator[Any]:
+        import asyncio
+
+        pending = None
+        try:
+            page = await get_page(_page_url(url, page_size, offset))
+            while True:
+                if total is not None:
+                    page = page[:max(total - offset, 0)]
+                next_offset = offset + len(page)
+                more = len(page) > 0 and (total is None or next_offset < total)
+                if more and prefetch:
+                    # Tasks inherit context of the caller, including deadline, since Python 3.7
+                    pending = asyncio.ensure_future(get_page(_page_url(url, page_size, next_offset)))
+                for item in page:
+                    yield item
+                if not more:
+                    return
+                if pending is not None:
+                    page, pending = await pending, None
+                else:
+                    page = await get_page(_page_url(url, page_size, next_offset))
+                offset = next_offset
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    async def _iter_datasets(self, url: str, page_size: int = 100, total_url: Optional[str] = None,
+                             prefetch: bool = True, lazy: bool = False) -> AsyncIterator[Dataset]:
+        total = await self._get_total(total_url) if total_url is not None else None
+        datasets = self._iter_pages(url, lambda page_url: self._get_dataset_list(page_url, lazy),
+                                    page_size, total=total, prefetch=prefetch)
+        try:
+            async for dataset in datasets:
+                yield dataset
+        finally:
+            await datasets.aclose()
+
+    async def _scan(self, url: str, total_url: str, page_size: int = 100, max_workers: int = 8,
+                    ordered: bool = True, lazy: bool = False) -> AsyncIterator[Dataset]:
+        import asyncio
+
+        total = await self._get_total(total_url)
+        offsets = iter(range(0, total, page_size))
+        pending = deque()  # type: deque
+
+        async def fetch(offset: int) -> List[Dataset]:
+            end = min(offset + page_size, total)
+            datasets = []  # type: List[Dataset]
+            while offset < end:
+                page = await self._get_dataset_list(_page_url(url, end - offset, offset), lazy)
+                _check_page(url, page, offset, total)
+                datasets.extend(page[:end - offset])
+                offset += len(page)
+            return datasets
+
+        def submit() -> None:
+            offset = next(offsets, None)
+            if offset is not None:
+                pending.append(asyncio.ensure_future(fetch(offset)))
+
+        try:
+            for _ in range(max_workers):
+                submit()
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        pending.remove(task)
+                for task in done:
+                    page = await task
+                    submit()
+                    for dataset in page:
+                        yield dataset
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _get_total(self, url: str) -> int:
+        return await self._http_client.request(HttpMethod.GET, url=url)
+
+    async def _get_distinct_mimetypes(self, url: str) -> List[str]:
+        return await self._http_client.request(HttpMethod.GET, url=url)
+
+    def _get_file_rows_preview(self, url: str, stream: bool = False):
+        if stream:
+            return self._stream(url)
+        return self._http_client.request(HttpMethod.GET, url=url)
+
+    async def _paginate_file_by_id(self, url: str) -> Preview:
+        return await self._http_client.request(HttpMethod.GET, url=url)
+
+    async def _get_file_columns(self, url: str) -> List[FileColumn]:
+        columns = await self._http_client.request(HttpMethod.GET, url=url)
+        return self._parse(url, List[FileColumn], columns)
+
+    async def _download_file(self, url: str, out_file: str, json={}) -> int:
+        return await self._http_client.download(url, out_file, json)
+
+    async def _file_privacy_violations(self, url: str, data: dict) -> str:
+        body = {
+            "datasetId": data['datasetId'],
+            "description": data['description']
+        }
+        await self._http_client.request(HttpMethod.POST, url, body)
+        return 'Submitted'
+
+    async def _apply_for_access(self, url: str, data: dict):
+        body = {
+            "datasetId": data['datasetId'],
+            "description": data['description']
+        }
+        await self._http_client.request(HttpMethod.POST, url, body)
+        return 'Submitted'
+
+    async def _rate_dataset(self, url: str, data: dict) -> str:
+        body = {
+            "datasetId": data['datasetId'],
+            "qualityRating": data['qualityRating'],
+            "metadataRating": data['metadataRating']
+        }
+        await self._http_client.request(HttpMethod.POST, url, body)
+        return 'Submitted'
+
+    async def _get_dataset_rating_by_slug(self, url: str) -> str:
+        return await self._http_client.request(HttpMethod.GET, url=url)
+
+    async def _get_user_dataset_rating_by_slug(self, url: str) -> DatasetRatingList:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, DatasetRatingList, result)
+
+    async def _search(self, url: str) -> List[SearchResult]:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, List[SearchResult], result)
+
+    async def _create_metadata(self, url: str, data: DatasetMetadata):
+        result = await self._http_client.request(
+            HttpMethod.POST, url=url, data=data.json(by_alias=True))
+        return self._parse(url, Dataset, result, method=HttpMethod.POST)
+
+    def _get_privacy_violations(self, url: str, stream: bool = False):
+        if stream:
+            return self._stream(url, PrivacyViolation)
+        return self.__get_privacy_violations(url)
+
+    async def __get_privacy_violations(self, url: str) -> List[PrivacyViolation]:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, List[PrivacyViolation], result)
+
+    async def _get_privacy_violation(self, url: str) -> PrivacyViolation:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, PrivacyViolation, result)
+
+    async def _consider_privacy_violations(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    async def _disregard_privacy_violations(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    def _get_access_permissions(self, url: str, stream: bool = False):
+        if stream:
+            return self._stream(url, AccessPermission)
+        return self.__get_access_permissions(url)
+
+    async def __get_access_permissions(self, url: str) -> List[AccessPermission]:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, List[AccessPermission], result)
+
+    async def _get_access_permission(self, url: str) -> AccessPermission:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, AccessPermission, result)
+
+    async def _approve_access_permissions(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    async def _decline_access_permissions(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    async def _get_latest_pending(self, url: str) -> Dataset:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, Dataset, result)
+
+    async def _delete_resource(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.DELETE, url)
+        return True
+
+    async def _update_dataset(self, url: str, data: dict) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url, data)
+        return True
+
+    async def _discard_dataset(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    async def _publish_dataset(self, url: str) -> bool:
+        await self._http_client.request(HttpMethod.PUT, url)
+        return True
+
+    async def _upload_file(self, url: str, file_name: str, file_type: str, file_path: str):
+        # httpx reads the file in 64 KiB chunks while sending, but the reads block the event loop.
+        # Multipart bodies do not accept async iterators and retries need a file that can be rewound.
+        with open(file_path, 'rb') as file:
+            files = [
+                ('files',
+                 (file_name, file, file_type))
+            ]
+            result = await self._http_client.request(
+                HttpMethod.POST, url=url, files=files, headers={})
+
+            return self._parse(url, File, result[0], method=HttpMethod.POST)
+
+    async def _get_files(self, url: str) -> List[File]:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, List[File], result)
+
+    async def _update_columns_metadata(self, url: str):
+        pass
+
+    async def _create_file_indices(self, url: str, data: dict) -> bool:
+        await self._http_client.request(HttpMethod.POST, url, data)
+        return True
+
+    async def _get_file_index(self, url: str) -> Index:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, Index, result)
+
+    async def _get_file_errors(self, url: str) -> FileErrors:
+        result = await self._http_client.request(HttpMethod.GET, url)
+        return self._parse(url, FileErrors, result)
+
+    async def _update_cell_value(self, url: str, data: dict):
+        pass
+
+
+def _check_page(url: str, page: list, offset: int, total: int) -> None:
+    """
+    Raises AvaandmedException if page is empty although total says there are more items.
+    """
+    if not page:
+        raise AvaandmedException(
+            f"{url} returned no datasets at offset {offset}, expected {total} in total")
+
+
+def _page_url(url: str, limit: int, offset: int) -> str:
+    separator = '&' if '?' in url else '?'
+    return f"{url}{separator}limit={limit}&offset={offset}"
@@ -4,6 +4,16 @@ from enum import Enum
 
 from pydantic import Field
 from avaandmed.api_resources import ApiResource
+from avaandmed.parsing.compact import compact_model
+from avaandmed.api_resources.reference import (
+    Category,
+    CoordinateReferenceSystem,
+    EmsCategory,
+    KeywordInfo,
+    Language,
+    Licence,
+    Region
+)
 from avaandmed.api_resources.users.user import User
 
 
@@ -23,6 +33,9 @@ class Keyword(ApiResource):
     keyword_ems_category: KeywordEmsCategory
 
 
+CompactKeyword = compact_model(Keyword, interned=('name', 'language'))
+
+
 class Citation(ApiResource):
     """
     Handles citations serialization in Dataset model.
@@ -39,52 +52,6 @@ class Conformity(ApiResource):
     specification: str
 
 
-class Licence(ApiResource):
-    """
-    Handles licences serialization.
-    """
-    id: str
-    name: str
-    description: str
-    code: Optional[str]
-    identifier: Optional[str]
-
-
-class CoordinateReferenceSystem(ApiResource):
-    """
-    Handles coordinateReferenceSystems serialization in Dataset model.
-    """
-    id: int
-    uri: str
-
-
-class Category(ApiResource):
-    """
-    Handles categories serialization.
-    """
-    id: int
-    name: str
-    description: Optional[str]
-    ems_ids: Optional[List[int]]
-
-
-class EmsCategory(ApiResource):
-    """
-    Handles Ems categories serialization.
-    """
-    id: int
-    name: str
-
-
-class Region(ApiResource):
-    """
-    Handles regions serialization.
-    """
-    id: int
-    name: str
-    coordinates: Optional[str]
-
-
 class ProcessingStatus(Enum):
     NONE = 'none'
     PENDING = 'pending'
@@ -106,6 +73,9 @@ class File(ApiResource):
     storage_filename: str
 
 
+CompactFile = compact_model(File, interned=('mimetype', 'dataset_id'))
+
+
 class UpdateIntervalUnit(str, Enum):
     """
     Handles updateIntervalUnit field deserialization in Dataset model.
@@ -227,6 +197,9 @@ class SearchResult(ApiResource):
     categories_en: Optional[List[str]]
 
 
+CompactSearchResult = compact_model(SearchResult, interned=(
+    'keywords', 'keywords_et', 'keywords_en', 'categories', 'categories_et', 'categories_en'))
+
 Preview = List[Dict[str, Any]]
 
 
@@ -285,17 +258,6 @@ class DatasetRating(ApiResource):
 DatasetRatingList = List[DatasetRating]
 
 
-class Language(ApiResource):
-    code: str
-    name: str
-
-
-class KeywordInfo(ApiResource):
-    id: int
-    name: str
-    ems_id: Optional[str]
-
-
 class DatasetMetadata(ApiResource):
     name_et: str = Field(...)
     name_en: str = Field(...)
@@ -13,3 +13,12 @@ class Organizations:
             from avaandmed.api_resources.organizations.my_organization import MyOrganization
             self._my_organization = MyOrganization(self._id, self._http_client)
         return self._my_organization
+
+
+class AsyncOrganizations(Organizations):
+    @property
+    def my_orgranization(self):
+        if self._my_organization is None:
+            from avaandmed.api_resources.organizations.my_organization import AsyncMyOrganization
+            self._my_organization = AsyncMyOrganization(self._id, self._http_client)
+        return self._my_organization
@@ -1,9 +1,10 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Union
 
-from pydantic.tools import parse_obj_as
+from avaandmed.api_resources import parse_response
 from avaandmed.api_resources.datasets.dataset import Dataset
-from avaandmed.api_resources.datasets.dataset_repository import DatasetRepository
+from avaandmed.api_resources.datasets.dataset_repository import AsyncDatasetRepository, DatasetRepository
 from avaandmed.api_resources.organizations.organization import Organization
+from avaandmed.exceptions import AvaandmedException
 from avaandmed.http.http_client import HttpClient, HttpMethod
 from avaandmed.api_resources.entities import (
     AccessPermission,
@@ -16,6 +17,9 @@ from avaandmed.api_resources.entities import (
     PrivacyViolation)
 from avaandmed.utils import build_endpoint
 
+if TYPE_CHECKING:
+    from avaandmed.http.async_http_client import AsyncHttpClient
+
 
 class MyOrganization:
     """
@@ -42,7 +46,7 @@ class MyOrganization:
         """
         url = self._ENDPOINT
         organizations_json = self._http_client.request(HttpMethod.GET, url=url)
-        return parse_obj_as(List[Organization], organizations_json)
+        return parse_response(self._http_client, url, List[Organization], organizations_json)
 
     def get_my_org_by_id(self, id: str) -> Organization:
         """
@@ -50,7 +54,7 @@ class MyOrganization:
         """
         url = f"{self._ENDPOINT}/{id}"
         organization = self._http_client.request(HttpMethod.GET, url=url)
-        return parse_obj_as(Organization, organization)
+        return parse_response(self._http_client, url, Organization, organization)
 
 
 class OrganizationDataset:
@@ -72,35 +76,54 @@ class OrganizationDataset:
         url = self.__build_url(['slug', slug])
         return self._dataset_repository._get_dataset(url)
 
-    def get_dataset_list(self) -> List[Dataset]:
+    def get_dataset_list(self, stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
         """
         Retrieve list of all Datasets. Default limit is 20, but can be adjusted.
+        For organizations with many Datasets stream=True returns an iterator instead.
         """
         url = f"{self._ENDPOINT}"
-        return self._dataset_repository._get_dataset_list(url)
+        return self._dataset_repository._get_dataset_list(url, stream=stream)
+
+    def iter_datasets(self, page_size: int = 100, prefetch: bool = True,
+                      lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Iterates over all Datasets, requesting them page_size at a time until an empty
+        page is returned. With prefetch the next page is requested in background while
+        the current one is processed.
+        """
+        if page_size <= 0:
+            raise AvaandmedException('Page size cannot be 0 or less.')
 
-    def get_file_rows_preview(self, id: str, file_id: str) -> Preview:
+        return self._dataset_repository._iter_datasets(
+            self._ENDPOINT, page_size, prefetch=prefetch, lazy=lazy)
+
+    def get_file_rows_preview(self, id: str, file_id: str,
+                              stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
         """
         Preview file rows in the way, how end user will see them. 
         Returns object according to the provided data in the dataset's file.
         Returns Preview which is a type alias for List[Dict[str, Any]].
+        stream=True returns rows through an iterator while they are received.
         """
         url = self.__build_url([id, 'files', file_id, 'preview'])
-        return self._dataset_repository._get_file_rows_preview(url)
+        return self._dataset_repository._get_file_rows_preview(url, stream)
 
-    def get_shared_datasets(self) -> List[Dataset]:
+    def get_shared_datasets(self, stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
         """
-        Retrieves list of Datasets shared with the user.
+        Retrieves list of Datasets shared with the organization.
+        Iterator of them is returned with stream=True.
         """
         url = self.__build_url(['shared-with-me'])
-        return self._dataset_repository._get_dataset_list(url)
+        return self._dataset_repository._get_dataset_list(url, stream=stream)
 
-    def get_all_privacy_violations(self) -> List[PrivacyViolation]:
+    def get_all_privacy_violations(self, stream: bool = False
+                                   ) -> Union[List[PrivacyViolation], Iterator[PrivacyViolation]]:
         """
-        Retrieves list of privacy violations related to user.
+        Retrieves list of privacy violations related to Datasets of the organization.
+        stream=True returns an iterator, so violations can be considered as they arrive.
         """
         url = self.__build_url(['privacy-violations'])
-        return self._dataset_repository._get_privacy_violations(url)
+        return self._dataset_repository._get_privacy_violations(url, stream)
 
     def get_privacy_violation(self, id: str) -> PrivacyViolation:
         """
@@ -125,12 +148,14 @@ class OrganizationDataset:
         url = self.__build_url(['privacy-violations', id, 'disregard'])
         return self._dataset_repository._disregard_privacy_violations(url)
 
-    def get_all_access_permissions(self) -> List[AccessPermission]:
+    def get_all_access_permissions(self, stream: bool = False
+                                   ) -> Union[List[AccessPermission], Iterator[AccessPermission]]:
         """
-        Retrieves list of all access permissions.
+        Retrieves list of all access permissions to Datasets of the organization.
+        Returns an iterator instead of a list with stream=True.
         """
         url = self.__build_url(['access-permissions'])
-        return self._dataset_repository._get_access_permissions(url)
+        return self._dataset_repository._get_access_permissions(url, stream)
 
     def get_access_permission(self, id: str) -> AccessPermission:
         """
@@ -235,14 +260,16 @@ class OrganizationDataset:
         url = self.__build_url([id, 'files', file_id, 'indices'])
         return self._dataset_repository._get_file_index(url)
 
-    def get_file_rows_with_errors(self, id: str, file_id: str) -> Preview:
+    def get_file_rows_with_errors(self, id: str, file_id: str,
+                                  stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
         """
         Get processed file's rows that do not confirm to the constraints set by the information holder. 
         Useful during data quality improvements.
         Returns object according to the provided data in the dataset's file
+        stream=True returns an iterator, so a file with many invalid rows is not held in memory.
         """
         url = self.__build_url([id, 'files', file_id])
-        return self._dataset_repository._get_file_rows_preview(url)
+        return self._dataset_repository._get_file_rows_preview(url, stream)
 
     def delete_file(self, id: str, file_id: str) -> bool:
         """
@@ -284,3 +311,44 @@ class OrganizationDataset:
 
     def __build_url(self, url_values: List[str]):
         return build_endpoint(self._ENDPOINT, url_values)
+
+
+class AsyncMyOrganization(MyOrganization):
+    """
+    Asyncio counterpart of MyOrganization.
+    """
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            base_end_point = f"{self._ENDPOINT}/{self._id}/datasets"
+            self._dataset = AsyncOrganizationDataset(
+                base_end_point, self._http_client)
+        return self._dataset
+
+    async def get_list_my_orgs(self) -> List[Organization]:
+        """
+        Retrieves list of organizations user belongs to.
+        """
+        url = self._ENDPOINT
+        organizations_json = await self._http_client.request(HttpMethod.GET, url=url)
+        return parse_response(self._http_client, url, List[Organization], organizations_json)
+
+    async def get_my_org_by_id(self, id: str) -> Organization:
+        """
+        Retrieves user's organization by ID.
+        """
+        url = f"{self._ENDPOINT}/{id}"
+        organization = await self._http_client.request(HttpMethod.GET, url=url)
+        return parse_response(self._http_client, url, Organization, organization)
+
+
+class AsyncOrganizationDataset(OrganizationDataset):
+    """
+    Asyncio counterpart of OrganizationDataset.
+    Provides the same methods, but all of them have to be awaited.
+    """
+
+    def __init__(self, base_end_point: str, http_client: 'AsyncHttpClient') -> None:
+        self._ENDPOINT = base_end_point
+        self._dataset_repository = AsyncDatasetRepository(http_client)
@@ -0,0 +1,60 @@
+from typing import List, Optional
+
+from avaandmed.api_resources import ApiResource
+
+
+class Licence(ApiResource):
+    """
+    Handles licences serialization.
+    """
+    id: str
+    name: str
+    description: str
+    code: Optional[str]
+    identifier: Optional[str]
+
+
+class CoordinateReferenceSystem(ApiResource):
+    """
+    Handles coordinateReferenceSystems serialization in Dataset model.
+    """
+    id: int
+    uri: str
+
+
+class Category(ApiResource):
+    """
+    Handles categories serialization.
+    """
+    id: int
+    name: str
+    description: Optional[str]
+    ems_ids: Optional[List[int]]
+
+
+class EmsCategory(ApiResource):
+    """
+    Handles Ems categories serialization.
+    """
+    id: int
+    name: str
+
+
+class Region(ApiResource):
+    """
+    Handles regions serialization.
+    """
+    id: int
+    name: str
+    coordinates: Optional[str]
+
+
+class Language(ApiResource):
+    code: str
+    name: str
+
+
+class KeywordInfo(ApiResource):
+    id: int
+    name: str
+    ems_id: Optional[str]
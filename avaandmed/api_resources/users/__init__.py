@@ -12,3 +12,12 @@ class Users:
             from avaandmed.api_resources.users.me import Me
             self._me = Me(self._http_client)
         return self._me
+
+
+class AsyncUsers(Users):
+    @property
+    def me(self):
+        if self._me is None:
+            from avaandmed.api_resources.users.me import AsyncMe
+            self._me = AsyncMe(self._http_client)
+        return self._me
@@ -1,6 +1,6 @@
-from typing import List
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Union
 from avaandmed.api_resources.datasets.dataset import Dataset
-from avaandmed.api_resources.datasets.dataset_repository import DatasetRepository
+from avaandmed.api_resources.datasets.dataset_repository import AsyncDatasetRepository, DatasetRepository
 from avaandmed.exceptions import AvaandmedException
 from avaandmed.http.http_client import HttpClient
 from avaandmed.api_resources.entities import (
@@ -14,6 +14,9 @@ from avaandmed.api_resources.entities import (
     PrivacyViolation)
 from avaandmed.utils import build_endpoint
 
+if TYPE_CHECKING:
+    from avaandmed.http.async_http_client import AsyncHttpClient
+
 
 class Me:
     """
@@ -52,35 +55,54 @@ class UserDataset:
         url = self.__build_url(['slug', slug])
         return self._dataset_repository._get_dataset(url)
 
-    def get_dataset_list(self) -> List[Dataset]:
+    def get_dataset_list(self, stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
         """
         Retrieve list of all Datasets. Default limit is 20, but can be adjusted.
+        stream=True returns an iterator over them instead of a list.
         """
         url = f"{self._ENDPOINT}"
-        return self._dataset_repository._get_dataset_list(url)
+        return self._dataset_repository._get_dataset_list(url, stream=stream)
+
+    def iter_datasets(self, page_size: int = 100, prefetch: bool = True,
+                      lazy: bool = False) -> Iterator[Dataset]:
+        """
+        Iterates over all Datasets, requesting them page_size at a time until an empty
+        page is returned. With prefetch the next page is requested in background while
+        the current one is processed.
+        """
+        if page_size <= 0:
+            raise AvaandmedException('Page size cannot be 0 or less.')
+
+        return self._dataset_repository._iter_datasets(
+            self._ENDPOINT, page_size, prefetch=prefetch, lazy=lazy)
 
-    def get_file_rows_preview(self, id: str, file_id: str) -> Preview:
+    def get_file_rows_preview(self, id: str, file_id: str,
+                              stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
         """
         Preview file rows in the way, how end user will see them. 
         Returns object according to the provided data in the dataset's file.
-        Returns Preview which is a type alias for List[Dict[str, Any]].
+        Returns Preview which is a type alias for List[Dict[str, Any]],
+        or an iterator of the same rows with stream=True.
         """
         url = self.__build_url([id, 'files', file_id, 'preview'])
-        return self._dataset_repository._get_file_rows_preview(url)
+        return self._dataset_repository._get_file_rows_preview(url, stream)
 
-    def get_shared_datasets(self) -> List[Dataset]:
+    def get_shared_datasets(self, stream: bool = False) -> Union[List[Dataset], Iterator[Dataset]]:
         """
         Retrieves list of Datasets shared with the user.
+        With stream=True shared Datasets can be processed before the whole list is received.
         """
         url = self.__build_url(['shared-with-me'])
-        return self._dataset_repository._get_dataset_list(url)
+        return self._dataset_repository._get_dataset_list(url, stream=stream)
 
-    def get_all_privacy_violations(self) -> List[PrivacyViolation]:
+    def get_all_privacy_violations(self, stream: bool = False
+                                   ) -> Union[List[PrivacyViolation], Iterator[PrivacyViolation]]:
         """
         Retrieves list of privacy violations related to user.
+        stream=True iterates over violations without loading all of them first.
         """
         url = self.__build_url(['privacy-violations'])
-        return self._dataset_repository._get_privacy_violations(url)
+        return self._dataset_repository._get_privacy_violations(url, stream)
 
     def get_privacy_violation(self, id: str) -> PrivacyViolation:
         """
@@ -105,12 +127,14 @@ class UserDataset:
         url = self.__build_url(['privacy-violations', id, 'disregard'])
         return self._dataset_repository._disregard_privacy_violations(url)
 
-    def get_all_access_permissions(self) -> List[AccessPermission]:
+    def get_all_access_permissions(self, stream: bool = False
+                                   ) -> Union[List[AccessPermission], Iterator[AccessPermission]]:
         """
         Retrieves list of all access permissions.
+        stream=True returns an iterator, e.g. to approve or decline permissions one by one.
         """
         url = self.__build_url(['access-permissions'])
-        return self._dataset_repository._get_access_permissions(url)
+        return self._dataset_repository._get_access_permissions(url, stream)
 
     def get_access_permission(self, id: str) -> AccessPermission:
         """
@@ -215,14 +239,16 @@ class UserDataset:
         url = self.__build_url([id, 'files', file_id, 'indices'])
         return self._dataset_repository._get_file_index(url)
 
-    def get_file_rows_with_errors(self, id: str, file_id: str) -> Preview:
+    def get_file_rows_with_errors(self, id: str, file_id: str,
+                                  stream: bool = False) -> Union[Preview, Iterator[Dict[str, Any]]]:
         """
         Get processed file's rows that do not confirm to the constraints set by the information holder. 
         Useful during data quality improvements.
-        Returns object according to the provided data in the dataset's file
+        Returns object according to the provided data in the dataset's file.
+        Files with many invalid rows are better read with stream=True, which returns an iterator.
         """
         url = self.__build_url([id, 'files', file_id])
-        return self._dataset_repository._get_file_rows_preview(url)
+        return self._dataset_repository._get_file_rows_preview(url, stream)
 
     def delete_file(self, id: str, file_id: str) -> bool:
         """
@@ -264,3 +290,27 @@ class UserDataset:
 
     def __build_url(self, url_values: List[str]):
         return build_endpoint(self._ENDPOINT, url_values)
+
+
+class AsyncMe(Me):
+    """
+    Asyncio counterpart of Me.
+    """
+
+    @property
+    def dataset(self):
+        if self._dataset is None:
+            self._dataset = AsyncUserDataset(
+                base_end_point=self._ENDPOINT, http_client=self._http_client)
+        return self._dataset
+
+
+class AsyncUserDataset(UserDataset):
+    """
+    Asyncio counterpart of UserDataset.
+    Provides the same methods, but all of them have to be awaited.
+    """
+
+    def __init__(self, base_end_point: str, http_client: 'AsyncHttpClient') -> None:
+        self._ENDPOINT = f"{base_end_point}/datasets"
+        self._dataset_repository = AsyncDatasetRepository(http_client)
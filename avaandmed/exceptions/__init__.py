@@ -16,3 +16,15 @@ class AvaandmedApiExcepiton(AvaandmedException):
             message: {self.msg}
             details: {self.details}
         """
+
+
+class AvaandmedTimeoutException(AvaandmedException):
+    def __init__(self, uri: str, msg="") -> None:
+        self.uri = uri
+        self.msg = msg
+
+    def __str__(self) -> str:
+        return f"""
+            url: {self.uri}
+            message: {self.msg}
+        """
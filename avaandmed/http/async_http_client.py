@@ -0,0 +1,432 @@
+import asyncio
+from base64 import b64encode
+from typing import Any, AsyncIterator, Optional, Union
+
+from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedException, AvaandmedTimeoutException
+from avaandmed.http.auth import AsyncTokenCache, TokenStats
+from avaandmed.http.cache import CacheStats, HttpCache
+from avaandmed.http.coalesce import AsyncSingleFlight, CoalesceStats
+from avaandmed.http.instrumentation import (
+    AUTH, CONNECT, DECODE, READ, REQUEST, TTFB, Instrumentation)
+from avaandmed.http.http_client import HttpMethod, _check_deadline, _request_timeout, _rewind, _unwrap
+from avaandmed.http.json_codec import loads
+from avaandmed.http.json_stream import JsonItemParser
+from avaandmed.http.rate_limit import RateLimiter
+from avaandmed.http.retry import RetryPolicy, RetryStats
+from avaandmed.http.timeouts import DEFAULT_TIMEOUT, Timeout
+from avaandmed.parsing import ParseMode
+
+
+class AsyncHttpClient:
+    """
+    Asyncio counterpart of HttpClient.
+    Requires httpx which can be installed with `pip install avaandmed[async]`.
+    """
+
+    def __init__(self, hostname: str, api_key: str = None, key_id: str = None,
+                 token_refresh_margin: float = 30.0, scheme: str = 'https',
+                 max_connections: Optional[int] = 100, max_keepalive_connections: Optional[int] = 20,
+                 idle_timeout: Optional[float] = 60.0, retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, cache: Optional[HttpCache] = None,
+                 coalesce: bool = False, timeout: Union[Timeout, float, None] = DEFAULT_TIMEOUT,
+                 instrumentation: Optional[Instrumentation] = None, transport=None,
+                 parse_mode: Union[ParseMode, str] = ParseMode.VALIDATE) -> None:
+        """
+        max_connections limits number of requests in flight at the same time,
+        max_keepalive_connections is number of connections kept open for reuse and
+        idle_timeout is number of seconds after which unused connection is closed.
+        retry describes how transient failures are retried, by default RetryPolicy() is used.
+        rate_limiter delays requests to stay within allowed rate, it can be shared
+        with other clients, both sync and async.
+        cache stores GET responses and revalidates them with conditional requests.
+        coalesce makes identical GET requests in flight at the same time share
+        a single call to the server. Every caller gets its own decoded result.
+        timeout limits waiting for connection and for response, it can be
+        overridden per call. None waits forever.
+        instrumentation receives timings of requests, it can be shared with other clients.
+        transport can be any httpx async transport, e.g. httpx.MockTransport in tests.
+        parse_mode selects how responses are turned into models, see ParseMode.
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise AvaandmedException(
+                'AsyncHttpClient requires httpx. Install it with "pip install avaandmed[async]".')
+
+        self.__HEADERS = {
+            'Content-Type': 'application/json',
+            'Accept': '*/*',
+            'Connection': 'keep-alive'
+        }
+        self.__SCHEME = scheme
+        self.__BASE_ENDPOINT = 'api'
+        self.__api_key = api_key
+        self.__key_id = key_id
+        self.__HOSTNAME = hostname
+        self.__BASE_URL = f"{self.__SCHEME}://{self.__HOSTNAME}/{self.__BASE_ENDPOINT}"
+        self.__httpx = httpx
+        self.__client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=idle_timeout
+            ),
+            timeout=None,
+            transport=transport
+        )
+        self.__retry = retry if retry is not None else RetryPolicy()
+        self.__retry_stats = RetryStats()
+        self.__rate_limiter = rate_limiter
+        self.__cache = cache
+        self.__single_flight = AsyncSingleFlight() if coalesce else None
+        self.__timeout = Timeout.of(timeout)
+        self.__instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.__parse_mode = ParseMode(parse_mode)
+        self.__token_cache = AsyncTokenCache(
+            self.__get_token, refresh_margin=token_refresh_margin)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        await self.__client.aclose()
+
+    @property
+    def token_stats(self) -> TokenStats:
+        """
+        Counters of performed and avoided logins.
+        """
+        return self.__token_cache.stats
+
+    @property
+    def retry_stats(self) -> RetryStats:
+        """
+        Counters of retried and given up requests.
+        """
+        return self.__retry_stats
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        """
+        Counters of cache hits, misses and revalidations or None if client has no cache.
+        """
+        return self.__cache.stats if self.__cache is not None else None
+
+    @property
+    def coalesce_stats(self) -> Optional[CoalesceStats]:
+        """
+        Counters of sent and coalesced GET requests or None if coalescing is disabled.
+        """
+        return self.__single_flight.stats if self.__single_flight is not None else None
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """
+        Hooks receiving timed spans of requests made by the client.
+        """
+        return self.__instrumentation
+
+    @property
+    def parse_mode(self) -> ParseMode:
+        """
+        How responses of the client are turned into models.
+        """
+        return self.__parse_mode
+
+    async def __get_token(self) -> str:
+        """
+        Makes a requst to /auth/key-login endpoint and retrieves an access token
+        to authorize future requests.
+        """
+        key = f"{self.__key_id}:{self.__api_key}".encode('ascii')
+        headers = dict(self.__HEADERS)
+        headers['X-API-KEY'] = b64encode(key).decode('ascii')
+        auth_url = f"{self.__BASE_URL}/auth/key-login"
+
+        try:
+            with self.__instrumentation.span(AUTH, '/auth/key-login', 'POST') as span:
+                res = await self.__with_retries(
+                    HttpMethod.POST, lambda: self.__send(HttpMethod.POST, auth_url, headers),
+                    idempotent=True)
+                span.status = res.status_code
+        except self.__httpx.TimeoutException as ex:
+            raise AvaandmedTimeoutException(auth_url, str(ex))
+        except self.__httpx.HTTPError as ex:
+            raise SystemExit(ex)
+
+        if res.is_error:
+            raise AvaandmedApiExcepiton(
+                status=res.status_code,
+                uri=str(res.url),
+                msg=res.json()['message']
+            )
+
+        return loads(res.content)['data']['accessToken']
+
+    async def request(self, method: HttpMethod, url: str, data={}, files={}, headers=None,
+                      raw: bool = False, timeout: Union[Timeout, float, None] = None):
+        """
+        Generic request method to make request to the API.
+        Given headers replace default ones for this request only.
+        Transient failures are retried according to retry policy of the client.
+        Identical GET requests made at the same time are coalesced if enabled.
+        Response body is decoded once, raw=True returns it as bytes without decoding.
+        timeout replaces timeout of the client for this call. Requests made inside
+        `deadline()` block are not allowed to run past it.
+        """
+        single_flight = self.__single_flight
+        if method == HttpMethod.GET and headers is None and single_flight is not None:
+            # Responses depend on the account, so calls are scoped by key
+            key = f"{self.__key_id}:{method.name}:{url}"
+            # Callers share the body and decode their own copy of it, as results may be mutated
+            body = await single_flight.do(
+                key, lambda: self.__request(method, url, raw=True, timeout=timeout))
+            if raw:
+                return body
+            with self.__instrumentation.span(DECODE, url, method.name):
+                return _unwrap(method, body)
+        return await self.__request(method, url, data, files, headers, raw, timeout)
+
+    async def __request(self, method: HttpMethod, url: str, data={}, files={}, headers=None,
+                        raw: bool = False, timeout: Union[Timeout, float, None] = None):
+        """
+        GET responses are served from HTTP cache if client has one.
+        """
+        path = url
+        url = f"{self.__BASE_URL}{url}"
+        instrumentation = self.__instrumentation
+        cache = self.__cache
+        cache_key = None
+        entry = None
+
+        if method == HttpMethod.GET and cache is not None:
+            # Responses depend on the account, so cache is scoped by key
+            cache_key = f"{self.__key_id}:{url}"
+            entry = cache.lookup(cache_key)
+            if entry is not None and cache.is_fresh(entry):
+                cache.stats.record('hits')
+                with instrumentation.span(DECODE, path, method.name):
+                    return _unwrap(method, entry.body, raw)
+            headers = dict(self.__HEADERS if headers is None else headers)
+            headers.update(cache.conditional_headers(entry))
+
+        kwargs = {}
+        if isinstance(data, (str, bytes)):
+            kwargs['content'] = data
+        elif data:
+            kwargs['data'] = data
+        if files:
+            kwargs['files'] = files
+
+        def send():
+            _rewind(files)
+            return self.__authorized(method, url, headers, timeout=timeout, **kwargs)
+
+        try:
+            with instrumentation.span(REQUEST, path, method.name) as span:
+                res = await self.__with_retries(method, send)
+                span.status = res.status_code
+                span.size = len(res.content)
+        except self.__httpx.TimeoutException as ex:
+            raise AvaandmedTimeoutException(url, str(ex))
+        except self.__httpx.HTTPError as ex:
+            raise SystemExit(ex)
+
+        if res.is_error:
+            raise AvaandmedApiExcepiton(
+                status=res.status_code,
+                uri=url,
+                msg=res.json()['message'],
+            )
+
+        body = res.content
+        if cache_key is not None:
+            if res.status_code == 304 and entry is not None:
+                cache.stats.record('revalidations')
+                body = entry.body
+            else:
+                cache.stats.record('misses')
+                cache.store(cache_key, res.headers, body)
+
+        if raw:
+            return body
+        with instrumentation.span(DECODE, path, method.name):
+            return _unwrap(method, body)
+
+    async def download(self, url: str, destination: str, json={}, chunk_size: int = 65536,
+                       timeout: Union[Timeout, float, None] = None) -> int:
+        """
+        Streams response body into destination file chunk by chunk.
+        Read timeout applies to every chunk, deadline to the whole download.
+        """
+        download_url = f"{self.__BASE_URL}{url}"
+
+        def send():
+            return self.__authorized(HttpMethod.POST, download_url, json=json, stream=True,
+                                     timeout=timeout)
+
+        try:
+            # Download does not change anything on the server, so it is safe to retry
+            res = await self.__with_retries(HttpMethod.POST, send, idempotent=True)
+
+            try:
+                if res.is_error:
+                    await res.aread()
+                    raise AvaandmedApiExcepiton(
+                        status=res.status_code,
+                        uri=download_url,
+                        msg=res.json()['message'],
+                    )
+
+                with open(destination, 'wb') as outfile:
+                    async for chunk in res.aiter_bytes(chunk_size):
+                        outfile.write(chunk)
+                        _check_deadline(download_url)
+            finally:
+                await res.aclose()
+
+        except self.__httpx.TimeoutException as ex:
+            raise AvaandmedTimeoutException(download_url, str(ex))
+        except self.__httpx.HTTPError as ex:
+            raise SystemExit(ex)
+
+        return 0
+
+    async def stream(self, url: str, chunk_size: int = 65536,
+                     timeout: Union[Timeout, float, None] = None) -> AsyncIterator[Any]:
+        """
+        Makes GET request and yields items of `data` array of the response
+        as they are read from the socket, without loading the whole body.
+        Responses are not cached nor coalesced. Read timeout applies to every
+        chunk, deadline to the whole response.
+        """
+        path = url
+        url = f"{self.__BASE_URL}{url}"
+
+        def send():
+            return self.__authorized(HttpMethod.GET, url, stream=True, timeout=timeout)
+
+        try:
+            with self.__instrumentation.span(REQUEST, path, HttpMethod.GET.name) as span:
+                res = await self.__with_retries(HttpMethod.GET, send)
+                span.status = res.status_code
+
+            try:
+                if res.is_error:
+                    await res.aread()
+                    raise AvaandmedApiExcepiton(
+                        status=res.status_code,
+                        uri=url,
+                        msg=res.json()['message'],
+                    )
+
+                parser = JsonItemParser()
+                async for chunk in res.aiter_bytes(chunk_size):
+                    for item in parser.feed(chunk):
+                        yield item
+                    _check_deadline(url)
+                for item in parser.close():
+                    yield item
+            finally:
+                await res.aclose()
+
+        except self.__httpx.TimeoutException as ex:
+            raise AvaandmedTimeoutException(url, str(ex))
+        except self.__httpx.HTTPError as ex:
+            raise SystemExit(ex)
+
+    async def __with_retries(self, method: HttpMethod, send, idempotent: Optional[bool] = None):
+        """
+        Awaits send until it returns response that should not be retried,
+        sleeping in between according to retry policy.
+        """
+        httpx = self.__httpx
+        retry = self.__retry.start(method.name, self.__retry_stats, idempotent)
+        while True:
+            try:
+                res = await send()
+            except httpx.TransportError as ex:
+                connected = not isinstance(ex, (httpx.ConnectError, httpx.ConnectTimeout))
+                delay = retry.delay_for_error(ex, connected)
+                if delay is None:
+                    raise
+            else:
+                delay = retry.delay_for_status(
+                    res.status_code, res.headers.get('Retry-After'))
+                if delay is None:
+                    return res
+                await res.aclose()
+            await asyncio.sleep(delay)
+
+    async def __authorized(self, method: HttpMethod, url: str, headers=None, stream: bool = False, **kwargs):
+        """
+        Sends request with cached access token.
+        If token turns out to be revoked, logs in again and replays request once.
+        """
+        access_token = await self.__token_cache.get()
+        res = await self.__send(method, url, self.__headers(access_token, headers), stream, **kwargs)
+        if res.status_code == 401:
+            await res.aclose()
+            self.__token_cache.invalidate(access_token)
+            access_token = await self.__token_cache.get()
+            _rewind(kwargs.get('files'))
+            res = await self.__send(method, url, self.__headers(access_token, headers), stream, **kwargs)
+        return res
+
+    async def __send(self, method: HttpMethod, url: str, headers: dict, stream: bool = False,
+                     timeout: Union[Timeout, float, None] = None, **kwargs):
+        if self.__rate_limiter is not None:
+            await self.__rate_limiter.acquire_async(url[len(self.__BASE_URL):])
+        timeout = _request_timeout(url, self.__timeout if timeout is None else timeout)
+        request = self.__client.build_request(
+            method.name, url, headers=headers,
+            timeout=self.__httpx.Timeout(timeout.read, connect=timeout.connect), **kwargs)
+        instrumentation = self.__instrumentation
+        if not instrumentation.enabled:
+            return await self.__client.send(request, stream=stream)
+
+        # Body is read separately to tell waiting for the server from downloading
+        path = url[len(self.__BASE_URL):]
+        request.extensions['trace'] = _ConnectTracer(instrumentation, path, method.name)
+        with instrumentation.span(TTFB, path, method.name) as span:
+            res = await self.__client.send(request, stream=True)
+            span.status = res.status_code
+        if not stream:
+            with instrumentation.span(READ, path, method.name) as span:
+                span.size = len(await res.aread())
+        return res
+
+    def __headers(self, access_token: str, headers=None) -> dict:
+        request_headers = dict(self.__HEADERS if headers is None else headers)
+        request_headers['Authorization'] = f"Bearer {access_token}"
+        return request_headers
+
+
+class _ConnectTracer:
+    """
+    httpcore trace callback which reports time spent opening connection,
+    including TLS handshake, as a span.
+    """
+
+    def __init__(self, instrumentation: Instrumentation, path: str, method: str) -> None:
+        self.__instrumentation = instrumentation
+        self.__path = path
+        self.__method = method
+        self.__timer = None
+
+    async def __call__(self, event: str, info: dict) -> None:
+        if event == 'connection.connect_tcp.started':
+            self.__timer = self.__instrumentation.span(CONNECT, self.__path, self.__method)
+            self.__timer.__enter__()
+        elif self.__timer is not None and event in (
+                'connection.connect_tcp.failed', 'connection.start_tls.failed',
+                'connection.start_tls.complete', 'http11.send_request_headers.started',
+                'http2.send_connection_init.started'):
+            self.__timer.__exit__(None, None, None)
+            self.__timer = None
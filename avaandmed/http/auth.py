@@ -0,0 +1,180 @@
+import json
+import time
+from base64 import urlsafe_b64decode
+from threading import Lock
+from typing import Awaitable, Callable, Optional
+
+
+class TokenStats:
+    """
+    Counters describing how access tokens were obtained.
+    """
+
+    def __init__(self) -> None:
+        self.logins = 0
+        self.logins_avoided = 0
+        self.reauthentications = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'logins': self.logins,
+            'logins_avoided': self.logins_avoided,
+            'reauthentications': self.reauthentications
+        }
+
+    def __repr__(self) -> str:
+        return f"TokenStats({self.as_dict()})"
+
+
+class AccessToken:
+    """
+    Access token issued by /auth/key-login together with its expiry time.
+    """
+
+    def __init__(self, value: str, expires_at: float) -> None:
+        self.value = value
+        self.expires_at = expires_at
+
+    def is_fresh(self, margin: float, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.time()
+        return now < self.expires_at - margin
+
+
+def decode_expiry(token: str) -> Optional[float]:
+    """
+    Returns `exp` claim of JWT access token as unix timestamp.
+    Returns None if token is not JWT or has no expiry.
+    """
+    parts = token.split('.')
+    if len(parts) != 3:
+        return None
+
+    payload = parts[1]
+    payload += '=' * (-len(payload) % 4)
+    try:
+        claims = json.loads(urlsafe_b64decode(payload.encode('ascii')))
+        return float(claims['exp'])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class _BaseTokenCache:
+    """
+    Keeps single access token and decides whether it is still fresh.
+    """
+
+    def __init__(self, refresh_margin: float, default_ttl: float) -> None:
+        self._token = None  # type: Optional[AccessToken]
+        self.refresh_margin = refresh_margin
+        self.default_ttl = default_ttl
+        self.stats = TokenStats()
+
+    def _fresh_token(self) -> Optional[str]:
+        token = self._token
+        if token is not None and token.is_fresh(self.refresh_margin):
+            return token.value
+        return None
+
+    def _store(self, value: str) -> None:
+        expires_at = decode_expiry(value)
+        if expires_at is None:
+            expires_at = time.time() + self.default_ttl
+        self._token = AccessToken(value, expires_at)
+        self.stats.logins += 1
+
+    def _invalidate(self, value: str) -> None:
+        if self._token is not None and self._token.value == value:
+            self._token = None
+            self.stats.reauthentications += 1
+
+
+class TokenCache(_BaseTokenCache):
+    """
+    Caches access token until shortly before it expires.
+    Only one login is made when many threads ask for a token at the same time.
+    """
+
+    def __init__(self, login: Callable[[], str], refresh_margin: float = 30.0,
+                 default_ttl: float = 300.0) -> None:
+        super().__init__(refresh_margin, default_ttl)
+        self.__login = login
+        self.__lock = Lock()
+
+    def get(self) -> str:
+        """
+        Returns cached access token or logs in if there is no fresh one.
+        """
+        value = self._fresh_token()
+        if value is not None:
+            with self.__lock:
+                self.stats.logins_avoided += 1
+            return value
+
+        with self.__lock:
+            value = self._fresh_token()
+            if value is not None:
+                self.stats.logins_avoided += 1
+                return value
+
+            value = self.__login()
+            self._store(value)
+            return value
+
+    def invalidate(self, value: str) -> None:
+        """
+        Drops cached token if it is still the given one.
+        Tokens that have been already refreshed by other thread are kept.
+        """
+        with self.__lock:
+            self._invalidate(value)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self._token = None
+
+
+class AsyncTokenCache(_BaseTokenCache):
+    """
+    Asyncio counterpart of TokenCache.
+    Tasks waiting for a token share a single login.
+    """
+
+    def __init__(self, login: Callable[[], Awaitable[str]], refresh_margin: float = 30.0,
+                 default_ttl: float = 300.0) -> None:
+        super().__init__(refresh_margin, default_ttl)
+        self.__login = login
+        self.__lock = None  # type: Optional[asyncio.Lock]
+
+    async def get(self) -> str:
+        """
+        Returns cached access token or logs in if there is no fresh one.
+        """
+        value = self._fresh_token()
+        if value is not None:
+            self.stats.logins_avoided += 1
+            return value
+
+        # Lock is created lazily so it belongs to the running event loop
+        if self.__lock is None:
+            import asyncio
+            self.__lock = asyncio.Lock()
+
+        async with self.__lock:
+            value = self._fresh_token()
+            if value is not None:
+                self.stats.logins_avoided += 1
+                return value
+
+            value = await self.__login()
+            self._store(value)
+            return value
+
+    def invalidate(self, value: str) -> None:
+        """
+        Drops cached token if it is still the given one.
+        """
+        self._invalidate(value)
+
+    def clear(self) -> None:
+        self._token = None
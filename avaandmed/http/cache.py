@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Mapping, Optional
+
+
+class CacheEntry:
+    """
+    Cached response body together with its validators.
+    """
+
+    def __init__(self, body: bytes, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None, stored_at: Optional[float] = None) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at if stored_at is not None else time.time()
+
+    @property
+    def has_validators(self) -> bool:
+        return self.etag is not None or self.last_modified is not None
+
+
+class CacheStats:
+    """
+    Counters of cache usage.
+    hits are responses served without a request, revalidations are
+    responses served from cache after 304 Not Modified, misses are responses
+    which had to be downloaded.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+    def record(self, outcome: str) -> None:
+        with self.__lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def as_dict(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations
+        }
+
+    def __repr__(self) -> str:
+        return f"CacheStats({self.as_dict()})"
+
+
+class MemoryCache:
+    """
+    In-memory storage which evicts least recently used entries
+    once there are more than max_entries of them.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.__entries = OrderedDict()  # type: OrderedDict
+        self.__lock = Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self.__lock:
+            self.__entries[key] = entry
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+
+class DiskCache:
+    """
+    Storage which keeps every entry in a separate file of given directory,
+    so that cache survives restarts and can be shared between processes.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Returns stored entry, None if it is missing, truncated or unreadable.
+        """
+        try:
+            with open(self.__path(key), 'rb') as f:
+                header = json.loads(f.readline())
+                body = f.read()
+            if header.get('size', len(body)) != len(body):
+                return None
+            return CacheEntry(body, header['etag'], header['last_modified'], header['stored_at'])
+        except (OSError, ValueError, AttributeError, KeyError, TypeError):
+            return None
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        header = json.dumps({
+            'etag': entry.etag,
+            'last_modified': entry.last_modified,
+            'stored_at': entry.stored_at,
+            'size': len(entry.body)
+        }).encode('utf-8')
+        # Every writer gets its own temporary file, readers never see partially written one
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(header + b'\n' + entry.body)
+            os.replace(tmp_path, self.__path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self.__path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            if name.endswith('.entry'):
+                os.remove(os.path.join(self.directory, name))
+
+    def __path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.entry")
+
+
+class HttpCache:
+    """
+    Conditional request cache for GET responses.
+    Responses with ETag or Last-Modified are revalidated with If-None-Match and
+    If-Modified-Since headers and served from cache on 304 Not Modified.
+    Responses without validators are served from cache for `ttl` seconds.
+    Storage is MemoryCache by default, DiskCache keeps responses between runs.
+    """
+
+    def __init__(self, storage=None, ttl: float = 60.0) -> None:
+        self.storage = storage if storage is not None else MemoryCache()
+        self.ttl = ttl
+        self.stats = CacheStats()
+
+    def lookup(self, key: str) -> Optional[CacheEntry]:
+        return self.storage.get(key)
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        Entries without validators can be used without asking the server until TTL passes.
+        """
+        return not entry.has_validators and time.time() - entry.stored_at < self.ttl
+
+    def conditional_headers(self, entry: Optional[CacheEntry]) -> dict:
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def store(self, key: str, headers: Mapping[str, str], body: bytes) -> None:
+        if 'no-store' in headers.get('Cache-Control', ''):
+            return
+        entry = CacheEntry(body, headers.get('ETag'), headers.get('Last-Modified'))
+        self.storage.set(key, entry)
+
+    def clear(self) -> None:
+        self.storage.clear()
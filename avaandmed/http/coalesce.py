@@ -0,0 +1,122 @@
+from threading import Event, Lock
+from typing import Any, Awaitable, Callable, Dict
+
+
+class CoalesceStats:
+    """
+    Counters of coalesced requests.
+    calls are requests actually sent, coalesced are requests which waited
+    for an identical request already in flight and shared its result.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def record(self, coalesced: bool) -> None:
+        with self.__lock:
+            if coalesced:
+                self.coalesced += 1
+            else:
+                self.calls += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'coalesced': self.coalesced
+        }
+
+    def __repr__(self) -> str:
+        return f"CoalesceStats({self.as_dict()})"
+
+
+class _Call:
+    """
+    Request in flight together with its outcome.
+    """
+
+    def __init__(self) -> None:
+        self.done = Event()
+        self.result = None
+        self.error = None  # type: BaseException
+
+
+class SingleFlight:
+    """
+    Collapses identical calls made by many threads at the same time into one.
+    The first caller runs the function, others wait for it and get the same
+    result or exception. Results are shared, so fn should return immutable values,
+    e.g. bytes of the response body.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.__calls = {}  # type: Dict[str, _Call]
+        self.stats = CoalesceStats()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self.__lock:
+            call = self.__calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self.__calls[key] = call
+
+        self.stats.record(coalesced=not leader)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as ex:
+            call.error = ex
+            raise
+        finally:
+            # Calls started after this point go to the server again
+            with self.__lock:
+                del self.__calls[key]
+            call.done.set()
+        return call.result
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio counterpart of SingleFlight.
+    Tasks asking for the same key while a call is in flight await its result.
+    """
+
+    def __init__(self) -> None:
+        self.__calls = {}  # type: Dict[str, asyncio.Future]
+        self.stats = CoalesceStats()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        import asyncio
+
+        future = self.__calls.get(key)
+        if future is not None:
+            self.stats.record(coalesced=True)
+            # Cancelling a waiter must not cancel the shared call
+            return await asyncio.shield(future)
+
+        self.stats.record(coalesced=False)
+        future = asyncio.get_event_loop().create_future()
+        self.__calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as ex:
+            future.set_exception(ex)
+            # Marks exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self.__calls[key]
@@ -0,0 +1,57 @@
+import re
+from functools import lru_cache
+
+AUTH = 'auth'
+CATALOG = 'catalog'
+FILE_ROWS = 'file_rows'
+DOWNLOADS = 'downloads'
+
+_FILE_ROWS_PATTERN = re.compile(r'/files/[^/]+(/preview|/errors)?$')
+_DOWNLOADS_PATTERN = re.compile(r'/(download|download-from-url)$')
+
+# Fixed path segments of the API, every other segment is an identifier
+_LITERALS = frozenset([
+    'api', 'auth', 'key-login', 'datasets', 'organizations', 'my-organizations', 'users', 'me',
+    'files', 'preview', 'errors', 'columns', 'metadata', 'indices', 'row', 'download',
+    'download-from-url', 'upload', 'privacy-violations', 'access-permissions', 'consider',
+    'disregard', 'approve', 'decline', 'latest', 'pending', 'discard', 'publish', 'total',
+    'mimetypes', 'distinct', 'slug', 'rating', 'ratings', 'shared-with-me', 'search',
+    'keywords', 'categories', 'euro-categories', 'ems-categories', 'regions', 'languages',
+    'licences', 'coordinateReferenceSystems'
+])
+
+
+def endpoint_group(path: str) -> str:
+    """
+    Returns name of the group API endpoint belongs to.
+    Path is given relative to API base url, i.e. /datasets/{id}.
+    """
+    path = path.split('?', 1)[0]
+    if path.startswith('/auth/'):
+        return AUTH
+    if _DOWNLOADS_PATTERN.search(path):
+        return DOWNLOADS
+    if _FILE_ROWS_PATTERN.search(path):
+        return FILE_ROWS
+    return CATALOG
+
+
+@lru_cache(maxsize=1024)
+def endpoint_template(path: str) -> str:
+    """
+    Replaces identifiers in the path with placeholders, so that
+    /datasets/8d68.../files/b88c... becomes /datasets/{id}/files/{fileId}.
+    Query string is dropped.
+    """
+    segments = path.split('?', 1)[0].split('/')
+    template = []
+    for i, segment in enumerate(segments):
+        if segment == '' or segment in _LITERALS:
+            template.append(segment)
+        elif segments[i - 1] == 'files':
+            template.append('{fileId}')
+        elif segments[i - 1] in ('slug', 'rating') or segments[i + 1:i + 2] == ['ratings']:
+            template.append('{slug}')
+        else:
+            template.append('{id}')
+    return '/'.join(template)
@@ -1,8 +1,23 @@
-from requests import Session, exceptions
+import time
+from requests import exceptions
+from urllib3.exceptions import ReadTimeoutError
 from base64 import b64encode
 from enum import Enum
+from typing import Any, Iterator, Optional, Union
 
-from avaandmed.exceptions import AvaandmedApiExcepiton
+from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedTimeoutException
+from avaandmed.http.auth import TokenCache, TokenStats
+from avaandmed.http.cache import CacheStats, HttpCache
+from avaandmed.http.coalesce import CoalesceStats, SingleFlight
+from avaandmed.http.instrumentation import (
+    AUTH, DECODE, READ, REQUEST, TTFB, Instrumentation, tracking)
+from avaandmed.http.json_codec import loads
+from avaandmed.http.json_stream import JsonItemParser
+from avaandmed.http.rate_limit import RateLimiter
+from avaandmed.http.retry import RetryPolicy, RetryStats
+from avaandmed.http.timeouts import DEFAULT_TIMEOUT, Timeout, remaining_time
+from avaandmed.http.transport import RequestsTransport, Transport
+from avaandmed.parsing import ParseMode
 
 
 class HttpMethod(Enum):
@@ -22,108 +37,265 @@ class HttpClient:
     Class that is responsible for basic HTTP logic for the client.
     """
 
-    def __init__(self, hostname: str, api_key: str = None, key_id: str = None) -> None:
+    def __init__(self, hostname: str, api_key: str = None, key_id: str = None,
+                 token_refresh_margin: float = 30.0, scheme: str = 'https',
+                 pool_connections: int = 10, pool_maxsize: int = 10,
+                 idle_timeout: Optional[float] = 60.0, retry: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None, cache: Optional[HttpCache] = None,
+                 coalesce: bool = False, timeout: Union[Timeout, float, None] = DEFAULT_TIMEOUT,
+                 instrumentation: Optional[Instrumentation] = None,
+                 transport: Optional[Transport] = None,
+                 parse_mode: Union[ParseMode, str] = ParseMode.VALIDATE) -> None:
+        """
+        Connections are kept open and reused between requests.
+        pool_connections is number of hosts to keep pools for, pool_maxsize is
+        maximum number of connections kept per host and idle_timeout is number of
+        seconds after which unused connections are dropped instead of reused.
+        Instance can be shared between threads, pool_maxsize should be at least
+        the number of threads using it.
+        retry describes how transient failures are retried, by default RetryPolicy()
+        is used. Use RetryPolicy(max_retries=0) to disable retries.
+        rate_limiter delays requests to stay within allowed rate, it can be shared
+        with other clients.
+        cache stores GET responses and revalidates them with conditional requests.
+        coalesce makes identical GET requests in flight at the same time share
+        a single call to the server. Every caller gets its own decoded result.
+        timeout limits waiting for connection and for response, it can be
+        overridden per call. None waits forever.
+        instrumentation receives timings of requests, it can be shared with other clients.
+        transport sends requests, by default RequestsTransport with given pool settings.
+        FakeTransport answers them in process and CassetteTransport records and replays them.
+        parse_mode selects how responses are turned into models, see ParseMode.
+        """
         self.__HEADERS = {
             'Content-Type': 'application/json',
             'Accept': '*/*',
             'Connection': 'keep-alive'
         }
-        self.__SCHEME = 'https'
+        self.__SCHEME = scheme
         self.__BASE_ENDPOINT = 'api'
-        self.__session = Session()
         self.__api_key = api_key
         self.__key_id = key_id
         self.__HOSTNAME = hostname
         self.__BASE_URL = f"{self.__SCHEME}://{self.__HOSTNAME}/{self.__BASE_ENDPOINT}"
-        self.__session.headers.update(self.__HEADERS)
+        self.__transport = transport if transport is not None else RequestsTransport(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            idle_timeout=idle_timeout
+        )
+        self.__retry = retry if retry is not None else RetryPolicy()
+        self.__retry_stats = RetryStats()
+        self.__rate_limiter = rate_limiter
+        self.__cache = cache
+        self.__single_flight = SingleFlight() if coalesce else None
+        self.__timeout = Timeout.of(timeout)
+        self.__instrumentation = instrumentation if instrumentation is not None else Instrumentation()
+        self.__parse_mode = ParseMode(parse_mode)
+        self.__token_cache = TokenCache(
+            self.__get_token, refresh_margin=token_refresh_margin)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        self.__transport.close()
+
+    @property
+    def token_stats(self) -> TokenStats:
+        """
+        Counters of performed and avoided logins.
+        """
+        return self.__token_cache.stats
+
+    @property
+    def retry_stats(self) -> RetryStats:
+        """
+        Counters of retried and given up requests.
+        """
+        return self.__retry_stats
+
+    @property
+    def cache_stats(self) -> Optional[CacheStats]:
+        """
+        Counters of cache hits, misses and revalidations or None if client has no cache.
+        """
+        return self.__cache.stats if self.__cache is not None else None
+
+    @property
+    def coalesce_stats(self) -> Optional[CoalesceStats]:
+        """
+        Counters of sent and coalesced GET requests or None if coalescing is disabled.
+        """
+        return self.__single_flight.stats if self.__single_flight is not None else None
+
+    @property
+    def instrumentation(self) -> Instrumentation:
+        """
+        Hooks receiving timed spans of requests made by the client.
+        """
+        return self.__instrumentation
+
+    @property
+    def parse_mode(self) -> ParseMode:
+        """
+        How responses of the client are turned into models.
+        """
+        return self.__parse_mode
 
     def __get_token(self) -> str:
         """
         Makes a requst to /auth/key-login endpoint and retrieves an access token
         to authorize future requests.
         """
-        session = self.__session
-
         def encode_key():
             key = f"{self.__key_id}:{self.__api_key}".encode('ascii')
             return b64encode(key).decode('ascii')
 
-        x_api_key = encode_key()
-        session.headers.update({'X-API-KEY': x_api_key})
+        headers = dict(self.__HEADERS)
+        headers['X-API-KEY'] = encode_key()
         auth_url = f"{self.__BASE_URL}/auth/key-login"
 
-        with session as s:
-            try:
-                res = s.post(url=auth_url)
-                res.raise_for_status()
+        try:
+            with self.__instrumentation.span(AUTH, '/auth/key-login', 'POST') as span:
+                res = self.__with_retries(
+                    HttpMethod.POST, lambda: self.__send(HttpMethod.POST, auth_url, headers),
+                    idempotent=True)
+                span.status = res.status_code
+            res.raise_for_status()
 
-            except exceptions.HTTPError:
-                raise AvaandmedApiExcepiton(
-                    status=res.status_code,
-                    uri=res.url,
-                    msg=res.json()['message']
-                )
+        except exceptions.HTTPError:
+            raise AvaandmedApiExcepiton(
+                status=res.status_code,
+                uri=res.url,
+                msg=res.json()['message']
+            )
 
-            except exceptions.RequestException as ex:
-                raise SystemExit(ex)
+        except exceptions.Timeout as ex:
+            raise AvaandmedTimeoutException(auth_url, str(ex))
+
+        except exceptions.RequestException as ex:
+            raise SystemExit(ex)
 
-            return res.json()['data']['accessToken']
+        return loads(res.content)['data']['accessToken']
 
-    def request(self, method: HttpMethod, url: str, data={}, files={}, headers=None):
+    def request(self, method: HttpMethod, url: str, data={}, files={}, headers=None,
+                raw: bool = False, timeout: Union[Timeout, float, None] = None):
         """
         Generic request method to make request to the API.
+        Given headers replace default ones for this request only.
+        Transient failures are retried according to retry policy of the client.
+        Identical GET requests made at the same time are coalesced if enabled.
+        Response body is decoded once, raw=True returns it as bytes without decoding.
+        timeout replaces timeout of the client for this call. Requests made inside
+        `deadline()` block are not allowed to run past it.
+        """
+        single_flight = self.__single_flight
+        if method == HttpMethod.GET and headers is None and single_flight is not None:
+            # Responses depend on the account, so calls are scoped by key
+            key = f"{self.__key_id}:{method.name}:{url}"
+            # Callers share the body and decode their own copy of it, as results may be mutated
+            body = single_flight.do(key, lambda: self.__request(method, url, raw=True, timeout=timeout))
+            if raw:
+                return body
+            with self.__instrumentation.span(DECODE, url, method.name):
+                return _unwrap(method, body)
+        return self.__request(method, url, data, files, headers, raw, timeout)
+
+    def __request(self, method: HttpMethod, url: str, data={}, files={}, headers=None,
+                  raw: bool = False, timeout: Union[Timeout, float, None] = None):
+        """
+        GET responses are served from HTTP cache if client has one.
         """
-        session = self.__session
+        path = url
         url = f"{self.__BASE_URL}{url}"
+        instrumentation = self.__instrumentation
+        cache = self.__cache
+        cache_key = None
+        entry = None
 
-        with session as s:
-            try:
-                access_token = self.__get_token()
+        if method == HttpMethod.GET and cache is not None:
+            # Responses depend on the account, so cache is scoped by key
+            cache_key = f"{self.__key_id}:{url}"
+            entry = cache.lookup(cache_key)
+            if entry is not None and cache.is_fresh(entry):
+                cache.stats.record('hits')
+                with instrumentation.span(DECODE, path, method.name):
+                    return _unwrap(method, entry.body, raw)
+            headers = dict(self.__HEADERS if headers is None else headers)
+            headers.update(cache.conditional_headers(entry))
 
-                if headers is not None:
-                    s.headers = headers
+        def send():
+            _rewind(files)
+            return self.__authorized(method, url, headers, data=data, files=files, timeout=timeout)
 
-                s.headers.update({'Authorization': f"Bearer {access_token}"})
-                res = s.request(
-                    method=method.name,
-                    url=url,
-                    files=files,
-                    data=data
-                )
-                res.raise_for_status()
+        try:
+            with instrumentation.span(REQUEST, path, method.name) as span:
+                res = self.__with_retries(method, send)
+                span.status = res.status_code
+                span.size = len(res.content)
+            res.raise_for_status()
 
-            except exceptions.HTTPError:
-                raise AvaandmedApiExcepiton(
-                    status=res.status_code,
-                    uri=url,
-                    msg=res.json()['message'],
-                )
+        except exceptions.HTTPError:
+            raise AvaandmedApiExcepiton(
+                status=res.status_code,
+                uri=url,
+                msg=res.json()['message'],
+            )
 
-            except exceptions.RequestException as ex:
-                raise SystemExit(ex)
+        except exceptions.Timeout as ex:
+            raise AvaandmedTimeoutException(url, str(ex))
+
+        except exceptions.RequestException as ex:
+            raise SystemExit(ex)
 
-            if method == HttpMethod.POST or method == HttpMethod.PUT:
-                if res.content != b'':
-                    if 'data' in res.json():
-                        return res.json()['data']
-                    return res.json()
-                return ''
+        body = res.content
+        if cache_key is not None:
+            if res.status_code == 304 and entry is not None:
+                cache.stats.record('revalidations')
+                body = entry.body
+            else:
+                cache.stats.record('misses')
+                cache.store(cache_key, res.headers, body)
 
-            return res.json()['data']
+        if raw:
+            return body
+        with instrumentation.span(DECODE, path, method.name):
+            return _unwrap(method, body)
 
-    def download(self, url: str, destination: str, json={}) -> int:
-        session = self.__session
+    def download(self, url: str, destination: str, json={},
+                 timeout: Union[Timeout, float, None] = None) -> int:
+        """
+        Streams response body into destination file.
+        Read timeout applies to every chunk, deadline to the whole download.
+        """
         download_url = f"{self.__BASE_URL}{url}"
-        access_token = self.__get_token()
-        session.headers.update({'Authorization': f"Bearer {access_token}"})
 
-        with session.post(download_url, json=json, stream=True) as s:
+        def send():
+            return self.__authorized(HttpMethod.POST, download_url, json=json, stream=True,
+                                     timeout=timeout)
+
+        try:
+            # Download does not change anything on the server, so it is safe to retry
+            res = self.__with_retries(HttpMethod.POST, send, idempotent=True)
+        except exceptions.Timeout as ex:
+            raise AvaandmedTimeoutException(download_url, str(ex))
+        except exceptions.RequestException as ex:
+            raise SystemExit(ex)
+
+        with res as s:
             try:
                 s.raise_for_status()
 
                 with open(destination, 'wb') as outfile:
                     for chunk in s.iter_content(chunk_size=1024):
                         outfile.write(chunk)
+                        _check_deadline(download_url)
 
             except exceptions.HTTPError:
                 raise AvaandmedApiExcepiton(
@@ -131,5 +303,164 @@ class HttpClient:
                     uri=download_url,
                     msg=s.json()['message'],
                 )
+            except exceptions.RequestException as ex:
+                _raise_read_error(download_url, ex)
 
         return 0
+
+    def stream(self, url: str, chunk_size: int = 65536,
+               timeout: Union[Timeout, float, None] = None) -> Iterator[Any]:
+        """
+        Makes GET request and yields items of `data` array of the response
+        as they are read from the socket, without loading the whole body.
+        Responses are not cached nor coalesced. Read timeout applies to every
+        chunk, deadline to the whole response.
+        """
+        path = url
+        url = f"{self.__BASE_URL}{url}"
+
+        def send():
+            return self.__authorized(HttpMethod.GET, url, stream=True, timeout=timeout)
+
+        try:
+            with self.__instrumentation.span(REQUEST, path, HttpMethod.GET.name) as span:
+                res = self.__with_retries(HttpMethod.GET, send)
+                span.status = res.status_code
+        except exceptions.Timeout as ex:
+            raise AvaandmedTimeoutException(url, str(ex))
+        except exceptions.RequestException as ex:
+            raise SystemExit(ex)
+
+        with res:
+            if res.status_code >= 400:
+                raise AvaandmedApiExcepiton(
+                    status=res.status_code,
+                    uri=url,
+                    msg=res.json()['message'],
+                )
+            parser = JsonItemParser()
+            try:
+                for chunk in res.iter_content(chunk_size=chunk_size):
+                    yield from parser.feed(chunk)
+                    _check_deadline(url)
+            except exceptions.RequestException as ex:
+                _raise_read_error(url, ex)
+            yield from parser.close()
+
+    def __with_retries(self, method: HttpMethod, send, idempotent: Optional[bool] = None):
+        """
+        Calls send until it returns response that should not be retried,
+        sleeping in between according to retry policy.
+        """
+        retry = self.__retry.start(method.name, self.__retry_stats, idempotent)
+        while True:
+            try:
+                res = send()
+            except (exceptions.ConnectionError, exceptions.Timeout) as ex:
+                connected = not isinstance(ex, exceptions.ConnectTimeout)
+                delay = retry.delay_for_error(ex, connected)
+                if delay is None:
+                    raise
+            else:
+                delay = retry.delay_for_status(
+                    res.status_code, res.headers.get('Retry-After'))
+                if delay is None:
+                    return res
+                res.close()
+            time.sleep(delay)
+
+    def __authorized(self, method: HttpMethod, url: str, headers=None, stream: bool = False, **kwargs):
+        """
+        Sends request with cached access token.
+        If token turns out to be revoked, logs in again and replays request once.
+        """
+        access_token = self.__token_cache.get()
+        res = self.__send(method, url, self.__headers(access_token, headers), stream, **kwargs)
+        if res.status_code == 401:
+            res.close()
+            self.__token_cache.invalidate(access_token)
+            access_token = self.__token_cache.get()
+            _rewind(kwargs.get('files'))
+            res = self.__send(method, url, self.__headers(access_token, headers), stream, **kwargs)
+        return res
+
+    def __send(self, method: HttpMethod, url: str, headers: dict, stream: bool = False,
+               timeout: Union[Timeout, float, None] = None, **kwargs):
+        if self.__rate_limiter is not None:
+            self.__rate_limiter.acquire(url[len(self.__BASE_URL):])
+        timeout = _request_timeout(url, self.__timeout if timeout is None else timeout)
+        instrumentation = self.__instrumentation
+        if not instrumentation.enabled:
+            return self.__transport.send(method.name, url, headers, stream, timeout, **kwargs)
+
+        # Body is read separately to tell waiting for the server from downloading
+        path = url[len(self.__BASE_URL):]
+        with tracking(instrumentation, path, method.name):
+            with instrumentation.span(TTFB, path, method.name) as span:
+                res = self.__transport.send(method.name, url, headers, True, timeout, **kwargs)
+                span.status = res.status_code
+        if not stream:
+            with instrumentation.span(READ, path, method.name) as span:
+                span.size = len(res.content)
+        return res
+
+    def __headers(self, access_token: str, headers=None) -> dict:
+        """
+        Builds headers for a single request.
+        Shared session is never modified, so requests from different threads don't interfere.
+        """
+        request_headers = dict(self.__HEADERS if headers is None else headers)
+        request_headers['Authorization'] = f"Bearer {access_token}"
+        return request_headers
+
+
+def _rewind(files) -> None:
+    """
+    Moves file objects of multipart upload back to the start before replaying request.
+    """
+    for _, value in files or []:
+        if isinstance(value, tuple) and hasattr(value[1], 'seek'):
+            value[1].seek(0)
+
+
+def _unwrap(method: HttpMethod, body: bytes, raw: bool = False):
+    """
+    Decodes response body once and unwraps its `data` field.
+    """
+    if raw:
+        return body
+
+    if method == HttpMethod.POST or method == HttpMethod.PUT:
+        if body != b'':
+            document = loads(body)
+            if 'data' in document:
+                return document['data']
+            return document
+        return ''
+
+    return loads(body)['data']
+
+
+def _check_deadline(url: str) -> None:
+    remaining = remaining_time()
+    if remaining is not None and remaining <= 0:
+        raise AvaandmedTimeoutException(url, 'Deadline exceeded')
+
+
+def _raise_read_error(url: str, ex: exceptions.RequestException) -> None:
+    """
+    Raises error of reading response body in chunks.
+    """
+    # Read timeouts while iterating are wrapped into ConnectionError by requests
+    if isinstance(ex, exceptions.Timeout) or (ex.args and isinstance(ex.args[0], ReadTimeoutError)):
+        raise AvaandmedTimeoutException(url, str(ex))
+    raise SystemExit(ex)
+
+
+def _request_timeout(url: str, timeout: Union[Timeout, float, None]) -> Timeout:
+    """
+    Returns timeout of a single request shortened to fit current deadline.
+    Raises AvaandmedTimeoutException if deadline has already passed.
+    """
+    _check_deadline(url)
+    return Timeout.of(timeout).capped(remaining_time())
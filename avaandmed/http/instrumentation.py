@@ -0,0 +1,207 @@
+import math
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from avaandmed.http.endpoints import endpoint_template
+
+AUTH = 'auth'
+CONNECT = 'connect'
+TTFB = 'ttfb'
+READ = 'read'
+DECODE = 'decode'
+VALIDATE = 'validate'
+REQUEST = 'request'
+
+PHASES = (AUTH, CONNECT, TTFB, READ, DECODE, VALIDATE, REQUEST)
+
+
+class Span:
+    """
+    Timed phase of a request.
+    name is one of PHASES, endpoint is path template such as /datasets/{id},
+    duration is given in seconds. Spans of whole requests also carry
+    response status and size in bytes, failed spans carry name of exception.
+    """
+
+    def __init__(self, name: str, endpoint: str, method: str) -> None:
+        self.name = name
+        self.endpoint = endpoint
+        self.method = method
+        self.duration = 0.0
+        self.status = None  # type: Optional[int]
+        self.size = None  # type: Optional[int]
+        self.error = None  # type: Optional[str]
+
+    def __repr__(self) -> str:
+        return (f"Span(name={self.name!r}, endpoint={self.endpoint!r}, method={self.method!r}, "
+                f"duration={self.duration:.6f}, status={self.status}, error={self.error})")
+
+
+class _Timer:
+    """
+    Context manager measuring a span and emitting it on exit.
+    """
+
+    def __init__(self, instrumentation: 'Instrumentation', span: Span) -> None:
+        self.__instrumentation = instrumentation
+        self.span = span
+
+    def __enter__(self) -> Span:
+        self.__started = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.span.duration = time.perf_counter() - self.__started
+        if exc_type is not None:
+            self.span.error = exc_type.__name__
+        self.__instrumentation.emit(self.span)
+
+
+class _NullTimer:
+    """
+    Timer used when nobody listens, measures nothing.
+    """
+
+    def __init__(self) -> None:
+        self.span = Span('', '', '')
+
+    def __enter__(self) -> Span:
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Instrumentation:
+    """
+    Hooks called with every finished Span.
+    Callbacks are called in the thread (or task) that made the request,
+    so they should be fast and must not raise.
+    """
+
+    def __init__(self) -> None:
+        self.__callbacks = []  # type: List[Callable[[Span], None]]
+
+    def add(self, callback: Callable[[Span], None]) -> Callable[[Span], None]:
+        """
+        Registers callback, can also be used as decorator.
+        """
+        self.__callbacks = self.__callbacks + [callback]
+        return callback
+
+    def remove(self, callback: Callable[[Span], None]) -> None:
+        self.__callbacks = [c for c in self.__callbacks if c != callback]
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.__callbacks)
+
+    def span(self, name: str, path: str, method: str = 'GET'):
+        """
+        Measures block of code as span of given name.
+        path is turned into endpoint template. Does nothing if there are no callbacks.
+        """
+        if not self.__callbacks:
+            return _NULL_TIMER
+        return _Timer(self, Span(name, endpoint_template(path), method))
+
+    def emit(self, span: Span) -> None:
+        # Callbacks are replaced, never modified, so iteration needs no lock
+        for callback in self.__callbacks:
+            callback(span)
+
+
+_current = ContextVar('avaandmed_current_request', default=None)  # type: ContextVar[Optional[Tuple[Instrumentation, str, str]]]
+
+
+def current_request() -> Optional[Tuple[Instrumentation, str, str]]:
+    """
+    Returns instrumentation, path and method of request being sent in this context.
+    Used to attribute connection spans to the request which opened the connection.
+    """
+    return _current.get()
+
+
+@contextmanager
+def tracking(instrumentation: Instrumentation, path: str, method: str) -> Iterator[None]:
+    """
+    Marks request being sent in this context, see current_request().
+    """
+    token = _current.set((instrumentation, path, method))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class LatencyAggregator:
+    """
+    Callback keeping durations of spans in memory and reporting percentiles
+    by span name and endpoint. At most `max_samples` latest samples are kept
+    for every pair.
+    """
+
+    def __init__(self, max_samples: int = 10000) -> None:
+        self.max_samples = max_samples
+        self.__samples = {}  # type: Dict[Tuple[str, str], Deque[float]]
+        self.__lock = Lock()
+
+    def __call__(self, span: Span) -> None:
+        key = (span.name, span.endpoint)
+        with self.__lock:
+            samples = self.__samples.get(key)
+            if samples is None:
+                samples = self.__samples[key] = deque(maxlen=self.max_samples)
+            samples.append(span.duration)
+
+    def percentiles(self, name: str, endpoint: Optional[str] = None) -> Dict[str, float]:
+        """
+        Returns count, p50, p95 and p99 of given span in seconds,
+        over all endpoints if endpoint is not given.
+        """
+        with self.__lock:
+            samples = [d for (n, e), values in self.__samples.items()
+                       if n == name and endpoint in (None, e) for d in values]
+        return _summarize(samples)
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """
+        Returns percentiles of all spans grouped by endpoint and span name.
+        """
+        with self.__lock:
+            items = [(key, list(values)) for key, values in self.__samples.items()]
+        result = {}  # type: Dict[str, Dict[str, Dict[str, float]]]
+        for (name, endpoint), samples in sorted(items):
+            result.setdefault(endpoint, {})[name] = _summarize(samples)
+        return result
+
+    def clear(self) -> None:
+        with self.__lock:
+            self.__samples.clear()
+
+
+def _summarize(samples: Iterable[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'p50': _percentile(samples, 0.50),
+        'p95': _percentile(samples, 0.95),
+        'p99': _percentile(samples, 0.99)
+    }
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    """
+    Nearest-rank percentile of sorted samples.
+    """
+    if not samples:
+        return 0.0
+    rank = max(1, math.ceil(q * len(samples)))
+    return samples[rank - 1]
@@ -0,0 +1,68 @@
+import json
+from typing import Any, Callable, Union
+
+
+def _orjson_loads() -> Callable[[Union[bytes, str]], Any]:
+    import orjson
+
+    def loads(data: Union[bytes, str]) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson is stricter than json, e.g. about lone surrogates
+            return json.loads(data)
+    return loads
+
+
+def _ujson_loads() -> Callable[[Union[bytes, str]], Any]:
+    import ujson
+    return ujson.loads
+
+
+BACKENDS = {
+    'orjson': _orjson_loads,
+    'ujson': _ujson_loads,
+    'json': lambda: json.loads
+}
+
+
+class JsonCodec:
+    """
+    Decodes response bodies with the fastest JSON library available.
+    orjson is preferred, then ujson and json from standard library otherwise.
+    """
+
+    def __init__(self) -> None:
+        self.backend = None  # type: str
+        self.__loads = None  # type: Callable[[Union[bytes, str]], Any]
+        for name in BACKENDS:
+            try:
+                self.use(name)
+                break
+            except ImportError:
+                continue
+
+    def use(self, backend: Union[str, Callable[[Union[bytes, str]], Any]]) -> None:
+        """
+        Switches to one of BACKENDS by name or to any function taking bytes.
+        Raises ImportError if backend is not installed.
+        """
+        if callable(backend):
+            self.backend = getattr(backend, '__module__', None) or 'custom'
+            self.__loads = backend
+            return
+        self.__loads = BACKENDS[backend]()
+        self.backend = backend
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return self.__loads(data)
+
+
+codec = JsonCodec()
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodes JSON document with the backend selected by `codec`.
+    """
+    return codec.loads(data)
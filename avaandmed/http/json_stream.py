@@ -0,0 +1,197 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, List
+
+_WHITESPACE = ' \t\n\r'
+# Consumed part of the buffer is dropped once it grows past this many characters
+_COMPACT_AT = 1 << 16
+_BRACKETS = re.compile(r'["{}\[\]]')
+_STRING_END = re.compile(r'["\\]')
+
+
+class JsonItemParser:
+    """
+    Incremental parser of `{"data": [...]}` documents fed in chunks of bytes.
+    Yields items of the `data` array as soon as they are complete, so memory
+    holds one item and one chunk at a time instead of the whole document.
+    If `data` is not an array, it is returned as a single item.
+    Other fields of the document are parsed and dropped.
+    """
+
+    def __init__(self, key: str = 'data') -> None:
+        self.__key = key
+        self.__decoder = codecs.getincrementaldecoder('utf-8')()
+        self.__scan = json.JSONDecoder().raw_decode
+        self.__buffer = ''
+        self.__pos = 0
+        self.__state = 'start'
+        self.__done = False
+        # Progress of scanning incomplete object, array or string at current position
+        self.__scanned = 0
+        self.__depth = 0
+        self.__in_string = False
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """
+        Adds chunk of the document, returns items completed by it.
+        """
+        self.__append(self.__decoder.decode(chunk))
+        return self.__parse(final=False)
+
+    def close(self) -> List[Any]:
+        """
+        Marks end of the document, returns remaining items.
+        Raises ValueError if document is incomplete or `data` is missing.
+        """
+        self.__append(self.__decoder.decode(b'', final=True))
+        items = self.__parse(final=True)
+        if self.__state != 'end':
+            raise ValueError(f"Incomplete JSON document, no complete {self.__key!r} field")
+        return items
+
+    def __append(self, text: str) -> None:
+        if self.__pos > _COMPACT_AT:
+            self.__buffer = self.__buffer[self.__pos:]
+            self.__pos = 0
+        self.__buffer += text
+
+    def __skip(self, *separators: str) -> bool:
+        """
+        Moves past whitespace and given separators, returns False if buffer ran out.
+        """
+        buffer = self.__buffer
+        pos = self.__pos
+        while pos < len(buffer) and (buffer[pos] in _WHITESPACE or buffer[pos] in separators):
+            pos += 1
+        self.__pos = pos
+        return pos < len(buffer)
+
+    def __value(self, final: bool):
+        """
+        Decodes value at current position. Returns (True, value) or (False, None)
+        if more data is needed.
+        """
+        container = self.__buffer[self.__pos] in '{["'
+        if container and not final and not self.__complete():
+            return False, None
+        self.__scanned, self.__depth, self.__in_string = 0, 0, False
+        try:
+            value, end = self.__scan(self.__buffer, self.__pos)
+        except json.JSONDecodeError:
+            if final or container:
+                raise
+            return False, None
+        # Number at the end of the buffer may continue in the next chunk
+        if end == len(self.__buffer) and not final and not container:
+            return False, None
+        self.__pos = end
+        return True, value
+
+    def __complete(self) -> bool:
+        """
+        Returns True once object, array or string at current position has ended in buffer.
+        Scanning resumes where the previous chunk ended, so a value arriving in many chunks
+        is scanned once and decoded once, instead of decoding it from start on every chunk.
+        """
+        buffer = self.__buffer
+        index = self.__pos + self.__scanned
+        depth, in_string = self.__depth, self.__in_string
+        while True:
+            match = (_STRING_END if in_string else _BRACKETS).search(buffer, index)
+            if match is None:
+                index = len(buffer)
+                break
+            char, index = match.group(), match.end()
+            if char == '\\':
+                if index == len(buffer):
+                    # Escaped character is in the next chunk
+                    index = match.start()
+                    break
+                index += 1
+            elif char == '"':
+                in_string = not in_string
+                if not in_string and depth == 0:
+                    return True
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return True
+        self.__scanned = index - self.__pos
+        self.__depth, self.__in_string = depth, in_string
+        return False
+
+    def __parse(self, final: bool) -> List[Any]:
+        items = []
+        while True:
+            state = self.__state
+            if state == 'end':
+                return items
+            if not self.__skip(',' if state in ('key', 'item') else ''):
+                return items
+            buffer = self.__buffer
+            char = buffer[self.__pos]
+
+            if state == 'start':
+                if char != '{':
+                    raise ValueError(f"Expected JSON object, got {char!r}")
+                self.__pos += 1
+                self.__state = 'key'
+            elif state == 'key':
+                if char == '}':
+                    self.__pos += 1
+                    self.__state = 'end' if self.__done else 'missing'
+                    continue
+                complete, key = self.__value(final)
+                if not complete:
+                    return items
+                self.__current = key
+                self.__state = 'colon'
+            elif state == 'colon':
+                if char != ':':
+                    raise ValueError(f"Expected ':', got {char!r}")
+                self.__pos += 1
+                if self.__current == self.__key and not self.__done:
+                    self.__state = 'data'
+                else:
+                    self.__state = 'skip'
+            elif state == 'data':
+                if char == '[':
+                    self.__pos += 1
+                    self.__state = 'item'
+                else:
+                    complete, value = self.__value(final)
+                    if not complete:
+                        return items
+                    items.append(value)
+                    self.__done = True
+                    self.__state = 'key'
+            elif state == 'item':
+                if char == ']':
+                    self.__pos += 1
+                    self.__done = True
+                    self.__state = 'key'
+                    continue
+                complete, value = self.__value(final)
+                if not complete:
+                    return items
+                items.append(value)
+            elif state == 'skip':
+                complete, _ = self.__value(final)
+                if not complete:
+                    return items
+                self.__state = 'key'
+            else:
+                raise ValueError(f"Field {self.__key!r} is missing from JSON document")
+
+
+def iter_items(chunks: Iterable[bytes], key: str = 'data') -> Iterator[Any]:
+    """
+    Yields items of `key` array of JSON document read in chunks, see JsonItemParser.
+    """
+    parser = JsonItemParser(key)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
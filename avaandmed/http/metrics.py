@@ -0,0 +1,322 @@
+import math
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from avaandmed.http.instrumentation import AUTH, REQUEST, Span
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# name, labels and value of a single sample
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class _Metric:
+    """
+    Metric with values for every combination of label values.
+    """
+    TYPE = ''
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(label, '')) for label in self.labels)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Value that only goes up, e.g. number of requests.
+    """
+    TYPE = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.__values = {}  # type: Dict[Tuple[str, ...], float]
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.__values[key] = self.__values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self.__values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = sorted(self.__values.items())
+        return [(self.name, dict(zip(self.labels, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    """
+    Distribution of observed values counted into cumulative buckets.
+    """
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.__values = {}  # type: Dict[Tuple[str, ...], Tuple[List[int], List[float]]]
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self.__values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def count(self, **labels: str) -> int:
+        values = self.__values.get(self._key(labels))
+        return sum(values[0]) if values is not None else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = sorted((key, (list(counts), total[0]))
+                           for key, (counts, total) in self.__values.items())
+
+        samples = []  # type: List[Sample]
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, cumulative))
+        return samples
+
+
+class _Collected(_Metric):
+    """
+    Counter whose samples are read from elsewhere at render time.
+    """
+    TYPE = 'counter'
+
+    def __init__(self, name: str, help: str, collect: Callable[[], List[Sample]]) -> None:
+        super().__init__(name, help)
+        self.__collect = collect
+
+    def samples(self) -> List[Sample]:
+        return self.__collect()
+
+
+class MetricsRegistry:
+    """
+    Set of metrics rendered together in Prometheus text exposition format.
+    """
+
+    def __init__(self) -> None:
+        self.__metrics = {}  # type: Dict[str, _Metric]
+        self.__lock = Lock()
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.__register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.__register(Histogram(name, help, labels, buckets))
+
+    def collected(self, name: str, help: str, collect: Callable[[], List[Sample]]) -> _Metric:
+        """
+        Registers counter whose samples are returned by collect() when metrics are rendered.
+        """
+        return self.__register(_Collected(name, help, collect))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self.__metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        with self.__lock:
+            metrics = list(self.__metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.help)}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int = 9464, host: str = '127.0.0.1') -> 'MetricsServer':
+        """
+        Starts HTTP server exposing metrics at /metrics in background thread.
+        """
+        server = MetricsServer(self, port, host)
+        server.start()
+        return server
+
+    def __register(self, metric):
+        with self.__lock:
+            existing = self.__metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} is already registered as {existing.TYPE}")
+                return existing
+            self.__metrics[metric.name] = metric
+            return metric
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split('?', 1)[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class MetricsServer:
+    """
+    Tiny HTTP endpoint for Prometheus to scrape.
+    Port 0 picks a free port, see `port`.
+    """
+
+    def __init__(self, registry: MetricsRegistry, port: int = 9464, host: str = '127.0.0.1') -> None:
+        self.__server = _ThreadingHTTPServer((host, port), _MetricsHandler)
+        self.__server.registry = registry
+        self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def start(self) -> None:
+        self.__thread.start()
+
+    def close(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class ClientMetrics:
+    """
+    Metrics of client traffic: requests, errors by status, retries, cache usage
+    and logins, latency and response size histograms by endpoint template.
+    Attach it to one or more clients, values are summed across them.
+    """
+
+    def __init__(self, registry: Optional[MetricsRegistry] = None, prefix: str = 'avaandmed') -> None:
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.__prefix = prefix
+        self.__clients = []  # type: List
+        self.requests = self.registry.counter(
+            f"{prefix}_requests_total", 'Requests made to the API.', ('endpoint', 'method'))
+        self.errors = self.registry.counter(
+            f"{prefix}_request_errors_total",
+            'Requests that failed, by response status or exception name.',
+            ('endpoint', 'method', 'status'))
+        self.latency = self.registry.histogram(
+            f"{prefix}_request_duration_seconds",
+            'Duration of requests including retries.', ('endpoint', 'method'))
+        self.response_size = self.registry.histogram(
+            f"{prefix}_response_size_bytes", 'Size of response bodies.',
+            ('endpoint', 'method'), SIZE_BUCKETS)
+        self.auth_latency = self.registry.histogram(
+            f"{prefix}_auth_duration_seconds", 'Duration of logins.')
+        self.registry.collected(
+            f"{prefix}_retries_total", 'Retried requests by reason.', self.__collect_retries)
+        self.registry.collected(
+            f"{prefix}_cache_total", 'HTTP cache lookups by outcome.', self.__collect_cache)
+        self.registry.collected(
+            f"{prefix}_logins_total", 'Logins made to obtain access token.', self.__collect_logins)
+
+    def attach(self, client) -> None:
+        """
+        Starts collecting metrics of Avaandmed, AsyncAvaandmed or one of the HTTP clients.
+        """
+        client.instrumentation.add(self)
+        self.__clients.append(client)
+
+    def __call__(self, span: Span) -> None:
+        if span.name == AUTH:
+            self.auth_latency.observe(span.duration)
+            return
+        if span.name != REQUEST:
+            return
+
+        labels = {'endpoint': span.endpoint, 'method': span.method}
+        self.requests.inc(**labels)
+        self.latency.observe(span.duration, **labels)
+        if span.size is not None:
+            self.response_size.observe(span.size, **labels)
+        if span.error is not None:
+            self.errors.inc(status=span.error, **labels)
+        elif span.status is not None and span.status >= 400:
+            self.errors.inc(status=str(span.status), **labels)
+
+    def __collect_retries(self) -> List[Sample]:
+        totals = {}  # type: Dict[str, float]
+        for client in self.__clients:
+            for reason, count in client.retry_stats.reasons().items():
+                totals[reason] = totals.get(reason, 0) + count
+        return [(f"{self.__prefix}_retries_total", {'reason': reason}, count)
+                for reason, count in sorted(totals.items())]
+
+    def __collect_cache(self) -> List[Sample]:
+        totals = {}  # type: Dict[str, float]
+        for client in self.__clients:
+            stats = client.cache_stats
+            if stats is not None:
+                for outcome, count in stats.as_dict().items():
+                    totals[outcome] = totals.get(outcome, 0) + count
+        return [(f"{self.__prefix}_cache_total", {'outcome': outcome}, count)
+                for outcome, count in sorted(totals.items())]
+
+    def __collect_logins(self) -> List[Sample]:
+        total = sum(client.token_stats.logins for client in self.__clients)
+        return [(f"{self.__prefix}_logins_total", {}, total)]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{_escape_label(value)}"' for key, value in labels.items())
+    return '{' + pairs + '}'
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _escape_help(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,117 @@
+import time
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+from avaandmed.http.endpoints import endpoint_group
+
+
+class RateLimitStats:
+    """
+    Counters describing how often and for how long requests were delayed.
+    """
+
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.delayed = 0
+        self.waited = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'waited': self.waited
+        }
+
+    def __repr__(self) -> str:
+        return f"RateLimitStats({self.as_dict()})"
+
+
+class TokenBucket:
+    """
+    Token bucket which refills at `rate` tokens per second up to `burst` tokens.
+    Caller reserves a token under the lock and then waits outside of it.
+    Reservation may drive the bucket into debt, so callers are served strictly
+    in order of arrival regardless of whether they are threads or coroutines.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        if rate <= 0:
+            raise ValueError('Rate must be greater than 0.')
+        if burst < 1:
+            raise ValueError('Burst must be at least 1.')
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__updated = time.monotonic()
+        self.__lock = Lock()
+
+    def reserve(self) -> float:
+        """
+        Takes one token and returns number of seconds caller has to wait before using it.
+        """
+        with self.__lock:
+            now = time.monotonic()
+            elapsed = now - self.__updated
+            self.__tokens = min(self.burst, self.__tokens + elapsed * self.rate)
+            self.__updated = now
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            return -self.__tokens / self.rate
+
+
+class RateLimiter:
+    """
+    Client side rate limiter shared by threads and asyncio tasks.
+    `rate` requests per second with bursts of up to `burst` requests are allowed
+    overall. Endpoint groups (auth, catalog, file_rows, downloads) can be limited
+    further by passing {group: (rate, burst)} as `groups`.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1,
+                 groups: Optional[Dict[str, Tuple[float, int]]] = None) -> None:
+        self.__bucket = TokenBucket(rate, burst) if rate is not None else None
+        self.__groups = {
+            group: TokenBucket(group_rate, group_burst)
+            for group, (group_rate, group_burst) in (groups or {}).items()
+        }
+        self.__lock = Lock()
+        self.stats = RateLimitStats()
+
+    def reserve(self, path: str) -> float:
+        """
+        Reserves a slot for request to given API path.
+        Returns number of seconds to wait before the request can be sent.
+        """
+        delay = 0.0
+        if self.__bucket is not None:
+            delay = self.__bucket.reserve()
+
+        group = self.__groups.get(endpoint_group(path))
+        if group is not None:
+            delay = max(delay, group.reserve())
+
+        with self.__lock:
+            self.stats.acquired += 1
+            if delay > 0:
+                self.stats.delayed += 1
+                self.stats.waited += delay
+        return delay
+
+    def acquire(self, path: str) -> None:
+        """
+        Blocks current thread until request to given path is allowed.
+        """
+        delay = self.reserve(path)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, path: str) -> None:
+        """
+        Suspends current task until request to given path is allowed.
+        """
+        import asyncio
+
+        delay = self.reserve(path)
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,208 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+from avaandmed.http.timeouts import remaining_time
+
+
+class RetryStats:
+    """
+    Counters describing retries made by the client.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = Lock()
+        self.retries = 0
+        self.gave_up = 0
+        self.budget_exhausted = 0
+        self.by_reason = {}  # type: Dict[str, int]
+
+    def record_retry(self, reason: str) -> None:
+        with self.__lock:
+            self.retries += 1
+            self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+
+    def record_give_up(self, budget_exhausted: bool = False) -> None:
+        with self.__lock:
+            self.gave_up += 1
+            if budget_exhausted:
+                self.budget_exhausted += 1
+
+    def reasons(self) -> Dict[str, int]:
+        """
+        Returns a copy of retry counts by reason, taken under the lock.
+        """
+        with self.__lock:
+            return dict(self.by_reason)
+
+    def as_dict(self) -> dict:
+        return {
+            'retries': self.retries,
+            'gave_up': self.gave_up,
+            'budget_exhausted': self.budget_exhausted,
+            'by_reason': self.reasons()
+        }
+
+    def __repr__(self) -> str:
+        return f"RetryStats({self.as_dict()})"
+
+
+class RetryBudget:
+    """
+    Limits retries to a fraction of all requests made by the client,
+    so that an outage does not multiply the load by number of retries.
+    Every request deposits `ratio` tokens, every retry withdraws one.
+    """
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0, max_balance: float = 100.0) -> None:
+        self.ratio = ratio
+        self.max_balance = max_balance
+        self.__balance = reserve
+        self.__lock = Lock()
+
+    def deposit(self) -> None:
+        with self.__lock:
+            self.__balance = min(self.max_balance, self.__balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self.__lock:
+            if self.__balance < 1:
+                return False
+            self.__balance -= 1
+            return True
+
+
+class RetryPolicy:
+    """
+    Describes which failures are retried and how long to wait in between.
+    By default only idempotent methods are retried, waiting time grows
+    exponentially with full jitter and is capped by max_backoff.
+    Retry-After header of 429 and 503 responses is honored.
+    max_retry_time limits total time spent waiting for a single call and
+    budget limits retries across all calls of the client. Retries which
+    would not finish before current deadline are not attempted.
+    """
+    IDEMPOTENT_METHODS = frozenset(['GET', 'PUT', 'DELETE'])
+    RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+    RETRY_AFTER_STATUSES = frozenset([429, 503])
+
+    def __init__(self, max_retries: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 30.0, jitter: bool = True,
+                 retry_statuses: Iterable[int] = RETRY_STATUSES,
+                 methods: Iterable[str] = IDEMPOTENT_METHODS,
+                 respect_retry_after: bool = True, max_retry_time: Optional[float] = 120.0,
+                 budget: Optional[RetryBudget] = None) -> None:
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.methods = frozenset(m.upper() for m in methods)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_time = max_retry_time
+        self.budget = budget if budget is not None else RetryBudget()
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns waiting time before retry number `attempt` (starting from 0).
+        """
+        cap = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            return random.uniform(0, cap)
+        return cap
+
+    def start(self, method: str, stats: RetryStats, idempotent: Optional[bool] = None) -> 'RetryState':
+        """
+        Starts tracking retries of a single call.
+        """
+        if idempotent is None:
+            idempotent = method.upper() in self.methods
+        self.budget.deposit()
+        return RetryState(self, idempotent, stats)
+
+
+class RetryState:
+    """
+    Retry bookkeeping of a single call.
+    """
+
+    def __init__(self, policy: RetryPolicy, idempotent: bool, stats: RetryStats) -> None:
+        self.__policy = policy
+        self.__idempotent = idempotent
+        self.__stats = stats
+        self.__started = time.monotonic()
+        self.attempt = 0
+
+    def delay_for_status(self, status: int, retry_after: Optional[str] = None) -> Optional[float]:
+        """
+        Returns seconds to wait before retrying response with given status
+        or None if it should not be retried.
+        """
+        policy = self.__policy
+        if status not in policy.retry_statuses or not self.__idempotent:
+            return None
+
+        delay = None
+        if policy.respect_retry_after and status in policy.RETRY_AFTER_STATUSES:
+            delay = parse_retry_after(retry_after)
+        if delay is None:
+            delay = policy.backoff(self.attempt)
+        return self.__next(str(status), delay)
+
+    def delay_for_error(self, error: Exception, connected: bool = True) -> Optional[float]:
+        """
+        Returns seconds to wait before retrying failed connection or None if
+        it should not be retried. Requests that never reached the server
+        (connected=False) are safe to retry regardless of the method.
+        """
+        if not self.__idempotent and connected:
+            return None
+        return self.__next(type(error).__name__, self.__policy.backoff(self.attempt))
+
+    def __next(self, reason: str, delay: float) -> Optional[float]:
+        policy = self.__policy
+        if self.attempt >= policy.max_retries:
+            self.__stats.record_give_up()
+            return None
+
+        if policy.max_retry_time is not None:
+            elapsed = time.monotonic() - self.__started
+            if elapsed + delay > policy.max_retry_time:
+                self.__stats.record_give_up()
+                return None
+
+        remaining = remaining_time()
+        if remaining is not None and delay >= remaining:
+            # Retry could not finish before deadline of the whole operation
+            self.__stats.record_give_up()
+            return None
+
+        if not policy.budget.withdraw():
+            self.__stats.record_give_up(budget_exhausted=True)
+            return None
+
+        self.attempt += 1
+        self.__stats.record_retry(reason)
+        return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses Retry-After header given either in seconds or as HTTP date.
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if retry_at is None:
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
@@ -0,0 +1,104 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Union
+
+
+class Timeout:
+    """
+    Limits for a single request.
+    connect is number of seconds to wait for connection to be established,
+    read is number of seconds to wait for the server to send next piece of response.
+    None means no limit.
+    """
+
+    def __init__(self, connect: Optional[float] = None, read: Optional[float] = None) -> None:
+        self.connect = connect
+        self.read = read
+
+    @classmethod
+    def of(cls, value: Union['Timeout', float, None]) -> 'Timeout':
+        """
+        Accepts Timeout, number of seconds used for both limits or None for no limits.
+        """
+        if isinstance(value, Timeout):
+            return value
+        return cls(value, value)
+
+    def capped(self, remaining: Optional[float]) -> 'Timeout':
+        """
+        Returns timeout which does not go past `remaining` seconds.
+        """
+        if remaining is None:
+            return self
+        return Timeout(_min(self.connect, remaining), _min(self.read, remaining))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Timeout) and (self.connect, self.read) == (other.connect, other.read)
+
+    def __repr__(self) -> str:
+        return f"Timeout(connect={self.connect}, read={self.read})"
+
+
+DEFAULT_TIMEOUT = Timeout(connect=10.0, read=60.0)
+
+
+def _min(limit: Optional[float], remaining: float) -> float:
+    return remaining if limit is None else min(limit, remaining)
+
+
+class Deadline:
+    """
+    Point in time by which whole operation, including retries and
+    all the pages of paginated calls, has to finish.
+    """
+
+    def __init__(self, seconds: float) -> None:
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f})"
+
+
+_deadline = ContextVar('avaandmed_deadline', default=None)  # type: ContextVar[Optional[Deadline]]
+
+
+def current_deadline() -> Optional[Deadline]:
+    """
+    Returns deadline of the current context or None if there is none.
+    """
+    return _deadline.get()
+
+
+def remaining_time() -> Optional[float]:
+    """
+    Returns seconds left until current deadline or None if there is none.
+    """
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+@contextmanager
+def deadline(seconds: float) -> Iterator[Deadline]:
+    """
+    Bounds total time of all requests made inside the block.
+    Nested deadlines can only make the limit shorter. Asyncio tasks
+    started inside the block inherit it on Python 3.7+, threads have to copy context
+    with contextvars.copy_context().
+    """
+    new = Deadline(seconds)
+    outer = _deadline.get()
+    if outer is not None and outer.expires_at < new.expires_at:
+        new = outer
+    token = _deadline.set(new)
+    try:
+        yield new
+    finally:
+        _deadline.reset(token)
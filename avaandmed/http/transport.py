@@ -0,0 +1,460 @@
+import gzip
+import json
+import os
+import re
+import time
+from base64 import b64decode, b64encode
+from http.client import responses as reasons
+from io import BytesIO
+from threading import Lock
+from typing import IO, Any, Callable, Dict, List, Optional, Pattern, Tuple, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from requests import PreparedRequest, Request, Response, Session
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from avaandmed.http.instrumentation import CONNECT, current_request
+from avaandmed.http.timeouts import Timeout
+
+
+class Transport:
+    """
+    Sends single HTTP request for HttpClient and returns requests.Response.
+    Failures are reported with requests exceptions, so that HttpClient
+    retries and maps them the same way regardless of the transport.
+    """
+
+    def send(self, method: str, url: str, headers: dict, stream: bool = False,
+             timeout: Optional[Timeout] = None, **kwargs) -> Response:
+        """
+        kwargs are `data`, `files` and `json` as accepted by requests.
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+def _timed_connect(connect) -> None:
+    """
+    Opens connection and reports it as a span of request which needed it.
+    """
+    current = current_request()
+    if current is None:
+        return connect()
+    instrumentation, path, method = current
+    with instrumentation.span(CONNECT, path, method):
+        connect()
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self) -> None:
+        _timed_connect(super().connect)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self) -> None:
+        _timed_connect(super().connect)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _InstrumentedAdapter(HTTPAdapter):
+    """
+    Adapter which reports time spent opening new connections, including TLS handshake.
+    """
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+
+class RequestsTransport(Transport):
+    """
+    Real HTTP transport keeping connections open and reusing them between requests.
+    pool_connections is number of hosts to keep pools for, pool_maxsize is
+    maximum number of connections kept per host and idle_timeout is number of
+    seconds after which unused connections are dropped instead of reused.
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 idle_timeout: Optional[float] = 60.0) -> None:
+        self.__adapter = _InstrumentedAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize
+        )
+        self.__session = Session()
+        self.__session.mount('https://', self.__adapter)
+        self.__session.mount('http://', self.__adapter)
+        self.__idle_timeout = idle_timeout
+        self.__idle_lock = Lock()
+        self.__last_used = time.monotonic()
+
+    def send(self, method: str, url: str, headers: dict, stream: bool = False,
+             timeout: Optional[Timeout] = None, **kwargs) -> Response:
+        timeout = timeout if timeout is not None else Timeout()
+        self.__drop_idle_connections()
+        return self.__session.request(
+            method=method,
+            url=url,
+            headers=headers,
+            stream=stream,
+            timeout=(timeout.connect, timeout.read),
+            **kwargs
+        )
+
+    def close(self) -> None:
+        self.__session.close()
+
+    def __drop_idle_connections(self) -> None:
+        """
+        Closes pooled connections that were not used for longer than idle timeout,
+        since server has most likely closed them already.
+        """
+        with self.__idle_lock:
+            now = time.monotonic()
+            if self.__idle_timeout is not None and now - self.__last_used > self.__idle_timeout:
+                self.__adapter.close()
+            self.__last_used = now
+
+
+def build_response(method: str, url: str, status: int = 200, body: Union[bytes, IO[bytes]] = b'',
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Creates requests.Response which reads given body, also when streamed.
+    body is either bytes or a file object which is read only when content is accessed.
+    """
+    res = Response()
+    res.status_code = status
+    res.reason = reasons.get(status, '')
+    res.url = url
+    res.headers = CaseInsensitiveDict(headers or {})
+    res.raw = BytesIO(body) if isinstance(body, bytes) else body
+    res.encoding = 'utf-8'
+    res.request = Request(method, url).prepare()
+    return res
+
+
+class FakeRequest:
+    """
+    Request received by handler of FakeTransport.
+    path is relative to API base url, params are values of placeholders
+    in the route and query holds query string parameters.
+    """
+
+    def __init__(self, prepared: PreparedRequest, path: str, params: Dict[str, str]) -> None:
+        self.method = prepared.method
+        self.url = prepared.url
+        self.path = path
+        self.params = params
+        self.query = dict(parse_qsl(urlsplit(prepared.url).query))
+        self.headers = prepared.headers
+        body = prepared.body
+        self.body = body.encode('utf-8') if isinstance(body, str) else (body or b'')
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class FakeResponse:
+    """
+    Response returned by handler of FakeTransport.
+    Either json or body is sent, json takes precedence.
+    """
+
+    def __init__(self, status: int = 200, json: Any = None, body: bytes = b'',
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        self.status = status
+        self.json = json
+        self.body = body
+        self.headers = dict(headers or {})
+
+    def encode(self) -> Tuple[bytes, Dict[str, str]]:
+        if self.json is None:
+            return self.body, self.headers
+        return json.dumps(self.json).encode('utf-8'), dict({'Content-Type': 'application/json'}, **self.headers)
+
+
+Handler = Callable[[FakeRequest], Any]
+
+
+class FakeTransport(Transport):
+    """
+    In-process transport which routes requests to Python handlers without opening sockets.
+    Routes are paths relative to API base url with placeholders, e.g. /datasets/{id}.
+    Handlers return FakeResponse or any JSON serializable value which is sent with
+    status 200, and may raise requests exceptions to simulate network failures.
+    Login is answered with `token` unless /auth/key-login is routed explicitly.
+    Unknown paths get 404.
+    """
+
+    def __init__(self, token: str = 'fake-token', base_path: str = '/api') -> None:
+        self.token = token
+        self.base_path = base_path
+        self.calls = []  # type: List[FakeRequest]
+        self.__routes = []  # type: List[Tuple[str, Pattern, Handler]]
+        self.__lock = Lock()
+        self.route('POST', '/auth/key-login', self.__login)
+
+    def route(self, method: str, path: str, handler: Handler) -> None:
+        """
+        Registers handler, routes added later take precedence.
+        """
+        pattern = re.compile('^' + re.sub(r'\\{(\w+)\\}', r'(?P<\1>[^/]+)', re.escape(path)) + '$')
+        with self.__lock:
+            self.__routes.insert(0, (method.upper(), pattern, handler))
+
+    def get(self, path: str) -> Callable[[Handler], Handler]:
+        return self.__decorator('GET', path)
+
+    def post(self, path: str) -> Callable[[Handler], Handler]:
+        return self.__decorator('POST', path)
+
+    def put(self, path: str) -> Callable[[Handler], Handler]:
+        return self.__decorator('PUT', path)
+
+    def delete(self, path: str) -> Callable[[Handler], Handler]:
+        return self.__decorator('DELETE', path)
+
+    def send(self, method: str, url: str, headers: dict, stream: bool = False,
+             timeout: Optional[Timeout] = None, **kwargs) -> Response:
+        # Body is encoded by requests, so handlers see exactly what would be sent
+        prepared = Request(method, url, headers=headers, **kwargs).prepare()
+        path = urlsplit(prepared.url).path
+        if path.startswith(self.base_path):
+            path = path[len(self.base_path):]
+
+        handler, params = self.__match(prepared.method, path)
+        request = FakeRequest(prepared, path, params)
+        with self.__lock:
+            self.calls.append(request)
+
+        if handler is None:
+            result = FakeResponse(404, {'message': 'Not Found'})
+        else:
+            result = handler(request)
+        if not isinstance(result, FakeResponse):
+            result = FakeResponse(json=result)
+
+        body, response_headers = result.encode()
+        return build_response(prepared.method, prepared.url, result.status, body, response_headers)
+
+    def __match(self, method: str, path: str) -> Tuple[Optional[Handler], Dict[str, str]]:
+        with self.__lock:
+            routes = list(self.__routes)
+        for route_method, pattern, handler in routes:
+            match = pattern.match(path)
+            if route_method == method and match is not None:
+                return handler, match.groupdict()
+        return None, {}
+
+    def __decorator(self, method: str, path: str) -> Callable[[Handler], Handler]:
+        def register(handler: Handler) -> Handler:
+            self.route(method, path, handler)
+            return handler
+        return register
+
+    def __login(self, request: FakeRequest) -> FakeResponse:
+        return FakeResponse(201, {'data': {'accessToken': self.token}})
+
+
+# Credentials are never written to cassettes
+_SECRET_HEADERS = frozenset(['authorization', 'x-api-key'])
+# Recorded body is already decoded and complete
+_TRANSFER_HEADERS = frozenset(['content-encoding', 'content-length', 'transfer-encoding'])
+
+CASSETTE_VERSION = 2
+# Bodies larger than this are kept in files next to the cassette, smaller ones inline
+INLINE_LIMIT = 64 * 1024
+_CHUNK_SIZE = 64 * 1024
+
+
+def _gzip(data: bytes) -> bytes:
+    buffer = BytesIO()
+    # mtime is fixed so that recording the same traffic gives the same cassette
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+class _PacedReader:
+    """
+    Reads body no faster than it was originally received.
+    """
+
+    def __init__(self, raw: IO[bytes], size: int, duration: float) -> None:
+        self.__raw = raw
+        self.__seconds_per_byte = duration / size if size else 0.0
+
+    def read(self, amount: int = -1) -> bytes:
+        data = self.__raw.read(amount)
+        if data and self.__seconds_per_byte:
+            time.sleep(len(data) * self.__seconds_per_byte)
+        return data
+
+    def close(self) -> None:
+        self.__raw.close()
+
+
+class CassetteTransport(Transport):
+    """
+    Records responses of another transport into a cassette and replays them later
+    without network, e.g. to benchmark parsing and pagination offline.
+    Requests are keyed by method and URL, repeated requests get recorded responses
+    in order and the last one once they run out.
+
+    Cassette is a JSON file with gzipped bodies. Bodies larger than INLINE_LIMIT
+    are written to `<path>.bodies/` while they are received and are streamed from
+    there on replay, so downloads do not hold whole files in memory. Smaller bodies
+    are kept inline whether the request was streamed or not.
+
+    mode is 'record', 'replay' or 'auto' which replays existing cassette and
+    records a new one otherwise. Recorded cassette is written by save() or close().
+    latency scales recorded response times on replay: 0 replays at full speed,
+    1 waits as long as the server took, both for first byte and for the body.
+    """
+
+    def __init__(self, path: str, inner: Optional[Transport] = None, mode: str = 'auto',
+                 latency: float = 0.0) -> None:
+        if mode == 'auto':
+            mode = 'replay' if os.path.exists(path) else 'record'
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.__bodies = f"{path}.bodies"
+        self.__inner = inner if inner is not None or mode == 'replay' else RequestsTransport()
+        self.__lock = Lock()
+        self.__interactions = []  # type: List[dict]
+        self.__body_files = 0
+        self.__replay = {}  # type: Dict[str, List[dict]]
+        if mode == 'replay':
+            self.__load()
+
+    def send(self, method: str, url: str, headers: dict, stream: bool = False,
+             timeout: Optional[Timeout] = None, **kwargs) -> Response:
+        method = method.upper()
+        if self.mode == 'replay':
+            return self.__play(method, url)
+
+        started = time.perf_counter()
+        res = self.__inner.send(method, url, headers, stream, timeout, **kwargs)
+        ttfb = time.perf_counter() - started
+        response_headers = {k: v for k, v in res.headers.items() if k.lower() not in _TRANSFER_HEADERS}
+        response = {
+            'status': res.status_code,
+            'headers': response_headers,
+            'ttfb': round(ttfb, 6)
+        }
+        interaction = {
+            'key': _key(method, url),
+            'request': {
+                'method': method,
+                'url': url,
+                'headers': {k: v for k, v in headers.items() if k.lower() not in _SECRET_HEADERS}
+            },
+            'response': response
+        }
+
+        with res:
+            self.__record_body(res, response)
+        response['elapsed'] = round(time.perf_counter() - started, 6)
+
+        with self.__lock:
+            self.__interactions.append(interaction)
+        return build_response(method, url, res.status_code, self.__open_body(response), response_headers)
+
+    def save(self) -> None:
+        if self.mode != 'record':
+            return
+        with self.__lock:
+            document = {'version': CASSETTE_VERSION, 'interactions': list(self.__interactions)}
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, indent=2)
+
+    def close(self) -> None:
+        self.save()
+        if self.__inner is not None:
+            self.__inner.close()
+
+    def __record_body(self, res: Response, response: dict) -> None:
+        """
+        Reads body in chunks, spilling it to a file once it outgrows INLINE_LIMIT.
+        """
+        buffer = BytesIO()
+        spilled = None
+        size = 0
+        try:
+            for chunk in res.iter_content(_CHUNK_SIZE):
+                size += len(chunk)
+                if spilled is not None:
+                    spilled.write(chunk)
+                    continue
+                buffer.write(chunk)
+                if size > INLINE_LIMIT:
+                    with self.__lock:
+                        self.__body_files += 1
+                        name = f"{self.__body_files}.gz"
+                    os.makedirs(self.__bodies, exist_ok=True)
+                    spilled = gzip.GzipFile(os.path.join(self.__bodies, name), mode='wb', mtime=0)
+                    spilled.write(buffer.getvalue())
+                    response['body_file'] = name
+        finally:
+            if spilled is not None:
+                spilled.close()
+        if spilled is None:
+            response['body'] = b64encode(_gzip(buffer.getvalue())).decode('ascii')
+        response['size'] = size
+
+    def __open_body(self, response: dict) -> IO[bytes]:
+        name = response.get('body_file')
+        if name is not None:
+            return gzip.open(os.path.join(self.__bodies, name), 'rb')
+        body = b64decode(response['body'])
+        if 'size' not in response:
+            # version 1 cassettes kept bodies uncompressed
+            return BytesIO(body)
+        return gzip.GzipFile(fileobj=BytesIO(body), mode='rb')
+
+    def __load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            document = json.load(f)
+        for interaction in document['interactions']:
+            request = interaction['request']
+            key = interaction.get('key') or _key(request['method'], request['url'])
+            self.__replay.setdefault(key, []).append(interaction)
+
+    def __play(self, method: str, url: str) -> Response:
+        with self.__lock:
+            recorded = self.__replay.get(_key(method, url))
+            if not recorded:
+                return build_response(method, url, 404, json.dumps(
+                    {'message': f"No recorded response for {method} {url}"}).encode('utf-8'))
+            interaction = recorded[0] if len(recorded) == 1 else recorded.pop(0)
+
+        response = interaction['response']
+        body = self.__open_body(response)
+        if self.latency:
+            ttfb = response.get('ttfb', 0.0) * self.latency
+            time.sleep(ttfb)
+            body = _PacedReader(body, response.get('size', 0),
+                                max(0.0, response.get('elapsed', 0.0) * self.latency - ttfb))
+        return build_response(method, url, response['status'], body, response['headers'])
+
+
+def _key(method: str, url: str) -> str:
+    return f"{method} {url}"
@@ -0,0 +1,187 @@
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Converts decoded JSON value of a field into its model value
+Converter = Callable[[Any], Any]
+
+
+class ParseMode(Enum):
+    """
+    How API responses are turned into models.
+    VALIDATE runs full pydantic validation of every field.
+    TRUSTED assumes the API returns documents matching the models and builds them
+    without validation: nested models, lists and enums are still converted and
+    values of the wrong type fall back to validation of that field. Validators
+    declared on models are not run in this mode.
+    LAZY returns models that convert fields only when they are read, see LazyModel.
+    COMPILED gives the same result as VALIDATE using decoders generated for every
+    model on first use and cached on disk, see DecoderCompiler.
+    """
+    VALIDATE = 'validate'
+    TRUSTED = 'trusted'
+    LAZY = 'lazy'
+    COMPILED = 'compiled'
+
+
+def parse(type_, data, mode: ParseMode = ParseMode.VALIDATE):
+    """
+    Parses decoded JSON data into type_, e.g. Dataset or List[Dataset].
+    """
+    if mode is ParseMode.TRUSTED:
+        return _root_converter(type_)(data)
+    if mode is ParseMode.LAZY:
+        from avaandmed.parsing.lazy import parse_lazy
+        return parse_lazy(type_, data)
+    if mode is ParseMode.COMPILED:
+        from avaandmed.parsing.compiled import compiler
+        return compiler.parse(type_, data)
+    from pydantic import parse_obj_as
+    return parse_obj_as(type_, data)
+
+
+def construct(model, data: Dict[str, Any]):
+    """
+    Builds instance of pydantic model from trusted data keyed by field aliases.
+    """
+    return _construct(model, _plan(model), data)
+
+
+# model -> (alias, name, converter, whether None is allowed, field) of every field
+_PLANS = {}  # type: Dict[type, List[Tuple[str, str, Optional[Converter], bool, Any]]]
+_ROOTS = {}  # type: Dict[Any, Converter]
+
+
+def _plan(model) -> List[Tuple[str, str, Optional[Converter], bool, Any]]:
+    plan = _PLANS.get(model)
+    if plan is None:
+        plan = [(field.alias, name, _converter(field, model), field.allow_none, field)
+                for name, field in model.__fields__.items()]
+        _PLANS[model] = plan
+    return plan
+
+
+def _construct(model, plan, data: Dict[str, Any]):
+    values = {}
+    fields_set = set()
+    for alias, name, convert, allow_none, field in plan:
+        if alias in data:
+            value = data[alias]
+            if convert is None or (value is None and allow_none):
+                values[name] = value
+            else:
+                values[name] = convert(value)
+            fields_set.add(name)
+        else:
+            values[name] = _missing(model, field)
+
+    instance = model.__new__(model)
+    object.__setattr__(instance, '__dict__', values)
+    object.__setattr__(instance, '__fields_set__', fields_set)
+    if model.__private_attributes__:
+        instance._init_private_attributes()
+    return instance
+
+
+def _missing(model, field):
+    """
+    Returns default of field missing from data or raises ValidationError if it is required.
+    """
+    if field.required:
+        from pydantic import ValidationError
+        from pydantic.error_wrappers import ErrorWrapper
+        from pydantic.errors import MissingError
+        raise ValidationError([ErrorWrapper(MissingError(), loc=field.alias)], model)
+    return field.get_default()
+
+
+def _root_converter(type_) -> Converter:
+    convert = _ROOTS.get(type_)
+    if convert is None:
+        from pydantic import create_model
+
+        model = create_model('ParsingModel', __root__=(type_, ...))
+        convert = _converter(model.__fields__['__root__'], model) or _identity
+        _ROOTS[type_] = convert
+    return convert
+
+
+def _identity(value):
+    return value
+
+
+def _validator(field, model) -> Converter:
+    """
+    Returns full validation of field, used for values not matching the expected type.
+    """
+    def validate(value):
+        result, errors = field.validate(value, {}, loc=field.alias, cls=model)
+        if errors:
+            from pydantic import ValidationError
+            raise ValidationError([errors], model)
+        return result
+    return validate
+
+
+def _converter(field, model) -> Optional[Converter]:
+    """
+    Returns converter of field values or None if decoded JSON value can be used as is.
+    Converters validate values they don't expect, including None.
+    """
+    from pydantic import BaseModel
+    from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_MAPPING, SHAPE_SINGLETON
+
+    fallback = _validator(field, model)
+    type_ = field.type_
+
+    if field.shape == SHAPE_SINGLETON:
+        if field.sub_fields:
+            # Union other than Optional
+            return fallback
+        if type_ is Any:
+            return None
+        if isinstance(type_, type) and issubclass(type_, BaseModel):
+            plan = []  # type: List
+
+            def convert_model(value):
+                if value.__class__ is not dict:
+                    return fallback(value)
+                if not plan:
+                    plan.append(_plan(type_))
+                return _construct(type_, plan[0], value)
+            return convert_model
+        if isinstance(type_, type) and issubclass(type_, Enum):
+            members = type_._value2member_map_
+
+            def convert_enum(value):
+                try:
+                    return members[value]
+                except (KeyError, TypeError):
+                    return fallback(value)
+            return convert_enum
+        if type_ in (str, int, float, bool):
+            def convert_scalar(value):
+                return value if value.__class__ is type_ else fallback(value)
+            return convert_scalar
+        return fallback
+
+    if field.shape == SHAPE_LIST and field.sub_fields:
+        item_field = field.sub_fields[0]
+        convert_item = _converter(item_field, model)
+
+        def convert_list(value):
+            if value.__class__ is not list:
+                return fallback(value)
+            if convert_item is None:
+                return list(value)
+            if item_field.allow_none:
+                return [None if item is None else convert_item(item) for item in value]
+            return [convert_item(item) for item in value]
+        return convert_list
+
+    if field.shape in (SHAPE_DICT, SHAPE_MAPPING) and field.sub_fields:
+        if field.key_field.type_ in (str, Any) and field.sub_fields[0].type_ is Any:
+            def convert_dict(value):
+                return dict(value) if value.__class__ is dict else fallback(value)
+            return convert_dict
+    return fallback
+
@@ -0,0 +1,143 @@
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+from avaandmed.parsing.lazy import LazyModel
+
+_COMPACT_MODELS = {}  # type: Dict[type, type]
+
+
+class CompactModel:
+    """
+    Read-only counterpart of a pydantic model storing fields in __slots__,
+    which takes a fraction of the memory of the model.
+    Lists are stored as tuples and nested models as their compact counterparts.
+    Strings of fields listed in INTERNED are interned, so values repeated across
+    instances, e.g. language or mimetype, are stored once.
+    Use compact_model() to get compact counterpart of a model.
+    """
+    __slots__ = ()
+    MODEL = None  # type: type
+    INTERNED = frozenset()  # type: frozenset
+    _SETTERS = ()  # type: tuple
+
+    @classmethod
+    def from_model(cls, instance: BaseModel, pool: Optional[Dict[Any, Any]] = None):
+        """
+        Converts pydantic model into compact one. Equal nested values are stored once
+        within a pool, pass the same dict to conversions of a collection to share them.
+        """
+        if pool is None:
+            pool = {}
+        if isinstance(instance, LazyModel):
+            instance._load_fields()
+        values = instance.__dict__
+        interned = cls.INTERNED
+        compact = cls.__new__(cls)
+        for name, setter in cls._SETTERS:
+            value = values.get(name)
+            if value is not None:
+                value = _compact(value, pool, name in interned)
+            setter(compact, value)
+        return compact
+
+    def to_model(self) -> BaseModel:
+        """
+        Converts back to pydantic model without validation.
+        Fields which are not None are reported as set in __fields_set__.
+        """
+        values = {name: _expand(getattr(self, name)) for name in self.__slots__}
+        instance = self.MODEL.__new__(self.MODEL)
+        object.__setattr__(instance, '__dict__', values)
+        object.__setattr__(instance, '__fields_set__', {k for k, v in values.items() if v is not None})
+        return instance
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError(f"'{type(self).__name__}' is read-only")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"'{type(self).__name__}' is read-only")
+
+    def __values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.__values() == other.__values()
+
+    def __hash__(self) -> int:
+        return hash(self.__values())
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def __reduce__(self):
+        # Compact classes are created at runtime, so they are looked up by model
+        return _restore, (self.MODEL, self.__values())
+
+
+def _restore(model: type, values: Sequence[Any]):
+    cls = compact_model(model)
+    compact = cls.__new__(cls)
+    for (name, setter), value in zip(cls._SETTERS, values):
+        setter(compact, value)
+    return compact
+
+
+def compact_model(model: type, interned: Iterable[str] = ()) -> type:
+    """
+    Returns CompactModel counterpart of pydantic model, e.g. CompactDataset for Dataset.
+    interned lists fields whose strings are interned, it is used when the class
+    is created on first call for the model.
+    """
+    if issubclass(model, LazyModel):
+        model = model.__bases__[1]
+    compact = _COMPACT_MODELS.get(model)
+    if compact is None:
+        name = f"Compact{model.__name__}"
+        fields = tuple(model.__fields__)
+        compact = type(name, (CompactModel,), {
+            '__slots__': fields,
+            '__module__': model.__module__,
+            '__qualname__': name,
+            'MODEL': model,
+            'INTERNED': frozenset(interned)
+        })
+        compact._SETTERS = tuple((field, getattr(compact, field).__set__) for field in fields)
+        _COMPACT_MODELS[model] = compact
+    return compact
+
+
+def compact(instances: Iterable[BaseModel]) -> List[CompactModel]:
+    """
+    Converts collection of pydantic models, sharing equal nested values between them.
+    """
+    pool = {}  # type: Dict[Any, Any]
+    return [compact_model(type(instance)).from_model(instance, pool) for instance in instances]
+
+
+def _compact(value, pool: Dict[Any, Any], intern: bool):
+    if value.__class__ is str:
+        return sys.intern(value) if intern else value
+    if isinstance(value, BaseModel):
+        value = compact_model(type(value)).from_model(value, pool)
+    elif value.__class__ is list:
+        value = tuple(_compact(item, pool, intern) if item is not None else None for item in value)
+    else:
+        return value
+    try:
+        return pool.setdefault(value, value)
+    except TypeError:
+        # Contains unhashable values such as dicts
+        return value
+
+
+def _expand(value):
+    if isinstance(value, CompactModel):
+        return value.to_model()
+    if value.__class__ is tuple:
+        return [_expand(item) for item in value]
+    return value
@@ -0,0 +1,336 @@
+import hashlib
+import importlib.util
+import os
+import sys
+import tempfile
+from enum import Enum
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Extra, ValidationError, parse_obj_as
+from pydantic.fields import SHAPE_DICT, SHAPE_LIST, SHAPE_MAPPING, SHAPE_SINGLETON
+
+from avaandmed.parsing import ParseMode, _missing, _validator, parse
+
+# Changing generated code requires bumping it, so that cached decoders are regenerated
+GENERATOR_VERSION = 1
+
+_SCALARS = {str: 'str', int: 'int', float: 'float', bool: 'bool'}
+
+
+def default_cache_dir() -> Optional[str]:
+    """
+    Returns AVAANDMED_CACHE_DIR, None if it is not set and decoders are kept in memory.
+    """
+    return os.environ.get('AVAANDMED_CACHE_DIR') or None
+
+
+class CompilerStats:
+    """
+    Counters of decoders generated and loaded from cache directory.
+    """
+
+    def __init__(self) -> None:
+        self.generated = 0
+        self.loaded = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {'generated': self.generated, 'loaded': self.loaded}
+
+    def __repr__(self) -> str:
+        return f"CompilerStats(generated={self.generated}, loaded={self.loaded})"
+
+
+class DecoderCompiler:
+    """
+    Generates straight-line decoding functions for pydantic models on first use.
+    Decoders map camelCase aliases to fields, convert nested models, lists and enums
+    and check types of scalars inline. Values of unexpected type are validated by
+    pydantic, so the result is the same as parse_obj_as; if data is invalid,
+    parse_obj_as is run to raise the same ValidationError.
+    By default decoders are kept in memory only. With cache_dir generated modules
+    are written there and reused between runs, their bytecode is cached by Python
+    as for any module. The directory must be writable by the user only, as its
+    modules are executed.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None) -> None:
+        self.cache_dir = cache_dir
+        self.stats = CompilerStats()
+        self.__decoders = {}  # type: Dict[type, Callable[[Any], Any]]
+        self.__roots = {}  # type: Dict[Any, Callable[[Any], Any]]
+        self.__lock = Lock()
+
+    def parse(self, type_, data):
+        """
+        Parses decoded JSON data into type_, e.g. Dataset or List[Dataset].
+        """
+        decode = self.__roots.get(type_)
+        if decode is None:
+            decode = self.__roots[type_] = self.__root(type_)
+        try:
+            return decode(data)
+        except ValidationError:
+            return parse_obj_as(type_, data)
+
+    def decoder(self, model: type) -> Callable[[Dict[str, Any]], Any]:
+        """
+        Returns decoder of model taking dict with aliased keys, compiling it on first call.
+        """
+        decode = self.__decoders.get(model)
+        if decode is None:
+            with self.__lock:
+                decode = self.__decoders.get(model)
+                if decode is None:
+                    decode = self.__compile(model)
+        return decode
+
+    def __root(self, type_) -> Callable[[Any], Any]:
+        if _is_model(type_):
+            decode_model = self.decoder(type_)
+
+            def decode(data):
+                if data.__class__ is not dict:
+                    return parse_obj_as(type_, data)
+                return decode_model(data)
+            return decode
+
+        if getattr(type_, '__origin__', None) in (list, List) and _is_model(type_.__args__[0]):
+            decode_item = self.decoder(type_.__args__[0])
+
+            def decode_list(data):
+                if data.__class__ is not list or not all(item.__class__ is dict for item in data):
+                    return parse_obj_as(type_, data)
+                return [decode_item(item) for item in data]
+            return decode_list
+
+        return lambda data: parse(type_, data, ParseMode.TRUSTED)
+
+    def __compile(self, model: type) -> Callable[[Dict[str, Any]], Any]:
+        generator = _Generator(model)
+        source = generator.source()
+        module = None
+        if self.cache_dir is not None:
+            module = self.__load(model, source)
+        if module is None:
+            namespace = {}  # type: Dict[str, Any]
+            exec(compile(source, f"<decoders of {model.__qualname__}>", 'exec'), namespace)
+            make = namespace['make']
+            self.stats.generated += 1
+        else:
+            make = module.make
+        decoders = make(generator.env)
+        for index, decoded in enumerate(generator.models):
+            self.__decoders.setdefault(decoded, decoders[index])
+        return self.__decoders[model]
+
+    def __load(self, model: type, source: str):
+        """
+        Imports module of decoders from cache directory. The file is written first if it
+        is missing or its content differs from source, e.g. it was edited or truncated.
+        Returns None if cache directory can't be used.
+        """
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        name = f"{model.__name__.lower()}_{digest}"
+        path = os.path.join(self.cache_dir, f"{name}.py")
+        try:
+            cached = _read_source(path)
+            if cached != source:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                fd, temp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+                    f.write(source)
+                os.replace(temp, path)
+                # Bytecode of replaced file could be taken as fresh if its size and mtime match
+                _remove(importlib.util.cache_from_source(path))
+            spec = importlib.util.spec_from_file_location(f"avaandmed_decoders.{name}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+        except (OSError, SyntaxError):
+            return None
+        if cached == source:
+            self.stats.loaded += 1
+        else:
+            self.stats.generated += 1
+        return module
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_source(path: str) -> Optional[str]:
+    """
+    Returns content of cached decoders at path, None if it is missing or not UTF-8.
+    """
+    try:
+        with open(path, encoding='utf-8', newline='') as f:
+            return f.read()
+    except (FileNotFoundError, UnicodeDecodeError):
+        return None
+
+
+class _Generator:
+    """
+    Renders source of decoders of model and models nested in it.
+    Objects used by decoders are passed in env, the source only refers to them by name,
+    so it is the same between runs as long as models don't change.
+    """
+
+    def __init__(self, model: type) -> None:
+        self.models = [model]  # type: List[type]
+        self.env = {}  # type: Dict[str, Any]
+        self.__lines = []  # type: List[str]
+        self.__names = set()  # type: set
+        index = 0
+        while index < len(self.models):
+            self.__model(index, self.models[index])
+            index += 1
+
+    def source(self) -> str:
+        header = [
+            f"# Generated by avaandmed {__name__}, version {GENERATOR_VERSION}. Do not edit.",
+            '',
+            '',
+            'def make(env):',
+        ]
+        names = [f"    {name} = env['{name}']" for name in sorted(self.__names)]
+        decoders = ', '.join(f"decode_{i}" for i in range(len(self.models)))
+        return '\n'.join(header + names + self.__lines + [f"    return [{decoders}]", ''])
+
+    def __ref(self, name: str, value) -> str:
+        self.env[name] = value
+        self.__names.add(name)
+        return name
+
+    def __model_index(self, model: type) -> int:
+        if model not in self.models:
+            self.models.append(model)
+        return self.models.index(model)
+
+    def __model(self, index: int, model: type) -> None:
+        emit = self.__lines.append
+        cls = self.__ref(f"M{index}", model)
+        emit('')
+        if model.__config__.extra is not Extra.ignore or model.__validators__ \
+                or model.__pre_root_validators__ or model.__post_root_validators__:
+            # Validators can change anything, such models are always validated
+            emit(f"    decode_{index} = {cls}.validate")
+            return
+
+        fields = list(model.__fields__.items())
+        # Missing fields are rare, they are filled in by complete_N keeping order of fields
+        emit(f"    def complete_{index}(present):")
+        emit('        values = {}')
+        for position, (name, field) in enumerate(fields):
+            ref = f"{index}_{position}"
+            if field.required:
+                default = f"missing({cls}, {self.__ref(f'F{ref}', field)})"
+            elif field.default is None and field.default_factory is None:
+                default = 'None'
+            else:
+                default = f"{self.__ref(f'F{ref}', field)}.get_default()"
+            emit(f"        values[{name!r}] = present[{name!r}] if {name!r} in present else {default}")
+        emit('        return values')
+        emit('')
+        emit(f"    def decode_{index}(data):")
+        emit('        values = {}')
+        for position, (name, field) in enumerate(fields):
+            ref = f"{index}_{position}"
+            validate = self.__ref(f"V{ref}", _validator(field, model))
+            emit(f"        if {field.alias!r} in data:")
+            emit(f"            v = data[{field.alias!r}]")
+            body = self.__convert(field, validate, ref)
+            if body and field.allow_none and not body[0].startswith('if v is not None'):
+                emit('            if v is not None:')
+                body = ['    ' + line for line in body]
+            for line in body:
+                emit('            ' + line)
+            emit(f"            values[{name!r}] = v")
+        emit('        fields_set = set(values)')
+        emit(f"        if len(fields_set) != {len(fields)}:")
+        emit(f"            values = complete_{index}(values)")
+        emit(f"        instance = new({cls})")
+        emit("        setattr(instance, '__dict__', values)")
+        emit("        setattr(instance, '__fields_set__', fields_set)")
+        if model.__private_attributes__:
+            emit('        instance._init_private_attributes()')
+        emit('        return instance')
+        self.__ref('new', object.__new__)
+        self.__ref('setattr', object.__setattr__)
+        self.__ref('missing', _missing)
+
+    def __convert(self, field, validate: str, ref: str) -> List[str]:
+        """
+        Returns lines converting decoded JSON value v of field.
+        """
+        type_ = field.type_
+        if field.shape == SHAPE_SINGLETON and not field.sub_fields:
+            kind = self.__kind(type_, ref)
+            if kind is None:
+                return []
+            if kind[0] == 'model':
+                return [f"v = {kind[1]}(v) if v.__class__ is dict else {validate}(v)"]
+            if kind[0] == 'enum':
+                return ['try:',
+                        f"    v = {kind[1]}[v]",
+                        'except (KeyError, TypeError):',
+                        f"    v = {validate}(v)"]
+            if kind[0] == 'scalar':
+                check = f"v.__class__ is not {kind[1]}"
+                if field.allow_none:
+                    check = f"v is not None and {check}"
+                return [f"if {check}:",
+                        f"    v = {validate}(v)"]
+
+        elif field.shape == SHAPE_LIST and field.sub_fields and not field.sub_fields[0].allow_none:
+            item = field.sub_fields[0]
+            kind = self.__kind(item.type_, ref) if item.shape == SHAPE_SINGLETON and not item.sub_fields \
+                else ('other',)
+            if kind is None:
+                return [f"v = list(v) if v.__class__ is list else {validate}(v)"]
+            if kind[0] == 'model':
+                return ['if v.__class__ is list and all(x.__class__ is dict for x in v):',
+                        f"    v = [{kind[1]}(x) for x in v]",
+                        'else:',
+                        f"    v = {validate}(v)"]
+            if kind[0] == 'enum':
+                return ['try:',
+                        f"    v = [{kind[1]}[x] for x in v] if v.__class__ is list else {validate}(v)",
+                        'except (KeyError, TypeError):',
+                        f"    v = {validate}(v)"]
+            if kind[0] == 'scalar':
+                return [f"if v.__class__ is list and all(x.__class__ is {kind[1]} for x in v):",
+                        '    v = list(v)',
+                        'else:',
+                        f"    v = {validate}(v)"]
+
+        elif field.shape in (SHAPE_DICT, SHAPE_MAPPING) and field.sub_fields \
+                and field.key_field.type_ in (str, Any) and field.sub_fields[0].type_ is Any:
+            return [f"v = dict(v) if v.__class__ is dict else {validate}(v)"]
+
+        return [f"v = {validate}(v)"]
+
+    def __kind(self, type_, ref: str) -> Optional[Tuple[str, ...]]:
+        """
+        Returns how values of type_ are converted, None if they are used as is.
+        """
+        if type_ is Any:
+            return None
+        if _is_model(type_):
+            return 'model', f"decode_{self.__model_index(type_)}"
+        if isinstance(type_, type) and issubclass(type_, Enum):
+            return 'enum', self.__ref(f"E{ref}", type_._value2member_map_)
+        if type_ in _SCALARS:
+            return 'scalar', _SCALARS[type_]
+        return 'other',
+
+
+def _is_model(type_) -> bool:
+    return isinstance(type_, type) and issubclass(type_, BaseModel)
+
+
+compiler = DecoderCompiler(default_cache_dir())
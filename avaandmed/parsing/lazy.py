@@ -0,0 +1,110 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+from avaandmed.parsing import ParseMode, _missing, _plan, parse
+
+_LAZY_MODELS = {}  # type: Dict[type, type]
+# model -> field name -> entry of the model plan
+_ENTRIES = {}  # type: Dict[type, Dict[str, tuple]]
+# model -> field alias -> field name
+_NAMES = {}  # type: Dict[type, Dict[str, str]]
+
+
+class LazyModel(BaseModel):
+    """
+    Model backed by decoded JSON dict, each field is converted when it is first read
+    and then kept. Nested models and enums are converted as in trusted parsing.
+    Comparison, dict(), json(), copy() and pickling convert all fields first.
+    Use lazy_model() to get lazy counterpart of a model.
+    """
+    __slots__ = ('__raw',)
+
+    @classmethod
+    def wrap(cls, data: Dict[str, Any]):
+        """
+        Returns instance reading fields from data, which should not be changed afterwards.
+        """
+        names = _NAMES.get(cls)
+        if names is None:
+            names = _NAMES[cls] = {entry[0]: entry[1] for entry in _plan(cls)}
+        instance = cls.__new__(cls)
+        object.__setattr__(instance, '__dict__', {})
+        object.__setattr__(instance, '__fields_set__', {names[key] for key in data if key in names})
+        object.__setattr__(instance, '_LazyModel__raw', data)
+        return instance
+
+    def __getattr__(self, name: str):
+        cls = type(self)
+        entries = _ENTRIES.get(cls)
+        if entries is None:
+            entries = _ENTRIES[cls] = {entry[1]: entry for entry in _plan(cls)}
+        entry = entries.get(name)
+        try:
+            raw = self.__raw
+        except AttributeError:
+            entry = None
+        if entry is None:
+            raise AttributeError(f"'{cls.__name__}' object has no attribute '{name}'")
+
+        alias, name, convert, allow_none, field = entry
+        if alias in raw:
+            value = raw[alias]
+            if convert is not None and not (value is None and allow_none):
+                value = convert(value)
+        else:
+            value = _missing(cls, field)
+        self.__dict__[name] = value
+        return value
+
+    def _load_fields(self) -> None:
+        values = self.__dict__
+        if len(values) == len(self.__fields__):
+            return
+        for name in self.__fields__:
+            if name not in values:
+                getattr(self, name)
+        # Keep order of fields the same as in eagerly parsed models
+        object.__setattr__(self, '__dict__', {name: values[name] for name in self.__fields__})
+
+    def _iter(self, *args, **kwargs):
+        self._load_fields()
+        return super()._iter(*args, **kwargs)
+
+    def __repr_args__(self):
+        self._load_fields()
+        return super().__repr_args__()
+
+    def __getstate__(self):
+        self._load_fields()
+        return super().__getstate__()
+
+
+def lazy_model(model: type) -> type:
+    """
+    Returns subclass of model which is a LazyModel, e.g. LazyDataset for Dataset.
+    """
+    if issubclass(model, LazyModel):
+        return model
+    lazy = _LAZY_MODELS.get(model)
+    if lazy is None:
+        name = f"Lazy{model.__name__}"
+        lazy = type(model)(name, (LazyModel, model), {'__module__': model.__module__, '__qualname__': name})
+        _LAZY_MODELS[model] = lazy
+    return lazy
+
+
+def parse_lazy(type_, data):
+    """
+    Wraps data into lazy models if type_ is a model or list of models,
+    other types are parsed in trusted mode.
+    """
+    if isinstance(type_, type) and issubclass(type_, BaseModel) and data.__class__ is dict:
+        return lazy_model(type_).wrap(data)
+    if getattr(type_, '__origin__', None) in (list, List) and data.__class__ is list:
+        item = type_.__args__[0]
+        if isinstance(item, type) and issubclass(item, BaseModel) \
+                and all(value.__class__ is dict for value in data):
+            wrap = lazy_model(item).wrap
+            return [wrap(value) for value in data]
+    return parse(type_, data, ParseMode.TRUSTED)
@@ -0,0 +1,3 @@
+from avaandmed.testing.server import ApiServer, Catalog, Faults
+
+__all__ = ['ApiServer', 'Catalog', 'Faults']
@@ -0,0 +1,3 @@
+from avaandmed.testing.server import main
+
+main()
@@ -0,0 +1,672 @@
+"""
+Local stand-in for the Avaandmed API.
+
+    python -m avaandmed.testing --port 8080 --datasets 100000 --latency 0.05 --throttle-rate 0.01
+
+Serves endpoints used by the client from a synthetic catalog, so that the client
+can be exercised at production scale without network.
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+TOKEN = 'test-token'
+CHUNK_SIZE = 64 * 1024
+
+_CATEGORIES = ('transport', 'health', 'economy', 'environment', 'society', 'education', 'culture', 'energy')
+_INTERVALS = ('day', 'week', 'month', 'quarter', 'year', 'irregular')
+_TOPICS = ('transportation', 'health', 'economy', 'environment', 'society')
+_COLUMNS = ('id', 'name', 'category', 'value', 'date')
+
+
+class Catalog:
+    """
+    Synthetic catalog generated on demand from indexes, so that even very large
+    catalogs take no memory and the same index always gives the same dataset.
+    Files are CSV with fixed width rows, any byte range or page of rows of them
+    can be generated directly.
+    """
+
+    def __init__(self, datasets: int = 100000, files_per_dataset: int = 2,
+                 rows_per_file: int = 1000000, organizations: int = 10) -> None:
+        self.datasets = datasets
+        self.files_per_dataset = files_per_dataset
+        self.rows_per_file = rows_per_file
+        self.organizations = organizations
+        self.header = (','.join(_COLUMNS) + '\n').encode('ascii')
+        self.row_size = len(self.csv_row(0))
+
+    def dataset_id(self, index: int) -> str:
+        return f"{index:08x}-0000-4000-8000-000000000000"
+
+    def file_id(self, index: int, file: int) -> str:
+        return f"{index:08x}-{file:04x}-4000-8000-000000000001"
+
+    def organization_id(self, index: int) -> str:
+        return f"{index:08x}-0000-4000-8000-000000000002"
+
+    def find(self, value: str) -> Optional[int]:
+        """
+        Returns index of dataset with given id or slug.
+        """
+        match = re.match(r'^([0-9a-f]{8})-0000-4000-8000-000000000000$', value)
+        if match is not None:
+            index = int(match.group(1), 16)
+        else:
+            match = re.match(r'^dataset-(\d+)$', value)
+            if match is None:
+                return None
+            index = int(match.group(1))
+        return index if index < self.datasets else None
+
+    def find_file(self, index: int, value: str) -> Optional[int]:
+        match = re.match(r'^([0-9a-f]{8})-([0-9a-f]{4})-4000-8000-000000000001$', value)
+        if match is None or int(match.group(1), 16) != index:
+            return None
+        file = int(match.group(2), 16)
+        return file if file < self.files_per_dataset else None
+
+    def organization(self, index: int) -> dict:
+        return {
+            'id': self.organization_id(index),
+            'regCode': f"{70000000 + index}",
+            'name': f"Organization {index}",
+            'slug': f"organization-{index}",
+            'contact': f"Contact {index}",
+            'contactEmail': f"info@organization-{index}.ee",
+            'description': f"Synthetic organization {index}",
+            'isPublicBody': index % 2 == 0,
+            'notifications': [],
+            'domain': f"organization-{index}.ee"
+        }
+
+    def summary(self, index: int) -> dict:
+        """
+        Dataset as returned in lists.
+        """
+        return {
+            'id': self.dataset_id(index),
+            'slug': f"dataset-{index}",
+            'name': f"Dataset {index}",
+            'nameEt': f"Andmestik {index}",
+            'nameEn': f"Dataset {index}",
+            'descriptionEt': f"Sünteetiline andmestik number {index}",
+            'descriptionEn': f"Synthetic dataset number {index}",
+            'createdAt': _timestamp(index),
+            'updatedAt': _timestamp(index + 1),
+            'organizationId': self.organization_id(index % self.organizations)
+        }
+
+    def dataset(self, index: int) -> dict:
+        category = index % len(_CATEGORIES)
+        return dict(
+            self.summary(index),
+            status='completed',
+            access='public',
+            maintainer=f"Maintainer {index}",
+            maintainerEmail=f"maintainer-{index}@example.ee",
+            maintainerPhone='+3725550000',
+            citations=[{'url': f"https://example.ee/datasets/{index}", 'name': 'Source'}],
+            conformities=[{'releaseDate': '2010-12-08T00:00:00', 'specification': 'INSPIRE'}],
+            dataFrom=_timestamp(index),
+            updateIntervalUnit=_INTERVALS[index % len(_INTERVALS)],
+            updateIntervalFrequency=1,
+            userId=self.organization_id(index % self.organizations),
+            resourceType='dataset',
+            topicCategories=[_TOPICS[index % len(_TOPICS)]],
+            keywords=[{'id': category, 'name': _CATEGORIES[category], 'language': 'en',
+                       'keywordEmsCategory': {'id': category, 'emsCategoryId': category, 'keywordId': category}}],
+            categories=[{'id': category, 'name': _CATEGORIES[category]}],
+            regions=[{'id': index % 15, 'name': f"Region {index % 15}"}],
+            coordinateReferenceSystems=[{'id': 1, 'uri': 'EPSG:3301'}],
+            licence={'id': 'cc-by-4', 'name': 'CC BY 4.0', 'description': 'Creative Commons'},
+            files=[self.file(index, file) for file in range(self.files_per_dataset)],
+            isActual=True
+        )
+
+    def file(self, index: int, file: int) -> dict:
+        return {
+            'id': self.file_id(index, file),
+            'name': f"dataset-{index}-{file}.csv",
+            'mimetype': 'text/csv',
+            'size': str(self.file_size),
+            'datasetId': self.dataset_id(index),
+            'metadata': {},
+            'processingStatus': 'completed',
+            'storageFilename': f"{self.file_id(index, file)}.csv"
+        }
+
+    def columns(self) -> List[dict]:
+        return [{'column': name, 'type': 'text', 'description': None, 'apiFieldName': name,
+                 'unit': None, 'required': name == 'id', 'private': False, 'unique': name == 'id'}
+                for name in _COLUMNS]
+
+    @property
+    def file_size(self) -> int:
+        return len(self.header) + self.rows_per_file * self.row_size
+
+    def row(self, row: int) -> Dict[str, str]:
+        return {name: value.strip() for name, value in zip(_COLUMNS, self.__values(row))}
+
+    def csv_row(self, row: int) -> bytes:
+        return (','.join(self.__values(row)) + '\n').encode('ascii')
+
+    def csv_range(self, start: int, end: int) -> Iterator[bytes]:
+        """
+        Yields bytes start to end (inclusive) of a file in chunks.
+        """
+        header = len(self.header)
+        if start < header:
+            yield self.header[start:end + 1]
+            start = header
+        rows_per_chunk = max(1, CHUNK_SIZE // self.row_size)
+        while start <= end:
+            first = (start - header) // self.row_size
+            last = min(self.rows_per_file, first + rows_per_chunk)
+            chunk = _csv_rows(self, first, last)
+            offset = header + first * self.row_size
+            yield chunk[start - offset:end - offset + 1]
+            start = header + last * self.row_size
+
+    def __values(self, row: int) -> Tuple[str, ...]:
+        return (
+            f"{row:010d}",
+            f"row-{row:010d}",
+            f"{_CATEGORIES[row % len(_CATEGORIES)]:<11}",
+            f"{(row * 2654435761) % 1000000000 / 1000:012.3f}",
+            f"20{10 + row % 12:02d}-{1 + row % 12:02d}-{1 + row % 28:02d}"
+        )
+
+
+def _timestamp(index: int) -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime(1577836800 + index * 3600))
+
+
+@lru_cache(maxsize=4096)
+def _dataset_json(catalog: Catalog, index: int) -> bytes:
+    return json.dumps({'data': catalog.dataset(index)}).encode('utf-8')
+
+
+# Up to 16 MB of recently served file chunks, so that repeated downloads are not
+# limited by generating rows
+@lru_cache(maxsize=256)
+def _csv_rows(catalog: Catalog, first: int, last: int) -> bytes:
+    return b''.join(catalog.csv_row(row) for row in range(first, last))
+
+
+class Faults:
+    """
+    Failures injected into responses.
+    latency is number of seconds every response is delayed by, with up to `jitter`
+    seconds added at random. error_rate and throttle_rate are shares of requests
+    answered with 503 and 429 respectively, 429 tells to retry after `retry_after`.
+    seed makes the sequence of failures repeatable.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: int = 1, seed: Optional[int] = None) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.__random = random.Random(seed)
+        self.__lock = Lock()
+
+    def draw(self) -> Tuple[float, Optional[int]]:
+        """
+        Returns delay and status to fail with, None if request should succeed.
+        """
+        with self.__lock:
+            delay = self.latency + (self.__random.uniform(0, self.jitter) if self.jitter else 0.0)
+            chance = self.__random.random()
+        if chance < self.throttle_rate:
+            return delay, 429
+        if chance < self.throttle_rate + self.error_rate:
+            return delay, 503
+        return delay, None
+
+
+class _Reply:
+    def __init__(self, status: int = 200, data: Any = None, body: Optional[bytes] = None,
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        self.status = status
+        self.body = body if body is not None else json.dumps({'data': data}).encode('utf-8')
+        self.headers = headers or {'Content-Type': 'application/json'}
+
+
+def _ok(status: int = 200) -> _Reply:
+    return _Reply(status, True)
+
+
+def _not_found(message: str = 'Not Found') -> _Reply:
+    return _Reply(404, body=json.dumps({'message': message}).encode('utf-8'))
+
+
+def _paged(items: Callable[[int], dict], total: int, query: Dict[str, str], max_limit: int) -> _Reply:
+    """
+    Pages through items with limit and offset, or limit and page counted from 1.
+    """
+    try:
+        limit = min(int(query.get('limit', 20)), max_limit)
+        offset = int(query['offset']) if 'offset' in query else (int(query.get('page', 1)) - 1) * limit
+    except ValueError:
+        return _Reply(400, body=b'{"message": "Invalid paging parameters"}')
+    if limit < 0 or offset < 0:
+        return _Reply(400, body=b'{"message": "Invalid paging parameters"}')
+    end = min(total, offset + limit)
+    document = {
+        'data': [items(i) for i in range(offset, end)],
+        'metadata': {'page': offset // limit + 1 if limit else 1, 'limit': limit,
+                     'offset': offset, 'total': total}
+    }
+    return _Reply(body=json.dumps(document).encode('utf-8'))
+
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.stub.count_connection()
+
+    def do_GET(self) -> None:
+        self.__handle('GET')
+
+    def do_POST(self) -> None:
+        self.__handle('POST')
+
+    def do_PUT(self) -> None:
+        self.__handle('PUT')
+
+    def do_DELETE(self) -> None:
+        self.__handle('DELETE')
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def __handle(self, method: str) -> None:
+        body = self.__read_body()
+        server = self.server.stub  # type: ApiServer
+        parts = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+
+        delay, failure = server.faults.draw()
+        if delay:
+            time.sleep(delay)
+        if failure is not None:
+            headers = {'Content-Type': 'application/json'}
+            if failure == 429:
+                headers['Retry-After'] = str(server.faults.retry_after)
+            message = 'Too Many Requests' if failure == 429 else 'Service Unavailable'
+            return self.__send(method, _Reply(failure, body=json.dumps({'message': message}).encode('utf-8'),
+                                              headers=headers))
+
+        path = parts.path
+        if not path.startswith('/api/'):
+            return self.__send(method, _not_found())
+        path = path[len('/api'):]
+
+        if path == '/auth/key-login' and method == 'POST':
+            if 'X-API-KEY' not in self.headers:
+                return self.__send(method, _Reply(401, body=b'{"message": "Missing API key"}'))
+            return self.__send(method, _Reply(201, {'accessToken': server.token}))
+        if self.headers.get('Authorization') != f"Bearer {server.token}":
+            return self.__send(method, _Reply(401, body=b'{"message": "Unauthorized"}'))
+
+        reply = server.route(method, path, query, self.headers, body)
+        self.__send(method, reply)
+
+    def __read_body(self) -> bytes:
+        length = int(self.headers.get('Content-Length', 0))
+        return self.rfile.read(length) if length else b''
+
+    def __send(self, method: str, reply: _Reply) -> None:
+        if isinstance(reply, _Stream):
+            self.server.stub.count_status(reply.status)
+            return self.__stream(reply)
+
+        headers = dict(reply.headers)
+        if method == 'GET' and reply.status == 200:
+            etag = _etag(reply.body)
+            headers['ETag'] = etag
+            if self.headers.get('If-None-Match') == etag:
+                self.server.stub.count_status(304)
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+        self.server.stub.count_status(reply.status)
+        self.send_response(reply.status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(reply.body)))
+        self.end_headers()
+        self.wfile.write(reply.body)
+
+    def __stream(self, reply: '_Stream') -> None:
+        self.send_response(reply.status)
+        for name, value in reply.headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(reply.length))
+        self.end_headers()
+        for chunk in reply.chunks:
+            self.wfile.write(chunk)
+
+
+class _Stream(_Reply):
+    def __init__(self, status: int, length: int, chunks: Iterator[bytes], headers: Dict[str, str]) -> None:
+        super().__init__(status, body=b'', headers=headers)
+        self.length = length
+        self.chunks = chunks
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+# Prefixes under which datasets are served
+_COLLECTIONS = re.compile(r'^(/datasets|/users/me/datasets|/organizations/my-organizations/[^/]+/datasets)(/.*)?$')
+
+
+class ApiServer:
+    """
+    HTTP server answering like the Avaandmed API from a synthetic Catalog, running
+    in background thread. Use with `Avaandmed(key, key_id, server.hostname, scheme='http')`.
+
+    Lists are paged with `limit` and `offset` (or `page`), rows of files too.
+    GET responses carry ETag and If-None-Match is answered with 304. Downloads honour
+    single byte Range requests. faults inject latency, errors and throttling.
+    Port 0 picks a free port.
+    """
+
+    def __init__(self, catalog: Optional[Catalog] = None, faults: Optional[Faults] = None,
+                 host: str = '127.0.0.1', port: int = 0, token: str = TOKEN,
+                 max_limit: int = 1000) -> None:
+        self.catalog = catalog if catalog is not None else Catalog()
+        self.faults = faults if faults is not None else Faults()
+        self.token = token
+        self.max_limit = max_limit
+        self.connections = 0
+        self.requests = 0
+        self.statuses = {}  # type: Dict[int, int]
+        self.__lock = Lock()
+        self.__server = _ThreadingHTTPServer((host, port), _ApiHandler)
+        self.__server.stub = self
+        self.__thread = Thread(target=self.__server.serve_forever, daemon=True)
+        self.__routes = self.__build_routes()
+
+    @property
+    def hostname(self) -> str:
+        host, port = self.__server.server_address[:2]
+        return f"{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.hostname}/api"
+
+    def start(self) -> 'ApiServer':
+        self.__thread.start()
+        return self
+
+    def close(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+
+    def __enter__(self) -> 'ApiServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def count_connection(self) -> None:
+        with self.__lock:
+            self.connections += 1
+
+    def count_status(self, status: int) -> None:
+        with self.__lock:
+            self.requests += 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def route(self, method: str, path: str, query: Dict[str, str], headers, body: bytes) -> _Reply:
+        for route_method, pattern, handler in self.__routes:
+            match = pattern.match(path)
+            if match is not None and route_method == method:
+                return handler(query=query, **match.groupdict())
+        match = _COLLECTIONS.match(path)
+        if match is not None:
+            return self.__collection(method, match.group(2) or '', query, headers, body)
+        return _not_found()
+
+    def __build_routes(self) -> List[Tuple[str, Pattern, Callable[..., _Reply]]]:
+        catalog = self.catalog
+        reference = {
+            'categories': [{'id': i, 'name': name} for i, name in enumerate(_CATEGORIES)],
+            'euro-categories': [{'id': i, 'name': name} for i, name in enumerate(_CATEGORIES)],
+            'ems-categories': [{'id': i, 'name': name} for i, name in enumerate(_CATEGORIES)],
+            'regions': [{'id': i, 'name': f"Region {i}", 'coordinates': None} for i in range(15)],
+            'coordinateReferenceSystems': [{'id': 1, 'uri': 'EPSG:3301'}, {'id': 2, 'uri': 'EPSG:4326'}],
+            'languages': [{'code': 'et', 'name': 'Eesti'}, {'code': 'en', 'name': 'English'}],
+            'licences': [{'id': 'cc-by-4', 'name': 'CC BY 4.0', 'description': 'Creative Commons'}]
+        }
+
+        def reference_list(name, **_):
+            return _Reply(data=reference[name])
+
+        def keywords(query, **_):
+            search = query.get('search', '')
+            found = [{'id': i, 'name': name, 'emsId': str(i)}
+                     for i, name in enumerate(_CATEGORIES) if search in name]
+            return _Reply(data=found[:int(query.get('limit', 20))])
+
+        def organizations(**_):
+            return _Reply(data=[catalog.organization(i) for i in range(catalog.organizations)])
+
+        def organization(id, **_):
+            for i in range(catalog.organizations):
+                if catalog.organization_id(i) == id:
+                    return _Reply(data=catalog.organization(i))
+            return _not_found()
+
+        routes = [
+            ('GET', r'/(?P<name>categories|euro-categories|ems-categories|regions|'
+                    r'coordinateReferenceSystems|languages|licences)', reference_list),
+            ('GET', r'/keywords', keywords),
+            ('GET', r'/organizations/my-organizations', organizations),
+            ('GET', r'/organizations/my-organizations/(?P<id>[^/]+)', organization),
+            ('GET', r'/datasets/total', lambda **_: _Reply(data=catalog.datasets)),
+            ('GET', r'/datasets/mimetypes/distinct', lambda **_: _Reply(data=['text/csv'])),
+            ('GET', r'/datasets/search', lambda query, **_: _paged(
+                catalog.summary, catalog.datasets, query, self.max_limit)),
+            ('GET', r'/datasets/rating/(?P<slug>[^/]+)', lambda slug, **_: _Reply(data='4.5')),
+            ('POST', r'/datasets/(?:rating|privacy-violations|access-permissions)', lambda **_: _ok(201)),
+        ]
+        return [(method, re.compile(f"^{pattern}$"), handler) for method, pattern, handler in routes]
+
+    def __collection(self, method: str, rest: str, query: Dict[str, str], headers, body: bytes) -> _Reply:
+        """
+        Answers endpoints shared by /datasets, /users/me/datasets and organization's datasets.
+        """
+        catalog = self.catalog
+        segments = [s for s in rest.split('/') if s]
+        if not segments:
+            if method == 'GET':
+                return _paged(catalog.summary, catalog.datasets, query, self.max_limit)
+            if method == 'POST':
+                return _Reply(201, dict(catalog.dataset(0), status='pending'))
+            return _not_found()
+
+        if segments[:2] == ['latest', 'pending'] and method == 'GET':
+            return _Reply(data=catalog.dataset(0))
+        if segments[0] == 'shared-with-me' and method == 'GET':
+            return _paged(catalog.summary, min(catalog.datasets, 10), query, self.max_limit)
+        if segments[0] in ('privacy-violations', 'access-permissions'):
+            return self.__inquiries(method, segments)
+        if segments[0] == 'slug' and len(segments) == 2 and method == 'GET':
+            index = catalog.find(segments[1])
+            return _Reply(body=_dataset_json(catalog, index)) if index is not None else _not_found()
+
+        index = catalog.find(segments[0])
+        if index is None:
+            return _not_found('Dataset not found')
+        if len(segments) == 1:
+            if method == 'GET':
+                return _Reply(body=_dataset_json(catalog, index))
+            return _ok()
+        if segments[1] in ('discard', 'publish'):
+            return _ok()
+        if segments[1] == 'ratings':
+            return _Reply(data=[{'id': 1, 'qualityRating': 5, 'metadataRating': 4, 'description': None}])
+        if segments[1] == 'upload' and method == 'POST':
+            return _Reply(201, [dict(catalog.file(index, 0), name=_uploaded_name(headers, body),
+                                     processingStatus='pending')])
+        if segments[1] in ('download', 'download-from-url'):
+            return self.__download(index, headers)
+        if segments[1] == 'files':
+            return self.__files(method, index, segments[2:], query, headers)
+        return _not_found()
+
+    def __files(self, method: str, index: int, segments: List[str], query: Dict[str, str], headers) -> _Reply:
+        catalog = self.catalog
+        if not segments:
+            return _Reply(data=[catalog.file(index, f) for f in range(catalog.files_per_dataset)])
+        file = catalog.find_file(index, segments[0])
+        if file is None:
+            return _not_found('File not found')
+
+        action = segments[1] if len(segments) > 1 else None
+        if action is None and method == 'GET':
+            return _paged(catalog.row, catalog.rows_per_file, query, self.max_limit)
+        if action == 'preview':
+            return _paged(catalog.row, catalog.rows_per_file, dict(query, limit=query.get('limit', '5')),
+                          self.max_limit)
+        if action == 'columns':
+            return _Reply(data=catalog.columns()) if method == 'GET' else _ok()
+        if action == 'indices':
+            if method == 'GET':
+                return _Reply(data={'polynomial': [{'id': 1, 'column': 'value'}],
+                                    'identifier': [{'id': 2, 'column': 'id', 'identifier': 'id'}]})
+            return _ok(201)
+        if action == 'errors':
+            return _Reply(data=[])
+        if action == 'download':
+            return self.__download(index, headers, file)
+        return _ok() if method != 'GET' else _not_found()
+
+    def __download(self, index: int, headers, file: int = 0) -> _Reply:
+        catalog = self.catalog
+        size = catalog.file_size
+        response_headers = {
+            'Content-Type': 'text/csv',
+            'Accept-Ranges': 'bytes',
+            'ETag': f'"{catalog.file_id(index, file)}-{size}"'
+        }
+        requested = headers.get('Range')
+        if requested is None:
+            return _Stream(200, size, catalog.csv_range(0, size - 1), response_headers)
+
+        byte_range = _parse_range(requested, size)
+        if byte_range is None:
+            return _Reply(416, body=b'', headers=dict(response_headers, **{'Content-Range': f"bytes */{size}"}))
+        start, end = byte_range
+        response_headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        return _Stream(206, end - start + 1, catalog.csv_range(start, end), response_headers)
+
+    def __inquiries(self, method: str, segments: List[str]) -> _Reply:
+        if method != 'GET' or len(segments) > 2:
+            return _ok()
+        inquiries = [_inquiry(self.catalog, i) for i in range(3)]
+        if len(segments) == 1:
+            return _Reply(data=inquiries)
+        for inquiry in inquiries:
+            if inquiry['id'] == segments[1]:
+                return _Reply(data=inquiry)
+        return _not_found()
+
+
+def _inquiry(catalog: Catalog, index: int) -> dict:
+    dataset = catalog.summary(index)
+    return {
+        'id': f"{index:08x}-0000-4000-8000-000000000003",
+        'userId': catalog.organization_id(0),
+        'description': f"Inquiry {index}",
+        'datasetId': dataset['id'],
+        'status': 'pending',
+        'createdAt': dataset['createdAt'],
+        'dataset': {k: dataset[k] for k in ('id', 'nameEt', 'nameEn', 'slug', 'name')}
+    }
+
+
+def _uploaded_name(headers, body: bytes) -> str:
+    """
+    Returns file name of multipart upload. Only headers of parts are searched,
+    so that uploading large files is not slowed down by parsing their content.
+    """
+    boundary = re.search(r'boundary="?([^";]+)"?', headers.get('Content-Type', ''))
+    if boundary is not None:
+        delimiter = b'--' + boundary.group(1).encode('latin-1')
+        start = body.find(delimiter)
+        while start >= 0:
+            end = body.find(b'\r\n\r\n', start)
+            name = re.search(rb'filename="([^"]*)"', body[start:end])
+            if name is not None:
+                return name.group(1).decode('utf-8')
+            start = body.find(delimiter, end) if end >= 0 else -1
+    return 'upload.csv'
+
+
+def _parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parses single range of Range header into inclusive start and end.
+    """
+    match = re.match(r'^bytes=(\d*)-(\d*)$', value.strip())
+    if match is None or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        length = int(match.group(2))
+        return (max(0, size - length), size - 1) if length else None
+    start = int(match.group(1))
+    end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    return (start, end) if start <= end and start < size else None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--datasets', type=int, default=100000)
+    parser.add_argument('--files', type=int, default=2, help='files per dataset')
+    parser.add_argument('--rows', type=int, default=1000000, help='rows per file')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many random seconds more')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of 503 responses')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='share of 429 responses')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    server = ApiServer(
+        Catalog(args.datasets, args.files, args.rows),
+        Faults(args.latency, args.jitter, args.error_rate, args.throttle_rate, seed=args.seed),
+        host=args.host, port=args.port)
+    print(f"Serving Avaandmed API at {server.url}")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.close()
@@ -0,0 +1,40 @@
+"""
+Measures how many TCP handshakes client makes per 1000 API calls.
+
+    python -m benchmarks.connection_pool
+"""
+import json
+import time
+
+from avaandmed import Avaandmed
+from avaandmed.testing import ApiServer, Catalog
+
+CALLS = 1000
+
+
+def run(idle_timeout) -> dict:
+    with ApiServer(Catalog(datasets=1)) as server:
+        with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                       idle_timeout=idle_timeout) as client:
+            start = time.perf_counter()
+            for _ in range(CALLS):
+                client.datasets.get_total()
+            elapsed = time.perf_counter() - start
+
+        return {
+            'handshakes_per_1000_calls': server.connections * 1000 / CALLS,
+            'calls_per_second': CALLS / elapsed
+        }
+
+
+def main() -> None:
+    results = {
+        # idle timeout of zero drops connection before every call, i.e. no pooling
+        'unpooled': run(idle_timeout=0),
+        'pooled': run(idle_timeout=60.0)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
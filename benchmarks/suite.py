@@ -0,0 +1,357 @@
+"""
+Measures throughput of client hot paths against local ApiServer.
+
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --baseline results.json --threshold 0.2
+    python -m benchmarks.suite parse_1k parse_10k
+
+Results are rates where higher is better, except memory use in bytes where
+lower is better. Each benchmark is run `--repeat` times and the best run is
+reported, which filters out noise from other processes.
+With --baseline the run fails if any result got worse by more than threshold.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Set
+
+from avaandmed import Avaandmed
+from avaandmed.api_resources.datasets.dataset import Dataset
+from avaandmed.parsing import ParseMode, parse
+from avaandmed.http.transport import FakeResponse, FakeTransport
+from avaandmed.parsing import compiled
+from avaandmed.parsing.compact import compact
+from avaandmed.testing import ApiServer, Catalog, Faults
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests', 'data')
+RESULTS_VERSION = 1
+MB = 1024 * 1024
+# Fast benchmarks are repeated until they run at least this long
+MIN_TIME = 0.2
+
+BENCHMARKS = {}  # type: Dict[str, Callable[[], float]]
+UNITS = {}  # type: Dict[str, str]
+LOWER_IS_BETTER = set()  # type: Set[str]
+
+
+def benchmark(name: str, unit: str, lower_is_better: bool = False):
+    def register(fn: Callable[[], float]) -> Callable[[], float]:
+        BENCHMARKS[name] = fn
+        UNITS[name] = unit
+        if lower_is_better:
+            LOWER_IS_BETTER.add(name)
+        return fn
+    return register
+
+
+def load_dataset() -> dict:
+    with open(os.path.join(DATA_DIR, 'dataset.json'), encoding='utf-8') as f:
+        return json.load(f)['data']
+
+
+def rate(fn: Callable[[], None], units_per_call: float = 1) -> float:
+    """
+    Calls fn until MIN_TIME passes, returns units processed per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIME:
+            return calls * units_per_call / elapsed
+
+
+def client(server: ApiServer) -> Avaandmed:
+    return Avaandmed('key', 'key_id', server.hostname, scheme='http')
+
+
+@benchmark('get_by_id', 'requests/s')
+def get_by_id() -> float:
+    with ApiServer(Catalog(datasets=1)) as server, client(server) as c:
+        dataset_id = server.catalog.dataset_id(0)
+        c.datasets.get_by_id(dataset_id)
+        return rate(lambda: c.datasets.get_by_id(dataset_id))
+
+
+def parse_datasets(count: int, mode: ParseMode = ParseMode.VALIDATE) -> float:
+    data = [load_dataset()] * count
+    return rate(lambda: parse(List[Dataset], data, mode), count)
+
+
+@benchmark('parse_10', 'datasets/s')
+def parse_10() -> float:
+    return parse_datasets(10)
+
+
+@benchmark('parse_1k', 'datasets/s')
+def parse_1k() -> float:
+    return parse_datasets(1000)
+
+
+@benchmark('parse_10k', 'datasets/s')
+def parse_10k() -> float:
+    return parse_datasets(10000)
+
+
+@benchmark('trusted_1k', 'datasets/s')
+def trusted_1k() -> float:
+    return parse_datasets(1000, ParseMode.TRUSTED)
+
+
+@benchmark('trusted_10k', 'datasets/s')
+def trusted_10k() -> float:
+    return parse_datasets(10000, ParseMode.TRUSTED)
+
+
+def parse_compiled(count: int) -> float:
+    """
+    Parses datasets with decoders cached in a temporary directory instead of AVAANDMED_CACHE_DIR.
+    """
+    previous = compiled.compiler
+    with tempfile.TemporaryDirectory() as directory:
+        compiled.compiler = compiled.DecoderCompiler(directory)
+        try:
+            return parse_datasets(count, ParseMode.COMPILED)
+        finally:
+            compiled.compiler = previous
+
+
+@benchmark('compiled_1k', 'datasets/s')
+def compiled_1k() -> float:
+    return parse_compiled(1000)
+
+
+@benchmark('compiled_10k', 'datasets/s')
+def compiled_10k() -> float:
+    return parse_compiled(10000)
+
+
+@benchmark('lazy_1k', 'datasets/s')
+def lazy_1k() -> float:
+    """
+    Parses datasets lazily and reads the fields most consumers use.
+    """
+    data = [load_dataset()] * 1000
+
+    def read() -> None:
+        for dataset in parse(List[Dataset], data, ParseMode.LAZY):
+            dataset.id, dataset.slug, dataset.name, dataset.updated_at
+    return rate(read, len(data))
+
+
+def catalog(count: int) -> List[dict]:
+    """
+    Returns datasets decoded separately like pages of API responses, with unique ids.
+    """
+    with open(os.path.join(DATA_DIR, 'dataset.json'), encoding='utf-8') as f:
+        document = f.read()
+    datasets = []
+    for i in range(count):
+        dataset = json.loads(document)['data']
+        dataset['id'] = f"{i:08x}-0000-4000-8000-000000000000"
+        dataset['slug'] = f"dataset-{i}"
+        datasets.append(dataset)
+    return datasets
+
+
+def memory_per_dataset(keep: Callable[[List[Dataset]], object], count: int = 5000) -> float:
+    """
+    Returns bytes per dataset retained by what keep() returns for parsed datasets.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = keep(parse(List[Dataset], catalog(count), ParseMode.TRUSTED))
+        gc.collect()
+        used = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del kept
+    return used / count
+
+
+@benchmark('memory_model', 'bytes/dataset', lower_is_better=True)
+def memory_model() -> float:
+    return memory_per_dataset(lambda datasets: datasets)
+
+
+@benchmark('memory_compact', 'bytes/dataset', lower_is_better=True)
+def memory_compact() -> float:
+    return memory_per_dataset(compact)
+
+
+def peak_per_dataset(stream: bool, count: int = 2000) -> float:
+    """
+    Returns peak bytes per dataset allocated while iterating over dataset list response.
+    """
+    body = json.dumps({'data': catalog(count)}).encode('utf-8')
+    transport = FakeTransport()
+    transport.route('GET', '/datasets', lambda request: FakeResponse(body=body))
+    with Avaandmed('key', 'key_id', transport=transport, parse_mode=ParseMode.TRUSTED) as c:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            for dataset in c.datasets.get_dataset_list(limit=count, stream=stream):
+                dataset.id
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return peak / count
+
+
+@benchmark('peak_list', 'bytes/dataset', lower_is_better=True)
+def peak_list() -> float:
+    return peak_per_dataset(stream=False)
+
+
+@benchmark('peak_stream', 'bytes/dataset', lower_is_better=True)
+def peak_stream() -> float:
+    return peak_per_dataset(stream=True)
+
+
+def walk_catalog(walk: Callable[[Avaandmed], object], count: int = 5000) -> float:
+    """
+    Returns datasets per second walked by walk() over catalog with 20 ms round trips.
+    """
+    with ApiServer(Catalog(datasets=count), Faults(latency=0.02)) as server, \
+            Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                      parse_mode=ParseMode.TRUSTED) as c:
+        c.datasets.get_total()
+        started = time.perf_counter()
+        walk(c)
+        return count / (time.perf_counter() - started)
+
+
+@benchmark('iter_catalog', 'datasets/s')
+def iter_catalog() -> float:
+    return walk_catalog(lambda c: list(c.datasets.iter_datasets(page_size=100)))
+
+
+@benchmark('scan_catalog', 'datasets/s')
+def scan_catalog() -> float:
+    return walk_catalog(lambda c: list(c.datasets.scan(page_size=100, max_workers=8)))
+
+
+@benchmark('download', 'MB/s')
+def download() -> float:
+    # Fits into chunks ApiServer keeps in memory
+    rows = 12 * MB // Catalog(datasets=1, rows_per_file=1).row_size
+    with tempfile.TemporaryDirectory() as directory, \
+            ApiServer(Catalog(datasets=1, rows_per_file=rows)) as server, client(server) as c:
+        catalog = server.catalog
+        destination = os.path.join(directory, 'download.csv')
+        # First download has the server generate the file, the timed one measures the client
+        c.datasets.download_file(catalog.dataset_id(0), catalog.file_id(0, 0), destination)
+        start = time.perf_counter()
+        c.datasets.download_file(catalog.dataset_id(0), catalog.file_id(0, 0), destination)
+        elapsed = time.perf_counter() - start
+        assert os.path.getsize(destination) == catalog.file_size
+        return catalog.file_size / MB / elapsed
+
+
+@benchmark('upload', 'MB/s')
+def upload() -> float:
+    size = 32 * MB
+    with tempfile.TemporaryDirectory() as directory, \
+            ApiServer(Catalog(datasets=1)) as server, client(server) as c:
+        path = os.path.join(directory, 'upload.csv')
+        with open(path, 'wb') as f:
+            f.write(b'x' * size)
+        c.datasets.get_total()
+        start = time.perf_counter()
+        c.users.me.dataset.upload_file(server.catalog.dataset_id(0), 'upload.csv', 'text/csv', path)
+        elapsed = time.perf_counter() - start
+        return size / MB / elapsed
+
+
+@benchmark('reference', 'requests/s')
+def reference() -> float:
+    with ApiServer(Catalog(datasets=1)) as server, client(server) as c:
+        getters = [c.get_categories, c.get_euro_categories, c.get_ems_categories, c.get_regions,
+                   c.get_coordinate_ref_system, c.get_languages, c.get_licenses]
+
+        def fetch_all() -> None:
+            for get in getters:
+                get()
+        fetch_all()
+        return rate(fetch_all, len(getters))
+
+
+def run(names: List[str], repeat: int = 3) -> dict:
+    results = {}
+    for name in names:
+        best = min if name in LOWER_IS_BETTER else max
+        value = best(BENCHMARKS[name]() for _ in range(repeat))
+        results[name] = {'value': round(value, 3), 'unit': UNITS[name]}
+        print(f"{name:<12} {value:>14,.1f} {UNITS[name]}", file=sys.stderr)
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Returns descriptions of results worse than baseline by more than threshold,
+    e.g. 0.2 allows rates to be up to 20% lower.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            continue
+        if name in LOWER_IS_BETTER:
+            change = base['value'] / result['value'] - 1 if result['value'] else 0
+        else:
+            change = result['value'] / base['value'] - 1
+        if change < -threshold:
+            regressions.append(
+                f"{name}: {result['value']:,.1f} {result['unit']} is {-change:.0%} "
+                f"worse than baseline {base['value']:,.1f}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('benchmarks', nargs='*', help=f"benchmarks to run: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', help='file to write results to, stdout by default')
+    parser.add_argument('--baseline', help='results of earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed drop compared to baseline, 0.2 by default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every benchmark, 3 by default')
+    args = parser.parse_args(argv)
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.repeat)
+    document = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(document + '\n')
+    else:
+        print(document)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,8 +15,13 @@ setup(
     author_email='mihhail.matisinets@gmail.com',
     install_requires=[
         'requests>=2.25',
-        'pydantic>=1.8'
+        'pydantic>=1.8',
+        'contextvars>=2.4; python_version < "3.7"'
     ],
+    extras_require={
+        'async': ['httpx>=0.18'],
+        'fast': ['orjson>=3']
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
@@ -28,6 +33,6 @@ setup(
         'Programming Language :: Python :: 3.8',
         'Programming Language :: Python :: 3.9',
     ],
-    packages=find_packages(exclude=['tests']),
+    packages=find_packages(exclude=['tests', 'benchmarks']),
     python_requires='>=3.6, <4',
 )
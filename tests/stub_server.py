@@ -0,0 +1,163 @@
+import json
+import re
+import sys
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from threading import Lock, Thread
+
+TOKEN = {'data': {'accessToken': 'benchmark-token'}}
+UPLOADED_FILE = {
+    'id': '5372cf83-8c59-4d4f-bf16-98581a09c733',
+    'name': 'upload.csv',
+    'mimetype': 'text/csv',
+    'size': 10,
+    'datasetId': 'benchmark',
+    'metadata': {},
+    'processingStatus': 'pending',
+    'storageFilename': 'upload.csv'
+}
+REFERENCE = {
+    '/api/categories': [{'id': i, 'name': f"Category {i}", 'description': None, 'emsIds': [i]}
+                        for i in range(20)],
+    '/api/euro-categories': [{'id': i, 'name': f"Category {i}"} for i in range(13)],
+    '/api/ems-categories': [{'id': i, 'name': f"EMS {i}"} for i in range(200)],
+    '/api/regions': [{'id': i, 'name': f"Region {i}", 'coordinates': None} for i in range(80)],
+    '/api/coordinateReferenceSystems': [{'id': i, 'uri': f"EPSG:{3300 + i}"} for i in range(10)],
+    '/api/languages': [{'code': f"l{i}", 'name': f"Language {i}"} for i in range(40)],
+    '/api/licences': [{'id': str(i), 'name': f"Licence {i}", 'description': 'Licence'}
+                      for i in range(10)]
+}
+CHUNK_SIZE = 64 * 1024
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answers the small subset of Avaandmed API used by tests and benchmarks.
+    """
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        self._drain()
+        if self.path == '/api/auth/key-login':
+            self._check('X-API-KEY' in self.headers)
+            self._reply(201, TOKEN)
+        elif self.path.endswith('/upload'):
+            self._check_auth()
+            self._check(self.headers.get('Content-Type', '').startswith('multipart/form-data'))
+            self._reply(201, {'data': [UPLOADED_FILE]})
+        elif self.path.endswith('/download'):
+            self._check_auth()
+            self._stream(self.server.download_size)
+        else:
+            self._reply(404, {'message': 'Not Found'})
+
+    def do_GET(self) -> None:
+        time.sleep(self.server.delay)
+        self._check_auth()
+        self._check(self.headers.get('Content-Type') == 'application/json')
+        if self.path == '/api/datasets/total':
+            self._reply(200, {'data': 1})
+        elif self.path in REFERENCE:
+            self._reply(200, {'data': REFERENCE[self.path]})
+        elif re.match(r'^/api/datasets/[\w-]+$', self.path):
+            self._reply(200, {'data': self.server.dataset})
+        else:
+            self._reply(404, {'message': 'Not Found'})
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def _check_auth(self) -> None:
+        self._check(self.headers.get('Authorization') == 'Bearer benchmark-token')
+        self._check('X-API-KEY' not in self.headers)
+
+    def _check(self, condition: bool) -> None:
+        if not condition:
+            with self.server.lock:
+                self.server.malformed += 1
+
+    def _drain(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        while length > 0:
+            length -= len(self.rfile.read(min(length, CHUNK_SIZE)))
+
+    def _stream(self, size: int) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        chunk = b'x' * CHUNK_SIZE
+        while size > 0:
+            self.wfile.write(chunk[:size])
+            size -= CHUNK_SIZE
+            if self.server.stall:
+                self.wfile.flush()
+                time.sleep(self.server.stall)
+
+    def _reply(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    # http.server.ThreadingHTTPServer is only available since Python 3.7
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        # Clients hang up on purpose when they time out, which is not an error of the server
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """
+    Local HTTP server running in background thread.
+    Counts accepted TCP connections, i.e. handshakes client had to make,
+    and requests that came with wrong headers.
+    GET responses are sent after `delay` seconds, downloads are `download_size` bytes long
+    and pause for `stall` seconds after every chunk.
+    """
+
+    def __init__(self, dataset: dict = None, delay: float = 0.0, download_size: int = 0,
+                 stall: float = 0.0) -> None:
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        self._server.lock = Lock()
+        self._server.connections = 0
+        self._server.malformed = 0
+        self._server.delay = delay
+        self._server.download_size = download_size
+        self._server.stall = stall
+        self._server.dataset = dataset or {'id': 'benchmark', 'name': 'benchmark'}
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def hostname(self) -> str:
+        host, port = self._server.server_address
+        return f"{host}:{port}"
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    @property
+    def malformed(self) -> int:
+        return self._server.malformed
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._server.shutdown()
+        self._server.server_close()
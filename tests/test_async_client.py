@@ -0,0 +1,333 @@
+import asyncio
+import pytest
+import sys
+from pathlib import Path
+
+from avaandmed import AsyncAvaandmed
+from avaandmed.api_resources.datasets.dataset import Dataset
+from avaandmed.api_resources.entities import Category, File, PrivacyViolation
+from avaandmed.api_resources.organizations.organization import Organization
+from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedTimeoutException
+from avaandmed.http.async_http_client import AsyncHttpClient
+from avaandmed.http.cache import HttpCache
+from avaandmed.http.http_client import HttpMethod
+from avaandmed.http.retry import RetryPolicy
+from avaandmed.http.timeouts import deadline
+from tests.data_mock import DataJsonMock
+from tests.utils import run_async as run
+
+httpx = pytest.importorskip('httpx')
+
+BASE_HOSTNAME = 'avaandmedtest.eesti.ee'
+DATASET_ID = '8d681e55-4118-41f5-b319-1d2bdd36408c'
+FILE_ID = 'b88c9edc-cf81-47a5-aaf0-40d2af2c73a1'
+ORG_ID = 'cf923536-2dbb-4e2e-8167-218e52316283'
+
+
+class MockApi:
+    """
+    Routes httpx requests to canned responses without opening sockets.
+    """
+
+    def __init__(self, token_file: dict) -> None:
+        self.routes = {}
+        self.calls = []
+        self.token_file = token_file
+
+    def stub_for(self, method: str, path: str, status: int = 200, json=None, content: bytes = b''):
+        self.routes.setdefault((method, f"/api{path}"), []).append((status, json, content))
+
+    def logins(self) -> int:
+        return len([c for c in self.calls if c.url.path == '/api/auth/key-login'])
+
+    def handler(self, request):
+        self.calls.append(request)
+        if request.url.path == '/api/auth/key-login':
+            return httpx.Response(201, json=self.token_file)
+
+        responses = self.routes.get((request.method, request.url.path))
+        if not responses:
+            return httpx.Response(404, json={'message': 'Not Found'})
+        status, body, content = responses[0] if len(responses) == 1 else responses.pop(0)
+        if body is not None:
+            return httpx.Response(status, json=body)
+        return httpx.Response(status, content=content)
+
+
+class TestAsyncAvaandmed:
+
+    @pytest.fixture(autouse=True)
+    def _api(self, data_mock: DataJsonMock):
+        self.data_mock = data_mock
+        self.api = MockApi(data_mock.MOCK_TOKEN_FILE)
+
+    def client(self) -> AsyncAvaandmed:
+        transport = httpx.MockTransport(self.api.handler)
+        return AsyncAvaandmed('key', 'key_id', BASE_HOSTNAME, transport=transport)
+
+    def test_get_by_id(self):
+        self.api.stub_for('GET', f"/datasets/{DATASET_ID}", json=self.data_mock.MOCK_DATASET_FILE)
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.get_by_id(DATASET_ID)
+
+        dataset = run(scenario())
+        assert isinstance(dataset, Dataset)
+        assert dataset.id == DATASET_ID
+
+    def test_get_dataset_list(self):
+        self.api.stub_for('GET', '/datasets', json=self.data_mock.MOCK_DATASET_LIST_FILE)
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.get_dataset_list(limit=5)
+
+        datasets = run(scenario())
+        assert len(datasets) == 5
+        assert self.api.calls[-1].url.params['limit'] == '5'
+
+    def test_stream_dataset_list(self):
+        self.api.stub_for('GET', '/datasets', json=self.data_mock.MOCK_DATASET_LIST_FILE)
+        self.api.stub_for('GET', '/users/me/datasets/privacy-violations', status=403,
+                          json={'message': 'Forbidden'})
+
+        async def scenario():
+            async with self.client() as client:
+                streamed = [d async for d in client.datasets.get_dataset_list(stream=True)]
+                with pytest.raises(AvaandmedApiExcepiton):
+                    async for _ in client.users.me.dataset.get_all_privacy_violations(stream=True):
+                        pass
+                return streamed, await client.datasets.get_dataset_list()
+
+        streamed, datasets = run(scenario())
+        assert streamed == datasets
+
+    def test_concurrent_calls_share_login(self):
+        self.api.stub_for('GET', '/datasets/total', json={'data': 42})
+
+        async def scenario():
+            async with self.client() as client:
+                totals = await asyncio.gather(
+                    *[client.datasets.get_total() for _ in range(500)])
+                return totals, client.token_stats
+
+        totals, stats = run(scenario())
+        assert totals == [42] * 500
+        assert self.api.logins() == 1
+        assert stats.logins_avoided == 499
+
+    def test_reauthenticate_on_unauthorized(self):
+        self.api.stub_for('GET', '/datasets/total', status=401, json={'message': 'Unauthorized'})
+        self.api.stub_for('GET', '/datasets/total', json={'data': 1})
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.get_total()
+
+        assert run(scenario()) == 1
+        assert self.api.logins() == 2
+
+    def test_negative_get_by_id(self):
+        self.api.stub_for('GET', '/datasets/wrong', status=404, json=self.data_mock.MOCK_ERROR_FILE)
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.get_by_id('wrong')
+
+        with pytest.raises(AvaandmedApiExcepiton):
+            run(scenario())
+
+    def test_get_categories(self):
+        self.api.stub_for('GET', '/categories', json={'data': [{'id': 1, 'name': 'Energeetika'}]})
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.get_categories()
+
+        categories = run(scenario())
+        assert isinstance(categories[0], Category)
+
+    def test_rate_dataset(self):
+        self.api.stub_for('POST', '/datasets/rating', status=201)
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.rate_dataset(DATASET_ID, 1, 1)
+
+        assert run(scenario()) == 'Submitted'
+
+    def test_download_file(self, tmp_path: Path):
+        content = b'row\n' * 100000
+        self.api.stub_for('POST', f"/datasets/{DATASET_ID}/files/{FILE_ID}/download",
+                          status=201, content=content)
+        outfile = tmp_path / 'outfile.txt'
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.datasets.download_file(DATASET_ID, FILE_ID, str(outfile))
+
+        assert run(scenario()) == 0
+        assert outfile.read_bytes() == content
+
+    def test_upload_file(self):
+        uploaded = {
+            'name': 'highestGrossers.csv',
+            'mimetype': 'text/csv',
+            'size': 2707,
+            'datasetId': DATASET_ID,
+            'metadata': {},
+            'processingStatus': 'pending',
+            'id': '5372cf83-8c59-4d4f-bf16-98581a09c733',
+            'storageFilename': 'highestGrossers.csv'
+        }
+        self.api.stub_for('POST', f"/users/me/datasets/{DATASET_ID}/upload",
+                          status=201, json={'data': [uploaded]})
+
+        async def scenario():
+            async with self.client() as client:
+                return await client.users.me.dataset.upload_file(
+                    DATASET_ID, 'highestGrossers.csv', 'text/csv', self.data_mock.MOCK_FILE_PATH)
+
+        result = run(scenario())
+        request = self.api.calls[-1]
+        assert isinstance(result, File)
+        assert request.headers['Content-Type'].startswith('multipart/form-data')
+        assert b'highestGrossers.csv' in request.read()
+
+    def test_organization_datasets(self):
+        self.api.stub_for('GET', '/organizations/my-organizations',
+                          json={'data': [{'id': ORG_ID, 'name': 'org'}]})
+        self.api.stub_for('GET', f"/organizations/my-organizations/{ORG_ID}/datasets/privacy-violations",
+                          json=self.data_mock.MOCK_PRIVACY_VIOLATIONS)
+
+        async def scenario():
+            async with self.client() as client:
+                my_org = client.organizations(ORG_ID).my_orgranization
+                return await asyncio.gather(
+                    my_org.get_list_my_orgs(),
+                    my_org.dataset.get_all_privacy_violations())
+
+        orgs, violations = run(scenario())
+        assert isinstance(orgs[0], Organization)
+        assert isinstance(violations[0], PrivacyViolation)
+
+    def test_retry_transient_status(self):
+        self.api.stub_for('GET', '/datasets/total', status=503, json={'message': 'Unavailable'})
+        self.api.stub_for('GET', '/datasets/total', json={'data': 5})
+        transport = httpx.MockTransport(self.api.handler)
+
+        async def scenario():
+            retry = RetryPolicy(backoff_factor=0)
+            async with AsyncAvaandmed('key', 'key_id', BASE_HOSTNAME,
+                                      retry=retry, transport=transport) as client:
+                return await client.datasets.get_total(), client.retry_stats
+
+        total, stats = run(scenario())
+        assert total == 5
+        assert stats.by_reason == {'503': 1}
+
+    def test_cache_revalidates_with_etag(self):
+        def handler(request):
+            self.api.calls.append(request)
+            if request.url.path == '/api/auth/key-login':
+                return httpx.Response(201, json=self.data_mock.MOCK_TOKEN_FILE)
+            if request.headers.get('If-None-Match') == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, json={'data': 7}, headers={'ETag': '"v1"'})
+
+        async def scenario():
+            async with AsyncAvaandmed('key', 'key_id', BASE_HOSTNAME, cache=HttpCache(),
+                                      transport=httpx.MockTransport(handler)) as client:
+                totals = [await client.datasets.get_total() for _ in range(3)]
+                return totals, client.cache_stats
+
+        totals, stats = run(scenario())
+        assert totals == [7, 7, 7]
+        assert stats.as_dict() == {'hits': 0, 'misses': 1, 'revalidations': 2}
+
+    def test_coalesce_concurrent_gets(self):
+        async def handler(request):
+            self.api.calls.append(request)
+            if request.url.path == '/api/auth/key-login':
+                return httpx.Response(201, json=self.data_mock.MOCK_TOKEN_FILE)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'data': 7})
+
+        async def scenario():
+            async with AsyncAvaandmed('key', 'key_id', BASE_HOSTNAME, coalesce=True,
+                                      transport=httpx.MockTransport(handler)) as client:
+                totals = await asyncio.gather(*[client.datasets.get_total() for _ in range(10)])
+                return totals, client.coalesce_stats
+
+        totals, stats = run(scenario())
+        assert totals == [7] * 10
+        assert len([c for c in self.api.calls if c.url.path == '/api/datasets/total']) == 1
+        assert stats.as_dict() == {'calls': 1, 'coalesced': 9}
+
+    def test_coalesced_results_are_not_shared(self):
+        async def handler(request):
+            self.api.calls.append(request)
+            if request.url.path == '/api/auth/key-login':
+                return httpx.Response(201, json=self.data_mock.MOCK_TOKEN_FILE)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'data': [1, 2]})
+
+        async def scenario():
+            async with AsyncHttpClient(BASE_HOSTNAME, 'key', 'key_id', coalesce=True,
+                                       transport=httpx.MockTransport(handler)) as client:
+                async def fetch_and_modify():
+                    result = await client.request(HttpMethod.GET, '/datasets')
+                    result.append(3)
+                    return result
+
+                return await asyncio.gather(*[fetch_and_modify() for _ in range(4)])
+
+        assert run(scenario()) == [[1, 2, 3]] * 4
+        assert len([c for c in self.api.calls if c.url.path == '/api/datasets']) == 1
+
+    def test_timeout(self):
+        def handler(request):
+            if request.url.path == '/api/auth/key-login':
+                return httpx.Response(201, json=self.data_mock.MOCK_TOKEN_FILE)
+            assert request.extensions['timeout']['read'] == 0.5
+            raise httpx.ReadTimeout('timed out', request=request)
+
+        async def scenario():
+            async with AsyncAvaandmed('key', 'key_id', BASE_HOSTNAME, timeout=0.5,
+                                      retry=RetryPolicy(max_retries=0),
+                                      transport=httpx.MockTransport(handler)) as client:
+                await client.datasets.get_total()
+
+        with pytest.raises(AvaandmedTimeoutException):
+            run(scenario())
+
+    @pytest.mark.skipif(sys.version_info < (3, 7), reason='asyncio tasks copy context since Python 3.7')
+    def test_deadline_is_inherited_by_tasks(self):
+        async def scenario():
+            async with self.client() as client:
+                with deadline(0):
+                    await asyncio.gather(client.datasets.get_total())
+
+        with pytest.raises(AvaandmedTimeoutException):
+            run(scenario())
+        assert self.api.calls == []
+
+    def test_instrumentation(self):
+        self.api.stub_for('GET', f"/datasets/{DATASET_ID}", json=self.data_mock.MOCK_DATASET_FILE)
+        spans = []
+
+        async def scenario():
+            async with self.client() as client:
+                client.instrumentation.add(spans.append)
+                return await client.datasets.get_by_id(DATASET_ID)
+
+        assert isinstance(run(scenario()), Dataset)
+        assert [(s.name, s.endpoint) for s in spans if s.endpoint != '/auth/key-login'] == [
+            ('ttfb', '/datasets/{id}'),
+            ('read', '/datasets/{id}'),
+            ('request', '/datasets/{id}'),
+            ('decode', '/datasets/{id}'),
+            ('validate', '/datasets/{id}')
+        ]
+        assert 'auth' in [s.name for s in spans]
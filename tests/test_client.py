@@ -1,5 +1,11 @@
+import os
+import subprocess
+import sys
+
 import pytest
 import responses
+
+import avaandmed
 from .request_mock import RequestMock
 from avaandmed import Avaandmed
 from avaandmed.api_resources.entities import (
@@ -217,3 +223,41 @@ class TestAvaandmedClient:
 
         assert licenses is not None
         assert isinstance(licenses[0], Licence)
+
+
+class TestImportTime:
+    """
+    Importing the package must stay cheap, heavy dependencies are loaded on first use.
+    """
+
+    def run(self, code: str) -> subprocess.CompletedProcess:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(avaandmed.__file__)))
+        env = dict(os.environ, PYTHONPATH=root)
+        return subprocess.run([sys.executable, '-c', code], env=env, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              universal_newlines=True)
+
+    def test_import_does_not_load_dependencies(self):
+        code = ("import sys, avaandmed\n"
+                "print(','.join(m for m in ('pydantic', 'requests', 'httpx', 'asyncio') if m in sys.modules))")
+
+        assert self.run(code).stdout.strip() == ''
+
+    def test_sync_client_does_not_load_async_stack(self):
+        code = ("import sys, avaandmed\n"
+                "avaandmed.Avaandmed('key', 'key_id')\n"
+                "avaandmed._reference_type('Category')\n"
+                "print(','.join(m for m in ('httpx', 'asyncio', 'avaandmed.api_resources.entities')"
+                " if m in sys.modules))")
+
+        assert self.run(code).stdout.strip() == ''
+
+    def test_import_loads_only_own_modules(self):
+        # contextvars is the only module needed at import, it backs deadline()
+        code = ("import sys, contextvars\n"
+                "before = set(sys.modules)\n"
+                "import avaandmed\n"
+                "print(','.join(sorted(m for m in set(sys.modules) - before"
+                " if m.split('.')[0] != 'avaandmed')))")
+
+        assert self.run(code).stdout.strip() == ''
@@ -1,8 +1,11 @@
 # type: ignore
 import pytest
 import responses
+from threading import Event, Lock
 from typing import List
 
+from avaandmed import Avaandmed, AsyncAvaandmed
+
 from avaandmed.api_resources.entities import (
     Access,
     Category,
@@ -25,8 +28,12 @@ from avaandmed.api_resources.datasets.dataset import Dataset
 from avaandmed.api_resources.organizations.organization import Organization
 from avaandmed.api_resources.users.user import User
 from avaandmed.api_resources.organizations.my_organization import MyOrganization
-from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedException
+from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedException, AvaandmedTimeoutException
+from avaandmed.http.timeouts import deadline
+from avaandmed.http.transport import FakeTransport
+from avaandmed.testing import ApiServer, Catalog, Faults
 from tests.data_mock import DataJsonMock
+from tests.utils import run_async
 from .request_mock import RequestMock
 
 DATASET_ID = '8d681e55-4118-41f5-b319-1d2bdd36408c'
@@ -406,22 +413,19 @@ class TestDatasets:
                 'c114a8a9-40ed-46c9-824f-dda1d92776de', 11, -1)
 
     @responses.activate
-    def test_download_file(self):
+    def test_download_file(self, tmp_path):
         url = f"/{DATASET_ID}/files/{FILE_ID}/download"
         self.request_mock.stub_for(
             method=responses.POST, url=url, body=b"Some sort of text", status=201)
-        outfile = 'outfile.txt'
+        outfile = tmp_path / 'outfile.txt'
 
         result = self.datasets.download_file(
             DATASET_ID,
             FILE_ID,
-            outfile
+            str(outfile)
         )
 
-        from pathlib import Path
-        f = Path(outfile)
-
-        assert f.exists()
+        assert outfile.read_bytes() == b"Some sort of text"
         assert result == 0
 
     @responses.activate
@@ -436,3 +440,291 @@ class TestDatasets:
         result = self.datasets.search(keyword_id, region_id, year)
 
         assert isinstance(result[0], SearchResult)
+
+
+def slugs(count: int) -> List[str]:
+    return [f"dataset-{i}" for i in range(count)]
+
+
+def row_ids(start: int, end: int) -> List[str]:
+    return [f"{i:010d}" for i in range(start, end)]
+
+
+def dataset_page(request, count: int) -> dict:
+    """
+    Answers /datasets of FakeTransport from a catalog of count datasets.
+    """
+    offset, limit = int(request.query.get('offset', 0)), int(request.query['limit'])
+    return {'data': [{'slug': slug} for slug in slugs(count)[offset:offset + limit]]}
+
+
+@pytest.fixture
+def api_server(request):
+    """
+    Serves Catalog(**CATALOG) of the test class to its server and client attributes.
+    """
+    with ApiServer(Catalog(**request.cls.CATALOG)) as server, \
+            Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+        request.instance.server = server
+        request.instance.client = client
+        yield server
+
+
+@pytest.mark.usefixtures('api_server')
+class TestIterDatasets:
+    CATALOG = {'datasets': 250}
+
+    def test_iter_all_pages(self):
+        for prefetch in (True, False):
+            datasets = self.client.datasets.iter_datasets(page_size=100, prefetch=prefetch)
+            assert not isinstance(datasets, list)
+            assert [d.slug for d in datasets] == slugs(250)
+
+    def test_stops_at_total(self):
+        self.client.datasets.get_total()
+        requests_before = self.server.requests
+        assert len(list(self.client.datasets.iter_datasets(page_size=50, lazy=True))) == 250
+        # total and 5 full pages, the page after total is never requested
+        assert self.server.requests - requests_before == 6
+
+    def test_server_capping_page_size(self):
+        with ApiServer(Catalog(datasets=2500), max_limit=1000) as server, \
+                Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+            assert [d.slug for d in client.datasets.iter_datasets(page_size=2000)] == slugs(2500)
+            mine = client.users.me.dataset.iter_datasets(page_size=2000, prefetch=False)
+            assert [d.slug for d in mine] == slugs(2500)
+
+    def test_collections_without_total(self):
+        me = self.client.users.me.dataset
+        org = self.client.organizations(self.server.catalog.organization_id(0)).my_orgranization
+
+        assert [d.slug for d in me.iter_datasets(page_size=60)] == slugs(250)
+        assert [d.slug for d in org.dataset.iter_datasets(page_size=125)] == slugs(250)
+
+    def test_next_page_is_prefetched(self):
+        transport = FakeTransport()
+        requested = Event()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            if int(request.query.get('offset', 0)):
+                requested.set()
+            return dataset_page(request, 3)
+
+        @transport.get('/datasets/total')
+        def total(request):
+            return {'data': 3}
+
+        with Avaandmed('key', 'key_id', transport=transport) as client:
+            datasets = client.datasets.iter_datasets(page_size=2)
+            assert next(datasets).slug == 'dataset-0'
+            assert requested.wait(5)
+            assert [d.slug for d in datasets] == ['dataset-1', 'dataset-2']
+
+    def test_prefetch_keeps_deadline(self):
+        with ApiServer(Catalog(datasets=250), Faults(latency=0.2)) as server, \
+                Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+            with pytest.raises(AvaandmedTimeoutException):
+                with deadline(0.5):
+                    list(client.datasets.iter_datasets(page_size=10))
+
+    def test_async_iter_datasets(self):
+        pytest.importorskip('httpx')
+
+        async def collect():
+            async with AsyncAvaandmed('key', 'key_id', self.server.hostname, scheme='http') as client:
+                datasets = [d.slug async for d in client.datasets.iter_datasets(page_size=100)]
+                mine = [d.slug async for d in client.users.me.dataset.iter_datasets(
+                    page_size=100, prefetch=False)]
+                return datasets, mine
+
+        datasets, mine = run_async(collect())
+        assert datasets == mine == slugs(250)
+
+    def test_invalid_page_size(self):
+        with pytest.raises(AvaandmedException):
+            self.client.datasets.iter_datasets(page_size=0)
+
+
+@pytest.mark.usefixtures('api_server')
+class TestScan:
+    CATALOG = {'datasets': 1050}
+
+    def test_ordered(self):
+        datasets = self.client.datasets.scan(page_size=100)
+        assert not isinstance(datasets, list)
+        assert [d.slug for d in datasets] == slugs(1050)
+
+    def test_unordered(self):
+        scanned = [d.slug for d in self.client.datasets.scan(page_size=100, ordered=False, lazy=True)]
+        assert sorted(scanned) == sorted(slugs(1050))
+
+    def test_server_capping_page_size(self):
+        with ApiServer(Catalog(datasets=2500), max_limit=1000) as server, \
+                Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+            assert [d.slug for d in client.datasets.scan(page_size=2000)] == slugs(2500)
+            unordered = [d.slug for d in client.datasets.scan(page_size=2000, ordered=False)]
+            assert sorted(unordered) == sorted(slugs(2500))
+
+    def test_catalog_shorter_than_total(self):
+        transport = FakeTransport()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            return dataset_page(request, 3)
+
+        @transport.get('/datasets/total')
+        def total(request):
+            return {'data': 5}
+
+        with Avaandmed('key', 'key_id', transport=transport) as client:
+            with pytest.raises(AvaandmedException):
+                list(client.datasets.scan(page_size=2))
+
+    def test_pages_are_fetched_concurrently(self):
+        transport = FakeTransport()
+        lock = Lock()
+        in_flight = []
+        peak = []
+        all_started = Event()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            with lock:
+                in_flight.append(request)
+                peak.append(len(in_flight))
+                if len(in_flight) == 4:
+                    all_started.set()
+            # Pages answer only once 4 of them are requested at the same time
+            all_started.wait(5)
+            with lock:
+                in_flight.remove(request)
+            return dataset_page(request, 16)
+
+        @transport.get('/datasets/total')
+        def total(request):
+            return {'data': 16}
+
+        with Avaandmed('key', 'key_id', transport=transport) as client:
+            assert [d.slug for d in client.datasets.scan(page_size=2, max_workers=4)] == slugs(16)
+        assert all_started.is_set()
+        assert max(peak) == 4
+
+    def test_backpressure(self):
+        transport = FakeTransport()
+        lock = Lock()
+        offsets = []
+        fetched = {4: Event(), 5: Event()}
+
+        @transport.get('/datasets')
+        def datasets(request):
+            with lock:
+                offsets.append(int(request.query['offset']))
+                if len(offsets) in fetched:
+                    fetched[len(offsets)].set()
+            return dataset_page(request, 1100)
+
+        @transport.get('/datasets/total')
+        def total(request):
+            return {'data': 1100}
+
+        with Avaandmed('key', 'key_id', transport=transport) as client:
+            datasets = client.datasets.scan(page_size=100, max_workers=3)
+            # Pages are only submitted while the consumer takes them, so it is
+            # the consumed first page and 3 pages fetched ahead out of 11
+            next(datasets)
+            assert fetched[4].wait(5)
+            assert sorted(offsets) == [0, 100, 200, 300]
+            for _ in range(100):
+                next(datasets)
+            assert fetched[5].wait(5)
+            assert sorted(offsets) == [0, 100, 200, 300, 400]
+            datasets.close()
+
+    def test_async_scan(self):
+        pytest.importorskip('httpx')
+
+        async def collect():
+            async with AsyncAvaandmed('key', 'key_id', self.server.hostname, scheme='http') as client:
+                ordered = [d.slug async for d in client.datasets.scan(page_size=100)]
+                completed = [d.slug async for d in client.datasets.scan(page_size=100, ordered=False)]
+                return ordered, completed
+
+        ordered, completed = run_async(collect())
+        assert ordered == slugs(1050)
+        assert sorted(completed) == sorted(ordered)
+
+    def test_invalid_arguments(self):
+        with pytest.raises(AvaandmedException):
+            self.client.datasets.scan(max_workers=0)
+
+
+@pytest.mark.usefixtures('api_server')
+class TestIterFileRows:
+    CATALOG = {'datasets': 3, 'rows_per_file': 2500}
+
+    def test_all_rows(self):
+        catalog = self.server.catalog
+        dataset, file = catalog.dataset_id(1), catalog.file_id(1, 0)
+        for prefetch in (True, False):
+            rows = self.client.datasets.iter_file_rows(dataset, file, page_size=1000, prefetch=prefetch)
+            assert not isinstance(rows, list)
+            assert [row['id'] for row in rows] == row_ids(0, 2500)
+
+    def test_resume_from_offset(self):
+        catalog = self.server.catalog
+        dataset, file = catalog.dataset_id(1), catalog.file_id(1, 1)
+        rows = self.client.datasets.iter_file_rows(dataset, file, page_size=500, offset=1750)
+
+        assert [row['id'] for row in rows] == row_ids(1750, 2500)
+
+    def test_server_capping_page_size(self):
+        with ApiServer(Catalog(datasets=1, rows_per_file=2500), max_limit=700) as server, \
+                Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+            catalog = server.catalog
+            rows = client.datasets.iter_file_rows(catalog.dataset_id(0), catalog.file_id(0, 0))
+            assert [row['id'] for row in rows] == row_ids(0, 2500)
+
+    def test_pages_are_read_ahead_lazily(self):
+        transport = FakeTransport()
+        lock = Lock()
+        offsets = []
+        fetched = {2: Event(), 3: Event()}
+
+        @transport.get('/datasets/{id}/files/{fileId}')
+        def rows(request):
+            offset, limit = int(request.query['offset']), int(request.query['limit'])
+            with lock:
+                offsets.append(offset)
+                if len(offsets) in fetched:
+                    fetched[len(offsets)].set()
+            return {'data': [{'id': row_id} for row_id in row_ids(offset, min(offset + limit, 2500))]}
+
+        with Avaandmed('key', 'key_id', transport=transport) as client:
+            rows = client.datasets.iter_file_rows('dataset', 'file', page_size=100)
+            # The next page is requested when the current one is taken, so it is
+            # the first page and the one read ahead out of 25
+            assert next(rows)['id'] == row_ids(0, 1)[0]
+            assert fetched[2].wait(5)
+            assert offsets == [0, 100]
+            for _ in range(100):
+                next(rows)
+            assert fetched[3].wait(5)
+            assert offsets == [0, 100, 200]
+            rows.close()
+
+    def test_async_iter_file_rows(self):
+        pytest.importorskip('httpx')
+        catalog = self.server.catalog
+        dataset, file = catalog.dataset_id(2), catalog.file_id(2, 0)
+
+        async def collect():
+            async with AsyncAvaandmed('key', 'key_id', self.server.hostname, scheme='http') as client:
+                return [row['id'] async for row in client.datasets.iter_file_rows(
+                    dataset, file, page_size=1000, offset=100)]
+
+        assert run_async(collect()) == row_ids(100, 2500)
+
+    def test_invalid_arguments(self):
+        with pytest.raises(AvaandmedException):
+            self.client.datasets.iter_file_rows('id', 'file', offset=-1)
@@ -0,0 +1,1062 @@
+import asyncio
+import json
+import time
+import pytest
+import requests
+import responses
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event, Lock
+
+from avaandmed import Avaandmed
+from avaandmed.api_resources.datasets.dataset import Dataset
+from avaandmed.api_resources.entities import File
+from avaandmed.exceptions import AvaandmedApiExcepiton, AvaandmedTimeoutException
+from avaandmed.http.auth import TokenCache, decode_expiry
+from avaandmed.http.cache import CacheEntry, DiskCache, HttpCache, MemoryCache
+from avaandmed.http.coalesce import SingleFlight
+from avaandmed.http.endpoints import endpoint_group, endpoint_template
+from avaandmed.http.http_client import HttpClient, HttpMethod
+from avaandmed.http.json_codec import JsonCodec
+from avaandmed.http.json_stream import iter_items
+from avaandmed.http.instrumentation import Instrumentation, LatencyAggregator, Span
+from avaandmed.http.metrics import ClientMetrics, MetricsRegistry
+from avaandmed.http.rate_limit import RateLimiter, TokenBucket
+from avaandmed.http.retry import RetryBudget, RetryPolicy, RetryStats, parse_retry_after
+from avaandmed.http.timeouts import Timeout, current_deadline, deadline
+from avaandmed.http.transport import INLINE_LIMIT, CassetteTransport, FakeResponse, FakeTransport
+from .data_mock import DataJsonMock
+from .request_mock import BASE_URL, MOCK_TOKEN_URL, RequestMock
+from .stub_server import CHUNK_SIZE, StubServer
+from .utils import make_jwt, run_async
+
+DATASET_ID = '8d681e55-4118-41f5-b319-1d2bdd36408c'
+
+
+def count_calls(url: str) -> int:
+    return len([c for c in responses.calls if c.request.url == url])
+
+
+class TestTokenCache:
+
+    def test_decode_expiry(self):
+        exp = time.time() + 3600
+        assert decode_expiry(make_jwt(exp)) == pytest.approx(exp)
+        assert decode_expiry('not-a-jwt') is None
+        assert decode_expiry('a.b.c') is None
+
+    def test_token_reused_until_expiry(self):
+        tokens = iter([make_jwt(time.time() + 3600), 'second'])
+        cache = TokenCache(lambda: next(tokens))
+        first = cache.get()
+
+        assert cache.get() == first
+        assert cache.stats.logins == 1
+        assert cache.stats.logins_avoided == 1
+
+    def test_token_refreshed_before_expiry(self):
+        tokens = iter([make_jwt(time.time() + 10), 'second'])
+        cache = TokenCache(lambda: next(tokens), refresh_margin=30)
+        cache.get()
+
+        assert cache.get() == 'second'
+        assert cache.stats.logins == 2
+
+    def test_invalidate_only_current_token(self):
+        tokens = iter(['first', 'second', 'third'])
+        cache = TokenCache(lambda: next(tokens))
+        cache.get()
+        cache.invalidate('first')
+        cache.get()
+        cache.invalidate('first')
+
+        assert cache.get() == 'second'
+        assert cache.stats.reauthentications == 1
+
+    def test_single_login_for_concurrent_callers(self):
+        lock = Lock()
+        logins = []
+
+        def login():
+            with lock:
+                logins.append(1)
+            time.sleep(0.05)
+            return make_jwt(time.time() + 3600)
+
+        cache = TokenCache(login)
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            tokens = list(pool.map(lambda _: cache.get(), range(64)))
+
+        assert len(set(tokens)) == 1
+        assert len(logins) == 1
+        assert cache.stats.logins_avoided == 63
+
+
+class TestHttpClientAuth:
+
+    @pytest.fixture(autouse=True)
+    def _request_mock(self, request_mock: RequestMock):
+        self.request_mock = request_mock
+        self.request_mock.endpoint = '/datasets'
+
+    @pytest.fixture(autouse=True)
+    def _client(self, avaandmed_client: Avaandmed):
+        self.client = avaandmed_client
+
+    @responses.activate
+    def test_login_once_for_many_requests(self):
+        self.request_mock.stub_for(url='/total', json={'data': 1})
+        for _ in range(5):
+            self.client.datasets.get_total()
+
+        assert count_calls(MOCK_TOKEN_URL) == 1
+        assert self.client.token_stats.logins == 1
+        assert self.client.token_stats.logins_avoided == 4
+
+    @responses.activate
+    def test_reauthenticate_on_unauthorized(self):
+        url = f"{BASE_URL}/datasets/total"
+        self.request_mock.mock_post_auth()
+        self.request_mock.mock_post_auth()
+        responses.add(responses.GET, url, json={'message': 'Unauthorized'}, status=401)
+        responses.add(responses.GET, url, json={'data': 7})
+
+        assert self.client.datasets.get_total() == 7
+        assert count_calls(MOCK_TOKEN_URL) == 2
+        assert self.client.token_stats.reauthentications == 1
+
+    @responses.activate
+    def test_replay_only_once(self):
+        url = f"{BASE_URL}/datasets/total"
+        self.request_mock.mock_post_auth()
+        responses.add(responses.GET, url, json={'message': 'Unauthorized'}, status=401)
+
+        with pytest.raises(AvaandmedApiExcepiton):
+            self.client.datasets.get_total()
+        assert count_calls(url) == 2
+
+
+class TestConnectionPool:
+
+    def test_connections_are_reused(self):
+        with StubServer() as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+                for _ in range(50):
+                    client.datasets.get_total()
+
+            assert server.connections == 1
+
+    def test_idle_connections_are_dropped(self):
+        with StubServer() as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           idle_timeout=0) as client:
+                for _ in range(5):
+                    client.datasets.get_total()
+
+            # login and each call open new connection
+            assert server.connections == 6
+
+    def test_close_releases_connections(self):
+        with StubServer() as server:
+            client = Avaandmed('key', 'key_id', server.hostname, scheme='http')
+            client.datasets.get_total()
+            client.close()
+            client.datasets.get_total()
+
+            assert server.connections == 2
+
+
+class TestThreadSafety:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.mock_dataset = data_mock.MOCK_DATASET_FILE['data']
+        self.mock_file_path = data_mock.MOCK_FILE_PATH
+
+    def test_shared_client_from_many_threads(self):
+        threads = 32
+        with StubServer(dataset=self.mock_dataset) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           pool_maxsize=threads) as client:
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    datasets = list(pool.map(
+                        lambda _: client.datasets.get_by_id(DATASET_ID), range(500)))
+
+            assert all(isinstance(ds, Dataset) for ds in datasets)
+            assert all(ds.id == DATASET_ID for ds in datasets)
+            assert client.token_stats.logins == 1
+            assert server.malformed == 0
+            assert server.connections <= threads + 1
+
+    def test_upload_does_not_leak_headers(self):
+        with StubServer(dataset=self.mock_dataset) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           pool_maxsize=8) as client:
+                my_datasets = client.users.me.dataset
+
+                def call(i: int):
+                    if i % 4 == 0:
+                        return my_datasets.upload_file(
+                            DATASET_ID, 'upload.csv', 'text/csv', self.mock_file_path)
+                    return client.datasets.get_by_id(DATASET_ID)
+
+                with ThreadPoolExecutor(max_workers=8) as pool:
+                    results = list(pool.map(call, range(200)))
+
+            assert isinstance(results[0], File)
+            assert isinstance(results[1], Dataset)
+            assert server.malformed == 0
+
+
+class TestRetries:
+
+    @pytest.fixture(autouse=True)
+    def _request_mock(self, request_mock: RequestMock):
+        self.request_mock = request_mock
+        self.request_mock.endpoint = '/datasets'
+
+    def client(self, **kwargs) -> Avaandmed:
+        retry = RetryPolicy(backoff_factor=0, **kwargs)
+        return Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', retry=retry)
+
+    @responses.activate
+    def test_retry_transient_status(self):
+        client = self.client()
+        self.request_mock.stub_for(url='/total', status=502, json={'message': 'Bad Gateway'})
+        self.request_mock.stub_for(url='/total', status=503, json={'message': 'Unavailable'})
+        self.request_mock.stub_for(url='/total', json={'data': 3})
+
+        assert client.datasets.get_total() == 3
+        assert client.retry_stats.retries == 2
+        assert client.retry_stats.by_reason == {'502': 1, '503': 1}
+
+    @responses.activate
+    def test_give_up_after_max_retries(self):
+        client = self.client(max_retries=2)
+        self.request_mock.stub_for(url='/total', status=500, json={'message': 'Error'})
+
+        with pytest.raises(AvaandmedApiExcepiton):
+            client.datasets.get_total()
+        assert count_calls(f"{BASE_URL}/datasets/total") == 3
+        assert client.retry_stats.gave_up == 1
+
+    @responses.activate
+    def test_post_is_not_retried(self):
+        client = self.client()
+        self.request_mock.stub_for(
+            url='/rating', method=responses.POST, status=502, json={'message': 'Bad Gateway'})
+
+        with pytest.raises(AvaandmedApiExcepiton):
+            client.datasets.rate_dataset(DATASET_ID, 1, 1)
+        assert count_calls(f"{BASE_URL}/datasets/rating") == 1
+        assert client.retry_stats.retries == 0
+
+    @responses.activate
+    def test_retry_connection_error(self):
+        client = self.client()
+        self.request_mock.mock_post_auth()
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total",
+                      body=requests.exceptions.ConnectionError('reset'))
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total", json={'data': 1})
+
+        assert client.datasets.get_total() == 1
+        assert client.retry_stats.by_reason == {'ConnectionError': 1}
+
+    @responses.activate
+    def test_retry_after_is_honored(self, monkeypatch):
+        sleeps = []
+        monkeypatch.setattr('avaandmed.http.http_client.time.sleep', sleeps.append)
+        client = self.client()
+        self.request_mock.mock_post_auth()
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total", status=429,
+                      json={'message': 'Too Many Requests'}, headers={'Retry-After': '7'})
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total", json={'data': 1})
+
+        assert client.datasets.get_total() == 1
+        assert sleeps == [7.0]
+
+    def test_retry_after_beyond_retry_time_gives_up(self):
+        stats = RetryStats()
+        state = RetryPolicy(max_retry_time=5).start('GET', stats)
+
+        assert state.delay_for_status(503, '60') is None
+        assert stats.gave_up == 1
+
+    def test_backoff_is_capped_and_jittered(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=4)
+        delays = [policy.backoff(10) for _ in range(100)]
+
+        assert all(0 <= d <= 4 for d in delays)
+        assert len(set(delays)) > 1
+        assert RetryPolicy(backoff_factor=1, jitter=False).backoff(3) == 8
+
+    def test_budget_limits_retries(self):
+        stats = RetryStats()
+        policy = RetryPolicy(budget=RetryBudget(ratio=0, reserve=2))
+        delays = [policy.start('GET', stats).delay_for_status(503) for _ in range(4)]
+
+        assert [d is not None for d in delays] == [True, True, False, False]
+        assert stats.budget_exhausted == 2
+
+    def test_parse_retry_after(self):
+        assert parse_retry_after('120') == 120
+        assert parse_retry_after(None) is None
+        assert parse_retry_after('soon') is None
+        assert 0 <= parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') < 1
+
+
+class TestRateLimiter:
+
+    def test_endpoint_groups(self):
+        assert endpoint_group('/auth/key-login') == 'auth'
+        assert endpoint_group(f"/datasets/{DATASET_ID}") == 'catalog'
+        assert endpoint_group('/datasets?limit=5') == 'catalog'
+        assert endpoint_group(f"/datasets/{DATASET_ID}/files/x/preview") == 'file_rows'
+        assert endpoint_group(f"/users/me/datasets/{DATASET_ID}/files/x") == 'file_rows'
+        assert endpoint_group(f"/datasets/{DATASET_ID}/files/x/columns") == 'catalog'
+        assert endpoint_group(f"/datasets/{DATASET_ID}/files/x/download") == 'downloads'
+
+    def test_bucket_allows_burst_then_spaces_requests(self):
+        bucket = TokenBucket(rate=10, burst=3)
+        delays = [bucket.reserve() for _ in range(5)]
+
+        assert delays[:3] == [0, 0, 0]
+        assert delays[3] == pytest.approx(0.1, abs=0.01)
+        assert delays[4] == pytest.approx(0.2, abs=0.01)
+
+    def test_group_limit(self):
+        limiter = RateLimiter(groups={'downloads': (1, 1)})
+
+        assert limiter.reserve('/datasets/x/files/y/download') == 0
+        assert limiter.reserve('/datasets/x/files/y/download') > 0.9
+        assert limiter.reserve('/datasets/total') == 0
+
+    def test_shared_by_threads_and_tasks(self):
+        limiter = RateLimiter(rate=100, burst=1)
+
+        async def tasks():
+            await asyncio.gather(*[limiter.acquire_async('/datasets') for _ in range(15)])
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            pool.map(lambda _: limiter.acquire('/datasets'), range(15))
+            run_async(tasks())
+        elapsed = time.monotonic() - start
+
+        assert elapsed >= 0.28
+        assert limiter.stats.acquired == 30
+
+    def test_client_requests_are_limited(self):
+        limiter = RateLimiter(rate=50, burst=5)
+        with StubServer() as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           rate_limiter=limiter) as client:
+                start = time.monotonic()
+                for _ in range(14):
+                    client.datasets.get_total()
+                elapsed = time.monotonic() - start
+
+        # login and 14 calls, first 5 are allowed at once
+        assert limiter.stats.acquired == 15
+        assert elapsed >= 0.18
+
+
+class TestHttpCache:
+
+    @pytest.fixture(autouse=True)
+    def _request_mock(self, request_mock: RequestMock):
+        self.request_mock = request_mock
+        self.request_mock.mock_post_auth()
+        self.url = f"{BASE_URL}/datasets/total"
+
+    def client(self, cache: HttpCache) -> Avaandmed:
+        return Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', cache=cache)
+
+    @responses.activate
+    def test_revalidate_with_etag(self):
+        cache = HttpCache()
+        client = self.client(cache)
+        responses.add(responses.GET, self.url, json={'data': 3}, headers={'ETag': '"v1"'})
+        responses.add(responses.GET, self.url, status=304)
+
+        assert client.datasets.get_total() == 3
+        assert client.datasets.get_total() == 3
+        assert responses.calls[-1].request.headers['If-None-Match'] == '"v1"'
+        assert client.cache_stats.as_dict() == {'hits': 0, 'misses': 1, 'revalidations': 1}
+
+    @responses.activate
+    def test_revalidate_with_last_modified(self):
+        modified = 'Wed, 21 Oct 2015 07:28:00 GMT'
+        client = self.client(HttpCache())
+        responses.add(responses.GET, self.url, json={'data': 3},
+                      headers={'Last-Modified': modified})
+        responses.add(responses.GET, self.url, json={'data': 4})
+
+        assert client.datasets.get_total() == 3
+        assert client.datasets.get_total() == 4
+        assert responses.calls[-1].request.headers['If-Modified-Since'] == modified
+        assert client.cache_stats.misses == 2
+
+    @responses.activate
+    def test_without_validators_fresh_for_ttl(self):
+        cache = HttpCache(ttl=60)
+        client = self.client(cache)
+        responses.add(responses.GET, self.url, json={'data': 3})
+
+        assert client.datasets.get_total() == 3
+        assert client.datasets.get_total() == 3
+        assert count_calls(self.url) == 1
+        assert client.cache_stats.hits == 1
+
+        cache.storage.get(f"key_id:{self.url}").stored_at -= 61
+        assert client.datasets.get_total() == 3
+        assert count_calls(self.url) == 2
+
+    @responses.activate
+    def test_no_store(self):
+        client = self.client(HttpCache())
+        responses.add(responses.GET, self.url, json={'data': 3},
+                      headers={'Cache-Control': 'no-store'})
+
+        client.datasets.get_total()
+        client.datasets.get_total()
+        assert count_calls(self.url) == 2
+
+    @responses.activate
+    def test_only_get_is_cached(self):
+        client = self.client(HttpCache())
+        self.request_mock.stub_for(url='/datasets/rating', method=responses.POST)
+
+        client.datasets.rate_dataset(DATASET_ID, 1, 1)
+        client.datasets.rate_dataset(DATASET_ID, 1, 1)
+        assert count_calls(f"{BASE_URL}/datasets/rating") == 2
+        assert client.cache_stats.misses == 0
+
+    def test_memory_cache_evicts_least_recently_used(self):
+        storage = MemoryCache(max_entries=2)
+        storage.set('a', CacheEntry(b'a'))
+        storage.set('b', CacheEntry(b'b'))
+        storage.get('a')
+        storage.set('c', CacheEntry(b'c'))
+
+        assert len(storage) == 2
+        assert storage.get('b') is None
+        assert storage.get('a').body == b'a'
+
+    def test_disk_cache(self, tmp_path):
+        storage = DiskCache(str(tmp_path))
+        storage.set('key', CacheEntry(b'{"data": 1}', etag='"v1"'))
+
+        entry = DiskCache(str(tmp_path)).get('key')
+        assert entry.body == b'{"data": 1}'
+        assert entry.etag == '"v1"'
+        assert entry.last_modified is None
+
+        storage.clear()
+        assert storage.get('key') is None
+
+    def test_disk_cache_concurrent_writers(self, tmp_path):
+        storage = DiskCache(str(tmp_path))
+        bodies = [f'{{"data": {i}}}'.encode('utf-8') for i in range(8)]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in executor.map(lambda body: storage.set('key', CacheEntry(body)), bodies * 20):
+                pass
+
+        assert storage.get('key').body in bodies
+        assert [path.name for path in tmp_path.iterdir() if path.suffix == '.tmp'] == []
+
+    def test_damaged_disk_cache_entry_is_a_miss(self, tmp_path):
+        storage = DiskCache(str(tmp_path))
+        storage.set('key', CacheEntry(b'{"data": 1}', etag='"v1"'))
+        path = next(tmp_path.iterdir())
+        content = path.read_bytes()
+
+        for damaged in (content[:-3], content[:10], b'', b'[]\n{}', b'{}\n{}'):
+            path.write_bytes(damaged)
+            assert storage.get('key') is None
+
+
+class TestCoalescing:
+
+    def wait_for(self, condition, timeout: float = 5.0) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline
+            time.sleep(0.001)
+
+    def test_identical_calls_share_result(self):
+        single_flight = SingleFlight()
+        release = Event()
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            release.wait()
+            return {'total': 3}
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(single_flight.do, 'key', fetch) for _ in range(8)]
+            self.wait_for(lambda: single_flight.stats.coalesced == 7)
+            release.set()
+            results = [f.result() for f in futures]
+
+        assert len(calls) == 1
+        assert all(r is results[0] for r in results)
+        assert single_flight.stats.as_dict() == {'calls': 1, 'coalesced': 7}
+
+    def test_error_is_shared(self):
+        single_flight = SingleFlight()
+        release = Event()
+
+        def fetch():
+            release.wait()
+            raise ValueError('failed')
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(single_flight.do, 'key', fetch) for _ in range(4)]
+            self.wait_for(lambda: single_flight.stats.coalesced == 3)
+            release.set()
+            for f in futures:
+                with pytest.raises(ValueError):
+                    f.result()
+
+        # Finished calls are not reused
+        assert single_flight.do('key', lambda: 1) == 1
+
+    @responses.activate
+    def test_client_coalesces_concurrent_gets(self, request_mock: RequestMock):
+        release = Event()
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', coalesce=True)
+        request_mock.mock_post_auth()
+
+        def callback(request):
+            release.wait()
+            return 200, {}, '{"data": 3}'
+
+        url = f"{BASE_URL}/datasets/total"
+        responses.add_callback(responses.GET, url, callback=callback)
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            futures = [pool.submit(client.datasets.get_total) for _ in range(6)]
+            self.wait_for(lambda: client.coalesce_stats.coalesced == 5)
+            release.set()
+            assert [f.result() for f in futures] == [3] * 6
+
+        assert count_calls(url) == 1
+        assert client.coalesce_stats.calls == 1
+
+    @responses.activate
+    def test_coalesced_results_are_not_shared(self, request_mock: RequestMock):
+        release = Event()
+        client = HttpClient('avaandmedtest.eesti.ee', 'key', 'key_id', coalesce=True)
+        request_mock.mock_post_auth()
+
+        def callback(request):
+            release.wait()
+            return 200, {}, '{"data": [1, 2]}'
+
+        def fetch_and_modify():
+            result = client.request(HttpMethod.GET, '/datasets')
+            result.append(3)
+            return result
+
+        responses.add_callback(responses.GET, f"{BASE_URL}/datasets", callback=callback)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            futures = [pool.submit(fetch_and_modify) for _ in range(4)]
+            self.wait_for(lambda: client.coalesce_stats.coalesced == 3)
+            release.set()
+            assert [f.result() for f in futures] == [[1, 2, 3]] * 4
+
+        assert client.coalesce_stats.calls == 1
+
+    def test_disabled_by_default(self):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee')
+        assert client.coalesce_stats is None
+
+
+class TestJsonDecoding:
+
+    @pytest.fixture(autouse=True)
+    def _request_mock(self, request_mock: RequestMock):
+        self.request_mock = request_mock
+        self.request_mock.mock_post_auth()
+        self.http_client = HttpClient('avaandmedtest.eesti.ee', 'key', 'key_id')
+
+    def test_prefers_fast_backend(self):
+        pytest.importorskip('orjson')
+        assert JsonCodec().backend == 'orjson'
+
+    def test_backends_agree(self):
+        document = b'{"data": [{"id": 1, "name": "\\u00f5un", "rating": 4.5, "tags": null}]}'
+        codec = JsonCodec()
+        expected = json.loads(document)
+        assert codec.loads(document) == expected
+
+        codec.use('json')
+        assert codec.backend == 'json'
+        assert codec.loads(document) == expected
+
+    def test_custom_backend(self):
+        codec = JsonCodec()
+        codec.use(lambda data: {'data': 'custom'})
+        assert codec.loads(b'{}') == {'data': 'custom'}
+
+    @responses.activate
+    def test_body_is_decoded_once(self, monkeypatch):
+        self.request_mock.stub_for(url='/datasets/rating', method=responses.POST,
+                                   json={'data': 'Submitted'})
+        monkeypatch.setattr(requests.Response, 'json', lambda *_: pytest.fail('decoded twice'))
+
+        assert self.http_client.request(HttpMethod.POST, '/datasets/rating') == 'Submitted'
+
+    @responses.activate
+    def test_raw_body(self):
+        self.request_mock.stub_for(url='/datasets/total', json={'data': 3})
+
+        assert self.http_client.request(HttpMethod.GET, '/datasets/total', raw=True) == b'{"data": 3}'
+
+
+class TestTimeouts:
+
+    def test_timeout_capped_by_deadline(self):
+        assert Timeout.of(5) == Timeout(5, 5)
+        assert Timeout.of(None) == Timeout(None, None)
+        assert Timeout(2, 10).capped(4) == Timeout(2, 4)
+        assert Timeout(None, None).capped(1) == Timeout(1, 1)
+        assert Timeout(2, 10).capped(None) == Timeout(2, 10)
+
+    def test_nested_deadline_cannot_extend_outer(self):
+        assert current_deadline() is None
+        with deadline(1) as outer:
+            with deadline(10) as inner:
+                assert inner is outer
+            with deadline(0.5) as inner:
+                assert inner.expires_at < outer.expires_at
+            assert current_deadline() is outer
+        assert current_deadline() is None
+
+    def test_read_timeout(self):
+        with StubServer(delay=0.5) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           timeout=Timeout(connect=1, read=0.1),
+                           retry=RetryPolicy(max_retries=0)) as client:
+                with pytest.raises(AvaandmedTimeoutException):
+                    client.datasets.get_total()
+
+    def test_download_stalling_mid_body(self, tmp_path):
+        with StubServer(download_size=4 * CHUNK_SIZE, stall=0.5) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           timeout=Timeout(connect=1, read=0.1),
+                           retry=RetryPolicy(max_retries=0)) as client:
+                with pytest.raises(AvaandmedTimeoutException):
+                    client.datasets.download_file(DATASET_ID, 'file', str(tmp_path / 'stalled.csv'))
+
+    def test_per_call_timeout(self):
+        with StubServer(delay=0.2) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                           timeout=0.05, retry=RetryPolicy(max_retries=0)) as client:
+                http_client = client._http_client
+                assert http_client.request(HttpMethod.GET, '/datasets/total', timeout=2) == 1
+                with pytest.raises(AvaandmedTimeoutException):
+                    http_client.request(HttpMethod.GET, '/datasets/total')
+
+    def test_deadline_bounds_retries(self):
+        with StubServer(delay=0.3) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http', timeout=0.1,
+                           retry=RetryPolicy(max_retries=100, backoff_factor=0)) as client:
+                start = time.monotonic()
+                with deadline(0.5):
+                    with pytest.raises(AvaandmedTimeoutException):
+                        client.datasets.get_total()
+                elapsed = time.monotonic() - start
+
+        assert elapsed < 1
+        assert client.retry_stats.retries >= 1
+
+    @responses.activate
+    def test_expired_deadline_is_not_sent(self, request_mock: RequestMock):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee')
+        with deadline(0):
+            with pytest.raises(AvaandmedTimeoutException):
+                client.datasets.get_total()
+        assert len(responses.calls) == 0
+
+    @responses.activate
+    def test_timeout_error_replaces_system_exit(self, request_mock: RequestMock):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                           retry=RetryPolicy(max_retries=0))
+        request_mock.mock_post_auth()
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total",
+                      body=requests.exceptions.ReadTimeout('timed out'))
+
+        with pytest.raises(AvaandmedTimeoutException) as ex:
+            client.datasets.get_total()
+        assert ex.value.uri == f"{BASE_URL}/datasets/total"
+
+
+class TestInstrumentation:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.mock_dataset = data_mock.MOCK_DATASET_FILE['data']
+
+    def test_endpoint_templates(self):
+        assert endpoint_template(f"/datasets/{DATASET_ID}") == '/datasets/{id}'
+        assert endpoint_template(f"/datasets/{DATASET_ID}/files/x/preview?limit=5") == \
+            '/datasets/{id}/files/{fileId}/preview'
+        assert endpoint_template('/datasets/slug/my-dataset') == '/datasets/slug/{slug}'
+        assert endpoint_template('/datasets/my-dataset/ratings') == '/datasets/{slug}/ratings'
+        assert endpoint_template('/organizations/my-organizations/1/datasets/privacy-violations') == \
+            '/organizations/my-organizations/{id}/datasets/privacy-violations'
+        assert endpoint_template('/keywords?search=x&limit=20') == '/keywords'
+
+    def test_request_phases(self):
+        spans = []
+        with StubServer(dataset=self.mock_dataset) as server:
+            with Avaandmed('key', 'key_id', server.hostname, scheme='http') as client:
+                client.instrumentation.add(spans.append)
+                client.datasets.get_by_id(DATASET_ID)
+                client.datasets.get_by_id(DATASET_ID)
+
+        names = [(s.name, s.endpoint) for s in spans]
+        assert names[:4] == [
+            ('connect', '/auth/key-login'),
+            ('ttfb', '/auth/key-login'),
+            ('read', '/auth/key-login'),
+            ('auth', '/auth/key-login')
+        ]
+        assert names[4:9] == [
+            ('ttfb', '/datasets/{id}'),
+            ('read', '/datasets/{id}'),
+            ('request', '/datasets/{id}'),
+            ('decode', '/datasets/{id}'),
+            ('validate', '/datasets/{id}')
+        ]
+        # Second call reuses connection and token
+        assert [n for n, _ in names[9:]] == ['ttfb', 'read', 'request', 'decode', 'validate']
+
+        request = spans[6]
+        assert request.status == 200
+        assert request.size > 0
+        assert request.method == 'GET'
+        assert all(s.duration >= 0 for s in spans)
+
+    @responses.activate
+    def test_failed_span(self, request_mock: RequestMock):
+        spans = []
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                           retry=RetryPolicy(max_retries=0))
+        client.instrumentation.add(spans.append)
+        request_mock.mock_post_auth()
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total",
+                      body=requests.exceptions.ConnectionError('reset'))
+
+        with pytest.raises(SystemExit):
+            client.datasets.get_total()
+        assert spans[-1].name == 'request'
+        assert spans[-1].error == 'ConnectionError'
+
+    def test_remove_callback(self):
+        instrumentation = Instrumentation()
+        spans = []
+        instrumentation.add(spans.append)
+        with instrumentation.span('decode', '/datasets'):
+            pass
+        instrumentation.remove(spans.append)
+        with instrumentation.span('decode', '/datasets'):
+            pass
+
+        assert len(spans) == 1
+        assert not instrumentation.enabled
+
+    def test_aggregator_percentiles(self):
+        aggregator = LatencyAggregator()
+        for i in range(1, 101):
+            span = Span('request', '/datasets/{id}', 'GET')
+            span.duration = i / 1000
+            aggregator(span)
+
+        assert aggregator.percentiles('request') == {
+            'count': 100, 'p50': 0.05, 'p95': 0.095, 'p99': 0.099}
+        assert aggregator.percentiles('request', '/datasets')['count'] == 0
+        assert aggregator.summary()['/datasets/{id}']['request']['p50'] == 0.05
+
+
+class TestMetrics:
+
+    def test_render_text_format(self):
+        registry = MetricsRegistry()
+        counter = registry.counter('calls_total', 'Calls.', ('endpoint',))
+        counter.inc(endpoint='/datasets/{id}')
+        counter.inc(2, endpoint='/a"b')
+        histogram = registry.histogram('latency_seconds', 'Latency.', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+
+        assert registry.render() == (
+            '# HELP calls_total Calls.\n'
+            '# TYPE calls_total counter\n'
+            'calls_total{endpoint="/a\\"b"} 2\n'
+            'calls_total{endpoint="/datasets/{id}"} 1\n'
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{le="0.1"} 1\n'
+            'latency_seconds_bucket{le="1"} 2\n'
+            'latency_seconds_bucket{le="+Inf"} 3\n'
+            'latency_seconds_sum 5.55\n'
+            'latency_seconds_count 3\n'
+        )
+
+    def test_same_metric_is_registered_once(self):
+        registry = MetricsRegistry()
+        assert registry.counter('calls_total', 'Calls.') is registry.counter('calls_total', 'Calls.')
+        with pytest.raises(ValueError):
+            registry.histogram('calls_total', 'Calls.')
+
+    @responses.activate
+    def test_client_metrics(self, request_mock: RequestMock):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', cache=HttpCache(),
+                           retry=RetryPolicy(backoff_factor=0))
+        metrics = ClientMetrics()
+        metrics.attach(client)
+        request_mock.mock_post_auth()
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total", status=503,
+                      json={'message': 'Unavailable'})
+        responses.add(responses.GET, f"{BASE_URL}/datasets/total", json={'data': 1})
+        responses.add(responses.GET, f"{BASE_URL}/datasets/{DATASET_ID}", status=404,
+                      json={'message': 'Not Found'})
+
+        client.datasets.get_total()
+        client.datasets.get_total()
+        with pytest.raises(AvaandmedApiExcepiton):
+            client._http_client.request(HttpMethod.GET, f"/datasets/{DATASET_ID}")
+
+        labels = {'endpoint': '/datasets/{id}', 'method': 'GET'}
+        assert metrics.requests.value(endpoint='/datasets/total', method='GET') == 1
+        assert metrics.errors.value(status='404', **labels) == 1
+        assert metrics.latency.count(**labels) == 1
+
+        text = metrics.registry.render()
+        assert 'avaandmed_retries_total{reason="503"} 1' in text
+        assert 'avaandmed_cache_total{outcome="hits"} 1' in text
+        assert 'avaandmed_logins_total 1' in text
+        assert 'avaandmed_response_size_bytes_bucket{endpoint="/datasets/total",method="GET",le="256"} 1' in text
+
+    def test_serve(self):
+        registry = MetricsRegistry()
+        registry.counter('calls_total', 'Calls.').inc()
+        with registry.serve(port=0) as server:
+            res = requests.get(f"http://127.0.0.1:{server.port}/metrics")
+            missing = requests.get(f"http://127.0.0.1:{server.port}/other")
+
+        assert res.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert 'calls_total 1' in res.text
+        assert missing.status_code == 404
+
+
+class TestTransports:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.mock_dataset = data_mock.MOCK_DATASET_FILE['data']
+
+    def fake(self) -> FakeTransport:
+        transport = FakeTransport()
+
+        @transport.get('/datasets/{id}')
+        def dataset(request):
+            return {'data': dict(self.mock_dataset, id=request.params['id'])}
+
+        @transport.get('/datasets/total')
+        def total(request):
+            return {'data': 7}
+
+        return transport
+
+    def test_fake_transport_routes(self):
+        transport = self.fake()
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=transport)
+
+        assert client.datasets.get_by_id(DATASET_ID).id == DATASET_ID
+        assert client.datasets.get_total() == 7
+        assert [c.path for c in transport.calls] == [
+            '/auth/key-login', f"/datasets/{DATASET_ID}", '/datasets/total']
+        assert transport.calls[1].headers['Authorization'] == 'Bearer fake-token'
+        assert transport.calls[0].headers['X-API-KEY'] == 'a2V5X2lkOmtleQ=='
+
+    def test_fake_transport_unknown_path(self):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=FakeTransport())
+
+        with pytest.raises(AvaandmedApiExcepiton) as e:
+            client.datasets.get_total()
+        assert e.value.status == 404
+
+    def test_fake_transport_failures_are_retried(self):
+        transport = FakeTransport()
+        attempts = []
+
+        @transport.get('/datasets/total')
+        def total(request):
+            attempts.append(request)
+            if len(attempts) == 1:
+                raise requests.exceptions.ConnectionError('reset')
+            if len(attempts) == 2:
+                return FakeResponse(503, {'message': 'Unavailable'})
+            return {'data': 1}
+
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=transport,
+                           retry=RetryPolicy(backoff_factor=0))
+        assert client.datasets.get_total() == 1
+        assert client.retry_stats.by_reason == {'ConnectionError': 1, '503': 1}
+
+    def test_cassette_records_and_replays(self, tmp_path):
+        path = str(tmp_path / 'cassette.json')
+        recorder = CassetteTransport(path, inner=self.fake(), mode='record')
+        with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=recorder) as client:
+            recorded = client.datasets.get_by_id(DATASET_ID)
+            assert client.datasets.get_total() == 7
+
+        with open(path) as f:
+            cassette = f.read()
+        assert 'Bearer' not in cassette
+        assert 'a2V5X2lkOmtleQ==' not in cassette
+
+        player = CassetteTransport(path)
+        assert player.mode == 'replay'
+        with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=player) as client:
+            assert client.datasets.get_by_id(DATASET_ID) == recorded
+            assert client.datasets.get_total() == 7
+            with pytest.raises(AvaandmedApiExcepiton):
+                client.datasets.get_by_id('unknown')
+
+    def test_cassette_streams_large_bodies(self, tmp_path):
+        path = str(tmp_path / 'cassette.json')
+        content = bytes(range(256)) * (INLINE_LIMIT // 128)
+        transport = self.fake()
+        transport.route('POST', '/datasets/{id}/files/{fileId}/download',
+                        lambda request: FakeResponse(body=content))
+        with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                       transport=CassetteTransport(path, inner=transport, mode='record')) as client:
+            client.datasets.download_file(DATASET_ID, 'file', str(tmp_path / 'recorded.csv'))
+            client.datasets.get_total()
+
+        with open(path) as f:
+            interactions = json.load(f)['interactions']
+        download, total = interactions[1]['response'], interactions[2]['response']
+        assert download['size'] == len(content) and 'body' not in download
+        assert (tmp_path / 'cassette.json.bodies' / download['body_file']).stat().st_size < len(content)
+        assert 'body_file' not in total
+
+        with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                       transport=CassetteTransport(path, mode='replay')) as client:
+            client.datasets.download_file(DATASET_ID, 'file', str(tmp_path / 'replayed.csv'))
+        assert (tmp_path / 'replayed.csv').read_bytes() == content
+
+    def test_cassette_replays_recorded_latency(self, tmp_path):
+        path = str(tmp_path / 'cassette.json')
+        transport = FakeTransport()
+
+        @transport.get('/datasets/total')
+        def total(request):
+            time.sleep(0.2)
+            return {'data': 7}
+
+        with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                       transport=CassetteTransport(path, inner=transport)) as client:
+            client.datasets.get_total()
+
+        def replay(latency: float) -> float:
+            with Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee',
+                           transport=CassetteTransport(path, latency=latency)) as client:
+                started = time.perf_counter()
+                assert client.datasets.get_total() == 7
+                return time.perf_counter() - started
+
+        assert replay(0) < 0.1
+        assert replay(1) >= 0.2
+
+
+class TestStreaming:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.dataset_list = data_mock.MOCK_DATASET_LIST_FILE
+        self.preview = data_mock.MOCK_PREVIEW_FILE
+
+    def fake(self) -> FakeTransport:
+        transport = FakeTransport()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            return self.dataset_list
+
+        @transport.get('/users/me/datasets/{id}/files/{fileId}/preview')
+        def preview(request):
+            return self.preview
+
+        @transport.get('/users/me/datasets/privacy-violations')
+        def violations(request):
+            return FakeResponse(403, {'message': 'Forbidden'})
+
+        return transport
+
+    def test_items_split_at_every_position(self):
+        document = json.dumps({
+            'total': 3,
+            'meta': {'data': [1, 2], 'text': 'a ] } " b'},
+            'data': [{'name': 'õun \\"]', 'values': [1.5, -20, None, True]}, 12345, 'x', [], {}],
+            'after': [{'data': 1}]
+        }, ensure_ascii=False).encode('utf-8')
+        expected = json.loads(document)['data']
+
+        for position in range(len(document) + 1):
+            assert list(iter_items([document[:position], document[position:]])) == expected
+        assert list(iter_items(document[i:i + 1] for i in range(len(document)))) == expected
+
+    def test_data_which_is_not_a_list(self):
+        assert list(iter_items([b'{"data": {"a": 1}, "total": 2}'])) == [{'a': 1}]
+        assert list(iter_items([b'{"data": 7', b'}'])) == [7]
+
+    def test_incomplete_document(self):
+        with pytest.raises(ValueError):
+            list(iter_items([b'{"data": [1, 2']))
+        with pytest.raises(ValueError):
+            list(iter_items([b'{"total": 2}']))
+        with pytest.raises(ValueError):
+            list(iter_items([b'[1, 2]']))
+
+    def test_items_are_yielded_before_body_ends(self):
+        def chunks():
+            yield b'{"data": [{"id": 1}, '
+            assert received == [{'id': 1}]
+            yield b'{"id": 2}]}'
+
+        received = []
+        for item in iter_items(chunks()):
+            received.append(item)
+        assert received == [{'id': 1}, {'id': 2}]
+
+    def test_stream_dataset_list(self):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=self.fake())
+
+        datasets = client.datasets.get_dataset_list(stream=True)
+        assert not isinstance(datasets, list)
+        assert list(datasets) == client.datasets.get_dataset_list()
+
+        lazy = list(client.datasets.get_dataset_list(stream=True, lazy=True))
+        assert [type(d).__name__ for d in lazy] == ['LazyDataset'] * len(lazy)
+        assert lazy == client.datasets.get_dataset_list()
+
+    def test_stream_rows(self):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=self.fake())
+
+        rows = client.users.me.dataset.get_file_rows_preview(DATASET_ID, 'file', stream=True)
+        assert list(rows) == self.preview['data']
+
+    def test_stream_error(self):
+        client = Avaandmed('key', 'key_id', 'avaandmedtest.eesti.ee', transport=self.fake())
+
+        violations = client.users.me.dataset.get_all_privacy_violations(stream=True)
+        with pytest.raises(AvaandmedApiExcepiton) as e:
+            next(violations)
+        assert e.value.status == 403
@@ -2,6 +2,7 @@ import pytest
 import responses
 
 from typing import List
+from avaandmed import Avaandmed
 from avaandmed.api_resources.organizations.my_organization import MyOrganization, OrganizationDataset
 from avaandmed.api_resources.datasets.dataset import Dataset
 from avaandmed.api_resources.entities import AccessPermission, DatasetMetadata, DatasetRating, File, Identifier, Index, Polynomial, PrivacyViolation, ProcessingStatus, UpdateIntervalUnit
@@ -29,7 +30,8 @@ class TestOrganizations:
         self.my_orgs_endpoint = "/organizations/my-organizations"
 
     @pytest.fixture(autouse=True)
-    def _my_org_datasets(self, organization_datasets: OrganizationDataset):
+    def _my_org_datasets(self, avaandmed_client: Avaandmed, organization_datasets: OrganizationDataset):
+        self.avaandmed_client = avaandmed_client
         self.datasets = organization_datasets
 
     @pytest.fixture(autouse=True)
@@ -490,12 +492,15 @@ class TestOrganizations:
             updateIntervalUnit=UpdateIntervalUnit.DAY,
             updateIntervalFrequency=1)
 
+        spans = []
+        self.avaandmed_client.instrumentation.add(spans.append)
         self.request_mock.stub_for(
             '/datasets', responses.POST, status=201, json=self.mock_dataset)
         result = self.datasets.create_dataset_metadata(metadata)
 
         assert result is not None
         assert isinstance(result, Dataset)
+        assert [s.method for s in spans if s.name == 'validate'] == ['POST']
 
     @responses.activate
     def test_upload_file(self):
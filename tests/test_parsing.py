@@ -0,0 +1,312 @@
+import os
+import pickle
+import pytest
+from pydantic import ValidationError, parse_obj_as
+from typing import Dict, List
+
+from avaandmed import Avaandmed, AsyncAvaandmed
+from avaandmed.api_resources.datasets.dataset import CompactDataset, Dataset, LazyDataset
+from avaandmed.api_resources.entities import (
+    Access, CompactFile, CompactKeyword, CompactSearchResult, File, Inquiry, Keyword, ProcessingStatus,
+    SearchResult)
+from avaandmed.api_resources.reference import Category
+from avaandmed.http.transport import FakeTransport
+from avaandmed.parsing import ParseMode, construct, parse
+from avaandmed.parsing import compiled
+from avaandmed.parsing.compact import compact, compact_model
+from avaandmed.parsing.compiled import DecoderCompiler
+from avaandmed.parsing.lazy import lazy_model
+from tests.data_mock import DataJsonMock
+from tests.utils import run_async
+
+
+class TestTrustedParsing:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.dataset = data_mock.MOCK_DATASET_FILE['data']
+        self.dataset_list = data_mock.MOCK_DATASET_LIST_FILE['data']
+        self.search = data_mock.MOCK_SEARCH_RESULTS['data']
+
+    def test_same_models_as_validation(self):
+        for type_, data in [(Dataset, self.dataset), (List[Dataset], self.dataset_list),
+                            (List[SearchResult], self.search)]:
+            validated = parse(type_, data)
+            trusted = parse(type_, data, ParseMode.TRUSTED)
+
+            assert trusted == validated
+            assert repr(trusted) == repr(validated)
+
+    def test_nested_models_and_enums(self):
+        dataset = parse(Dataset, self.dataset, ParseMode.TRUSTED)
+
+        assert isinstance(dataset, Dataset)
+        assert dataset.__fields_set__ == parse(Dataset, self.dataset).__fields_set__
+        assert isinstance(dataset.keywords[0], Keyword)
+        assert isinstance(dataset.files[0].processing_status, ProcessingStatus)
+        assert dataset.access is Access.PUBLIC
+        assert dataset.files[0].metadata is not self.dataset['files'][0]['metadata']
+
+    def test_unexpected_types_fall_back_to_validation(self):
+        file = dict(self.dataset['files'][0], size=1024)
+        category = {'id': '13', 'name': 'Transport', 'emsIds': ['1', 2]}
+
+        assert parse(File, file, ParseMode.TRUSTED).size == '1024'
+        assert parse(Category, category, ParseMode.TRUSTED) == parse(Category, category)
+        assert parse(Dict[str, int], {'a': '1'}, ParseMode.TRUSTED) == {'a': 1}
+
+    def test_invalid_data_raises(self):
+        file = self.dataset['files'][0]
+
+        with pytest.raises(ValidationError):
+            parse(File, dict(file, processingStatus='unknown'), ParseMode.TRUSTED)
+        with pytest.raises(ValidationError):
+            parse(File, {k: v for k, v in file.items() if k != 'name'}, ParseMode.TRUSTED)
+        with pytest.raises(ValidationError):
+            parse(File, dict(file, datasetId=None), ParseMode.TRUSTED)
+        with pytest.raises(ValidationError):
+            parse(List[File], file, ParseMode.TRUSTED)
+
+    def test_construct(self):
+        assert construct(Dataset, self.dataset) == parse(Dataset, self.dataset)
+
+    def test_client_parse_mode(self):
+        transport = FakeTransport()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            return {'data': self.dataset_list}
+
+        client = Avaandmed('key', 'key_id', transport=transport, parse_mode='trusted')
+        validating = Avaandmed('key', 'key_id', transport=transport)
+
+        assert client._http_client.parse_mode is ParseMode.TRUSTED
+        assert validating._http_client.parse_mode is ParseMode.VALIDATE
+        assert client.datasets.get_dataset_list() == validating.datasets.get_dataset_list()
+
+    def test_async_client_parse_mode(self):
+        httpx = pytest.importorskip('httpx')
+
+        def handler(request):
+            if request.url.path.endswith('/auth/key-login'):
+                return httpx.Response(200, json={'data': {'accessToken': 'token', 'expiresIn': 3600}})
+            return httpx.Response(200, json={'data': self.dataset})
+
+        async def fetch():
+            async with AsyncAvaandmed('key', 'key_id', parse_mode=ParseMode.TRUSTED,
+                                      transport=httpx.MockTransport(handler)) as client:
+                return await client.datasets.get_by_id(self.dataset['id'])
+
+        assert run_async(fetch()) == parse(Dataset, self.dataset)
+
+
+class TestLazyParsing:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.dataset = data_mock.MOCK_DATASET_FILE['data']
+        self.dataset_list = data_mock.MOCK_DATASET_LIST_FILE['data']
+
+    def test_fields_are_converted_on_access(self):
+        dataset = parse(Dataset, self.dataset, ParseMode.LAZY)
+
+        assert isinstance(dataset, LazyDataset) and isinstance(dataset, Dataset)
+        assert dataset.__dict__ == {}
+        assert dataset.name_et == self.dataset['nameEt']
+        assert isinstance(dataset.files[0].processing_status, ProcessingStatus)
+        assert dataset.access is Access.PUBLIC
+        assert list(dataset.__dict__) == ['name_et', 'files', 'access']
+        assert dataset.files is dataset.files
+
+        with pytest.raises(AttributeError):
+            dataset.unknown
+
+    def test_same_as_eager_model(self):
+        eager = parse(Dataset, self.dataset)
+        dataset = parse(Dataset, self.dataset, ParseMode.LAZY)
+
+        assert dataset == eager
+        assert dataset.__fields_set__ == eager.__fields_set__
+        assert dataset.dict(by_alias=True) == eager.dict(by_alias=True)
+        assert repr(dataset) == 'Lazy' + repr(eager)
+        assert pickle.loads(pickle.dumps(dataset)) == eager
+        assert parse(List[Dataset], self.dataset_list, ParseMode.LAZY) == parse(List[Dataset], self.dataset_list)
+
+    def test_invalid_field_raises_on_access(self):
+        file = lazy_model(File).wrap(dict(self.dataset['files'][0], processingStatus='unknown'))
+
+        assert file.name == self.dataset['files'][0]['name']
+        with pytest.raises(ValidationError):
+            file.processing_status
+
+    def test_lazy_model_is_cached(self):
+        assert lazy_model(Dataset) is LazyDataset
+        assert lazy_model(LazyDataset) is LazyDataset
+
+    def test_datasets_lazy_option(self):
+        transport = FakeTransport()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            return {'data': self.dataset_list}
+
+        @transport.get('/datasets/{id}')
+        def dataset(request):
+            return {'data': self.dataset}
+
+        client = Avaandmed('key', 'key_id', transport=transport)
+        datasets = client.datasets.get_dataset_list(lazy=True)
+
+        assert all(isinstance(dataset, LazyDataset) for dataset in datasets)
+        assert [d.slug for d in datasets] == [d['slug'] for d in self.dataset_list]
+        assert isinstance(client.datasets.get_by_id(self.dataset['id'], lazy=True), LazyDataset)
+        assert type(client.datasets.get_by_id(self.dataset['id'])) is Dataset
+
+
+class TestCompactModels:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock):
+        self.dataset = parse(Dataset, data_mock.MOCK_DATASET_FILE['data'])
+        self.datasets = parse(List[Dataset], data_mock.MOCK_DATASET_LIST_FILE['data'])
+        self.search = parse(List[SearchResult], data_mock.MOCK_SEARCH_RESULTS['data'])
+
+    def test_round_trip(self):
+        datasets = compact(self.datasets)
+        results = compact(self.search)
+
+        assert all(type(dataset) is CompactDataset for dataset in datasets)
+        assert all(type(result) is CompactSearchResult for result in results)
+        assert [dataset.to_model() for dataset in datasets] == self.datasets
+        assert [result.to_model() for result in results] == self.search
+        assert type(datasets[0].to_model()) is Dataset
+
+    def test_attributes(self):
+        dataset = CompactDataset.from_model(self.dataset)
+        model = self.dataset
+
+        assert not hasattr(dataset, '__dict__')
+        assert dataset.id == model.id and dataset.name == model.name
+        assert dataset.access is model.access
+        assert isinstance(dataset.keywords, tuple) and type(dataset.keywords[0]) is CompactKeyword
+        assert type(dataset.files[0]) is CompactFile
+        assert dataset.files[0].metadata == model.files[0].metadata
+        assert dataset.to_model() == model
+        with pytest.raises(AttributeError):
+            dataset.name = 'changed'
+
+    def test_repeated_values_are_shared(self):
+        first, second = compact([self.dataset, self.dataset.copy(deep=True)])
+
+        assert first == second
+        assert first.licence is second.licence
+        assert first.organization is second.organization
+        assert first.keywords[0].language is second.keywords[0].language
+
+    def test_pickle_and_lazy_models(self):
+        dataset = compact(self.datasets)[0]
+        lazy = parse(Dataset, self.datasets[0].dict(by_alias=True), ParseMode.LAZY)
+
+        assert pickle.loads(pickle.dumps(dataset)) == dataset
+        assert compact_model(LazyDataset) is CompactDataset
+        assert CompactDataset.from_model(lazy) == dataset
+
+
+class TestCompiledDecoders:
+
+    @pytest.fixture(autouse=True)
+    def _data_mock(self, data_mock: DataJsonMock, tmp_path):
+        self.dataset = data_mock.MOCK_DATASET_FILE['data']
+        self.dataset_list = data_mock.MOCK_DATASET_LIST_FILE['data']
+        self.search = data_mock.MOCK_SEARCH_RESULTS['data']
+        self.inquiry = {
+            'id': '1', 'userId': '2', 'description': 'Private data', 'datasetId': self.dataset['id'],
+            'status': 'pending', 'createdAt': '2021-10-01', 'seen': False,
+            'dataset': {'id': self.dataset['id'], 'nameEt': 'Nimi', 'slug': 'nimi'},
+            'user': self.dataset['user']
+        }
+        self.cache_dir = str(tmp_path / 'decoders')
+        self.compiler = DecoderCompiler(self.cache_dir)
+
+    def test_same_models_as_parse_obj_as(self):
+        for type_, data in [(Dataset, self.dataset), (List[Dataset], self.dataset_list),
+                            (List[SearchResult], self.search), (Inquiry, self.inquiry),
+                            (List[File], self.dataset['files'])]:
+            validated = parse_obj_as(type_, data)
+            decoded = self.compiler.parse(type_, data)
+
+            assert decoded == validated
+            assert repr(decoded) == repr(validated)
+
+        dataset = self.compiler.parse(Dataset, self.dataset)
+        assert dataset.__fields_set__ == parse_obj_as(Dataset, self.dataset).__fields_set__
+        assert dataset.access is Access.PUBLIC
+
+    def test_unexpected_types_are_validated(self):
+        file = dict(self.dataset['files'][0], size=1024, processingStatus='completed')
+        inquiry = dict(self.inquiry, seen='yes')
+        del inquiry['createdAt']
+
+        assert self.compiler.parse(File, file) == parse_obj_as(File, file)
+        assert self.compiler.parse(Inquiry, inquiry) == parse_obj_as(Inquiry, inquiry)
+
+    def test_same_errors_as_parse_obj_as(self):
+        for type_, data in [(File, dict(self.dataset['files'][0], processingStatus='unknown')),
+                            (List[File], [{'id': '1'}]), (Dataset, 'dataset')]:
+            with pytest.raises(ValidationError) as expected:
+                parse_obj_as(type_, data)
+            with pytest.raises(ValidationError) as raised:
+                self.compiler.parse(type_, data)
+
+            assert str(raised.value) == str(expected.value)
+
+    def test_decoders_are_cached_on_disk(self):
+        self.compiler.parse(Dataset, self.dataset)
+        sources = os.listdir(self.cache_dir)
+        reloaded = DecoderCompiler(self.cache_dir)
+
+        assert self.compiler.stats.generated == 1
+        assert reloaded.parse(Dataset, self.dataset) == parse_obj_as(Dataset, self.dataset)
+        assert reloaded.stats.as_dict() == {'generated': 0, 'loaded': 1}
+        assert os.listdir(self.cache_dir) == sources
+
+    def test_modified_cache_file_is_regenerated(self):
+        self.compiler.parse(Dataset, self.dataset)
+        path = next(os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                    if name.endswith('.py'))
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(source.replace('def make(env):', 'def make(env):\n    raise RuntimeError()'))
+        reloaded = DecoderCompiler(self.cache_dir)
+
+        assert reloaded.parse(Dataset, self.dataset) == parse_obj_as(Dataset, self.dataset)
+        assert reloaded.stats.as_dict() == {'generated': 1, 'loaded': 0}
+        with open(path, encoding='utf-8') as f:
+            assert f.read() == source
+
+    def test_in_memory_decoders(self, tmp_path):
+        compiler = DecoderCompiler()
+
+        assert compiler.cache_dir is None
+        assert compiler.parse(Dataset, self.dataset) == parse_obj_as(Dataset, self.dataset)
+        assert compiler.stats.generated == 1
+
+    def test_disk_cache_is_opt_in(self, monkeypatch):
+        monkeypatch.delenv('AVAANDMED_CACHE_DIR', raising=False)
+        assert compiled.default_cache_dir() is None
+        monkeypatch.setenv('AVAANDMED_CACHE_DIR', self.cache_dir)
+        assert compiled.default_cache_dir() == self.cache_dir
+
+    def test_client_parse_mode(self, monkeypatch):
+        monkeypatch.setattr(compiled, 'compiler', self.compiler)
+        transport = FakeTransport()
+
+        @transport.get('/datasets')
+        def datasets(request):
+            return {'data': self.dataset_list}
+
+        client = Avaandmed('key', 'key_id', transport=transport, parse_mode=ParseMode.COMPILED)
+
+        assert client.datasets.get_dataset_list() == parse_obj_as(List[Dataset], self.dataset_list)
+        assert self.compiler.stats.generated == 1
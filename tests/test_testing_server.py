@@ -0,0 +1,124 @@
+import json
+import pytest
+import requests
+
+from avaandmed import Avaandmed
+from avaandmed.api_resources.datasets.dataset import Dataset
+from avaandmed.exceptions import AvaandmedApiExcepiton
+from avaandmed.http.cache import HttpCache
+from avaandmed.http.http_client import HttpMethod
+from avaandmed.http.retry import RetryBudget, RetryPolicy
+from avaandmed.testing import ApiServer, Catalog, Faults
+
+AUTH = {'Authorization': 'Bearer test-token'}
+
+
+class TestApiServer:
+
+    @pytest.fixture(autouse=True)
+    def _server(self):
+        with ApiServer(Catalog(datasets=100000, rows_per_file=1000)) as server:
+            self.server = server
+            self.catalog = server.catalog
+            yield
+
+    def client(self, **kwargs) -> Avaandmed:
+        return Avaandmed('key', 'key_id', self.server.hostname, scheme='http', **kwargs)
+
+    def test_catalog_at_scale(self):
+        client = self.client()
+        last = self.catalog.dataset_id(99999)
+
+        assert client.datasets.get_total() == 100000
+        assert isinstance(client.datasets.get_by_id(last), Dataset)
+        assert client.datasets.get_by_slug('dataset-99999').id == last
+        assert len(client.users.me.dataset.get_all_files(last)) == 2
+        org = client.organizations(self.catalog.organization_id(0)).my_orgranization
+        assert len(org.get_list_my_orgs()) == 10
+        assert len(org.dataset.get_dataset_list()) == 20
+        assert client.get_categories()[0].name == 'transport'
+
+        with pytest.raises(AvaandmedApiExcepiton):
+            client.datasets.get_by_id(self.catalog.dataset_id(100000))
+
+    def test_pagination(self):
+        http_client = self.client()._http_client
+        document = json.loads(http_client.request(HttpMethod.GET, '/datasets?limit=50&offset=99980', raw=True))
+        second = http_client.request(HttpMethod.GET, '/datasets?limit=5&page=2')
+
+        assert len(document['data']) == 20
+        assert document['metadata'] == {'page': 2000, 'limit': 50, 'offset': 99980, 'total': 100000}
+        assert [d['slug'] for d in second] == [f"dataset-{i}" for i in range(5, 10)]
+
+    def test_file_rows_are_paged(self):
+        http_client = self.client()._http_client
+        dataset = self.catalog.dataset_id(3)
+        file = self.catalog.file_id(3, 1)
+        rows = http_client.request(HttpMethod.GET, f"/datasets/{dataset}/files/{file}?limit=10&offset=995")
+
+        assert [row['id'] for row in rows] == [f"{i:010d}" for i in range(995, 1000)]
+
+    def test_etag_revalidation(self):
+        client = self.client(cache=HttpCache())
+        dataset = self.catalog.dataset_id(7)
+
+        assert client.datasets.get_by_id(dataset) == client.datasets.get_by_id(dataset)
+        assert client.cache_stats.revalidations == 1
+        assert self.server.statuses[304] == 1
+
+    def test_download_and_ranges(self, tmp_path):
+        client = self.client()
+        dataset = self.catalog.dataset_id(1)
+        file = self.catalog.file_id(1, 0)
+        destination = tmp_path / 'file.csv'
+        client.datasets.download_file(dataset, file, str(destination))
+        content = destination.read_bytes()
+
+        url = f"{self.server.url}/datasets/{dataset}/files/{file}/download"
+        partial = requests.post(url, headers=dict(AUTH, Range='bytes=10-5000'))
+        suffix = requests.post(url, headers=dict(AUTH, Range='bytes=-100'))
+        invalid = requests.post(url, headers=dict(AUTH, Range=f"bytes={len(content)}-"))
+
+        assert len(content) == self.catalog.file_size
+        assert content.splitlines()[1000] == self.catalog.csv_row(999).strip()
+        assert partial.status_code == 206
+        assert partial.headers['Content-Range'] == f"bytes 10-5000/{len(content)}"
+        assert partial.content == content[10:5001]
+        assert suffix.content == content[-100:]
+        assert invalid.status_code == 416
+
+    def test_dataset_download_serves_its_file(self):
+        dataset = self.catalog.dataset_id(2)
+        response = requests.post(f"{self.server.url}/users/me/datasets/{dataset}/download-from-url",
+                                 headers=AUTH)
+
+        assert response.headers['ETag'] == f'"{self.catalog.file_id(2, 0)}-{self.catalog.file_size}"'
+
+    def test_upload(self, tmp_path):
+        path = tmp_path / 'rows.csv'
+        path.write_bytes(b'a,b\n1,2\n')
+        uploaded = self.client().users.me.dataset.upload_file(
+            self.catalog.dataset_id(2), 'rows.csv', 'text/csv', str(path))
+
+        assert uploaded.name == 'rows.csv'
+
+
+class TestFaults:
+
+    def test_injected_failures_are_retried(self):
+        faults = Faults(error_rate=0.2, throttle_rate=0.3, retry_after=0, seed=1)
+        with ApiServer(Catalog(datasets=100), faults) as server:
+            client = Avaandmed('key', 'key_id', server.hostname, scheme='http',
+                               retry=RetryPolicy(max_retries=20, backoff_factor=0,
+                                                 budget=RetryBudget(reserve=100)))
+            totals = [client.datasets.get_total() for _ in range(20)]
+
+        assert totals == [100] * 20
+        assert server.statuses[429] > 0 and server.statuses[503] > 0
+        assert client.retry_stats.retries == server.statuses[429] + server.statuses[503]
+
+    def test_latency(self):
+        with ApiServer(Catalog(datasets=1), Faults(latency=0.2)) as server:
+            res = requests.get(f"{server.url}/datasets/total", headers=AUTH)
+
+        assert res.elapsed.total_seconds() >= 0.2
@@ -11,3 +11,30 @@ def load_json(path: Path):
 
 def format_mock_url(url: str, mock_value: str):
     return f'{url}/{mock_value}'
+
+
+def make_jwt(exp: float) -> str:
+    """
+    Builds unsigned JWT access token which expires at given unix time.
+    """
+    import base64
+
+    def encode(part: dict) -> str:
+        raw = json.dumps(part).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    return f"{encode({'alg': 'none'})}.{encode({'exp': exp})}.signature"
+
+
+def run_async(coro):
+    """
+    Runs coroutine in a new event loop. asyncio.run is only available since Python 3.7.
+    """
+    import asyncio
+
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()